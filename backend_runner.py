@@ -16,18 +16,12 @@ import signal
 import sys
 import os
 from datetime import datetime
-import psycopg2
-import psycopg2.extras
-import json
-from dotenv import load_dotenv
+from common import load_env
+from storage import get_storage, SQLiteStorage
 
 # Load environment variables
 # Try to load from .env.local for local development, but Railway will provide env vars directly
-if os.path.exists('.env.local'):
-    load_dotenv('.env.local')
-    print("Loaded environment variables from .env.local (local development)")
-else:
-    print("Using environment variables from Railway (production)")
+load_env(announce=True)
 
 # Configure logging
 logging.basicConfig(
@@ -48,7 +42,12 @@ class BackendRunner:
         self.processor_interval = 60  # 1 minute between processing runs
         self.last_scraper_run = 0
         self.last_processor_run = 0
-        self.db_url = os.getenv('DATABASE_URL')
+        self.storage = get_storage()
+        
+        # 'poll' runs process_articles.py every cycle, 'listen' keeps it running
+        # as a LISTEN/NOTIFY listener next to the scraper loop
+        self.processor_mode = os.getenv('PROCESSOR_MODE', 'poll').lower()
+        self.listener_process = None
         
         # Setup signal handlers for graceful shutdown
         try:
@@ -60,20 +59,13 @@ class BackendRunner:
         logger.info("Backend Runner initialized")
         logger.info(f"Scraper interval: {self.scraper_interval} seconds")
         logger.info(f"Processor interval: {self.processor_interval} seconds")
+        logger.info(f"Processor mode: {self.processor_mode}")
     
     def signal_handler(self, signum, frame):
         """Handle shutdown signals gracefully"""
         logger.info(f"Received signal {signum}, shutting down gracefully...")
         self.running = False
     
-    def get_db_connection(self):
-        """Get a database connection"""
-        try:
-            return psycopg2.connect(self.db_url)
-        except Exception as e:
-            logger.error(f"Error connecting to database: {e}")
-            return None
-    
     def run_script(self, script_name: str, description: str) -> bool:
         """Run a Python script and return success status"""
         try:
@@ -118,44 +110,18 @@ class BackendRunner:
     def get_database_stats(self) -> dict:
         """Get current database statistics"""
         try:
-            conn = self.get_db_connection()
-            if conn is None:
-                return {}
-                
-            cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-            
-            # Get counts for all statuses
-            cursor.execute("SELECT COUNT(*) FROM news_items WHERE isProcessed = 0")
-            unprocessed_count = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM news_items WHERE isProcessed = 1")
-            processed_relevant_count = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM news_items WHERE isProcessed = 2")
-            processed_non_relevant_count = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM news_items")
-            total_count = cursor.fetchone()[0]
-            
-            # Get recent activity
-            cursor.execute("""
-                SELECT COUNT(*) FROM news_items 
-                WHERE created_at >= NOW() - INTERVAL '1 hour'
-            """)
-            last_hour_count = cursor.fetchone()[0]
-            
-            conn.close()
-            
+            stats = self.storage.get_processing_stats()
             return {
-                'total': total_count,
-                'unprocessed': unprocessed_count,
-                'processed_relevant': processed_relevant_count,
-                'processed_non_relevant': processed_non_relevant_count,
-                'last_hour': last_hour_count
+                'total': stats['total'],
+                'unprocessed': stats['unprocessed'],
+                'processed_relevant': stats['processed_relevant'],
+                'processed_non_relevant': stats['processed_non_relevant'],
+                'last_hour': stats['last_hour']
             }
             
         except Exception as e:
             logger.error(f"[ERROR] Error getting database stats: {e}")
+            self.storage.close()  # Reconnect on the next status update
             return {}
     
     def should_run_scraper(self) -> bool:
@@ -182,6 +148,36 @@ class BackendRunner:
         else:
             logger.error("Processor failed, will retry on next cycle")
     
+    def ensure_listener(self):
+        """Start the processor listener, or restart it if it exited"""
+        if self.listener_process is not None and self.listener_process.poll() is None:
+            return
+        
+        if self.listener_process is not None:
+            logger.error(f"Processor listener exited with code {self.listener_process.returncode}, restarting...")
+        
+        env = os.environ.copy()
+        env['PYTHONIOENCODING'] = 'utf-8'
+        
+        # Output goes straight to our stdout so the listener shows up in the service log
+        self.listener_process = subprocess.Popen(
+            [sys.executable, 'process_articles.py', '--listen'],
+            env=env
+        )
+        logger.info(f"Processor listener started (pid {self.listener_process.pid})")
+    
+    def stop_listener(self):
+        """Stop the processor listener if it is running"""
+        if self.listener_process is None or self.listener_process.poll() is not None:
+            return
+        
+        logger.info("Stopping processor listener...")
+        self.listener_process.terminate()
+        try:
+            self.listener_process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.listener_process.kill()
+    
     def log_status(self):
         """Log current status and statistics"""
         logger.info("[STATS] Status Update:")
@@ -208,7 +204,10 @@ class BackendRunner:
         
         logger.info(f"⏰ Next runs:")
         logger.info(f"   [SPIDER] Scraper: in {next_scraper:.0f} seconds")
-        logger.info(f"   [AI] Processor: in {next_processor:.0f} seconds")
+        if self.processor_mode == 'listen':
+            logger.info(f"   [AI] Processor: listening for new articles")
+        else:
+            logger.info(f"   [AI] Processor: in {next_processor:.0f} seconds")
         logger.info("=" * 50)
     
     def run(self):
@@ -222,6 +221,10 @@ class BackendRunner:
         
         cycle_count = 0
         
+        # Start the listener right away so it is up before the first scrape finishes
+        if self.processor_mode == 'listen':
+            self.ensure_listener()
+        
         while self.running:
             try:
                 cycle_count += 1
@@ -238,7 +241,9 @@ class BackendRunner:
                     logger.info("Scraper not due yet")
                 
                 # Check if we should run the processor
-                if self.should_run_processor():
+                if self.processor_mode == 'listen':
+                    self.ensure_listener()
+                elif self.should_run_processor():
                     logger.info("Time to run processor...")
                     self.run_processor()
                 else:
@@ -260,6 +265,7 @@ class BackendRunner:
                 logger.info("Waiting 60 seconds before retrying...")
                 time.sleep(60)
         
+        self.stop_listener()
         logger.info("Backend Runner stopped gracefully")
 
 def main():
@@ -281,8 +287,14 @@ def main():
         print("Please ensure all required scripts are in the current directory")
         return
     
-    # Check if database exists
-    if not os.path.exists('rotter_news.db'):
+    # Check which database we are going to use
+    try:
+        storage = get_storage()
+    except RuntimeError as e:
+        print(f"ERROR: {e}")
+        return
+    print(f"Database: {storage.describe()}")
+    if isinstance(storage, SQLiteStorage) and not os.path.exists(storage.path):
         print("WARNING: Database not found. The scraper will create it on first run.")
     
     # Check if .env.local exists for API keys
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+"""
+Token Budget Governor for the Article Processor
+A run used to take every unprocessed article, so a reset or a burst from the
+scraper could spend a month's tokens in one night. With a daily and/or hourly
+token budget the governor tracks what was actually spent (the usage of every
+response, and llm_calls for the rolling 24 hour / 1 hour windows, so other
+processes and earlier runs count too) and decides how much work a run takes:
+
+- Admission: articles are ranked by priority - freshness, size of their story
+  cluster and how political they look (title terms, pre-filter) - and only as
+  many as the remaining budget pays for, at the tokens an article has cost
+  recently, are admitted. The others stay unprocessed for a later run.
+- Degradation: below BUDGET_ECONOMY_AT of the budget left every stage uses the
+  cheap model (model_router.py budget mode) and no research is started
+  speculatively; below BUDGET_MINIMAL_AT new research calls are skipped too
+  (shared story and topic research is still used). With nothing left, no
+  further article is started.
+
+Cache reads are counted at their price (CACHE_READ_FACTOR of an input token).
+The remaining budget, the level and the queue wait of admitted articles are
+in the processing report and `python budget_governor.py status`.
+
+Configuration:
+    BUDGET_DAILY_TOKENS=2000000      # tokens per rolling 24 hours (0 = no limit)
+    BUDGET_HOURLY_TOKENS=200000      # tokens per rolling hour (0 = no limit)
+    BUDGET_ECONOMY_AT=0.5            # share of the budget left below which the cheap model is used
+    BUDGET_MINIMAL_AT=0.2            # share of the budget left below which research is skipped
+    BUDGET_TOKENS_PER_ARTICLE=8000   # admission estimate until llm_calls has enough history
+    BUDGET_REFRESH_SECONDS=300       # how often spend is re-read from llm_calls during a run
+
+Commands:
+    python budget_governor.py status              # remaining budget, level and backlog
+    python budget_governor.py queue [--limit 20]  # unprocessed articles in admission order
+"""
+
+import os
+import time
+import argparse
+from collections import deque
+from typing import Dict, List, Optional
+from common import load_env
+from storage import get_storage
+from telemetry import CallTelemetry, CACHE_READ_FACTOR
+from prefilter import load_prefilter
+from speculation import keyword_score
+from story_clusters import StoryClusterer, story_signature, similarity
+
+# Same environment handling as the scraper and processor
+load_env()
+
+BUDGET_LEVELS = ['normal', 'economy', 'minimal', 'exhausted']
+
+# Budget windows: name -> hours
+BUDGET_WINDOWS = {'daily': 24, 'hourly': 1}
+
+# Weights of the priority components (each 0-1)
+PRIORITY_WEIGHTS = {'freshness': 0.4, 'cluster': 0.3, 'relevance': 0.3}
+FRESHNESS_HALF_LIFE_HOURS = 6
+CLUSTER_FOR_FULL_SCORE = 5
+
+# Tokens per article are taken from llm_calls once this many articles of the last days have calls
+ESTIMATE_DAYS = 7
+ESTIMATE_MIN_ARTICLES = 20
+
+# Research findings of an article whose research was skipped for the budget
+RESEARCH_SKIPPED_TEXT = "לא בוצע מחקר נוסף בגלל מגבלת התקציב - הניתוח מבוסס על הטקסט המקורי בלבד."
+
+def counted_tokens(usage) -> float:
+    """Tokens of one response as the budget counts them"""
+    return (sum(getattr(usage, key, 0) or 0 for key in ['input_tokens', 'cache_creation_input_tokens', 'output_tokens'])
+            + (getattr(usage, 'cache_read_input_tokens', 0) or 0) * CACHE_READ_FACTOR)
+
+class BudgetGovernor:
+    """Daily / hourly token budget: admission by priority and degradation as it runs out"""
+
+    def __init__(self, storage, daily_tokens: int = 0, hourly_tokens: int = 0, economy_at: float = 0.5,
+                 minimal_at: float = 0.2, tokens_per_article: int = 8000, refresh_seconds: float = 300,
+                 telemetry=None, model_router=None, story_clusters=None, prefilter=None):
+        self.storage = storage
+        self.budgets = {window: tokens for window, tokens in
+                        (('daily', daily_tokens), ('hourly', hourly_tokens)) if tokens > 0}
+        self.enabled = bool(self.budgets)
+        self.economy_at = economy_at
+        self.minimal_at = minimal_at
+        self.tokens_per_article = tokens_per_article
+        self.refresh_seconds = refresh_seconds
+        self.telemetry = telemetry
+        self.model_router = model_router
+        self.story_clusters = story_clusters
+        self.prefilter = prefilter
+        # The router's own MODEL_BUDGET_MODE, which the economy level only adds to
+        self.router_budget_mode = model_router.budget_mode if model_router is not None else False
+        # Spend read from llm_calls at the last refresh, per window
+        self.baseline = {window: 0.0 for window in self.budgets}
+        self.refreshed_at: Optional[float] = None
+        # (time, tokens) of this process's responses, on top of the baseline
+        self.local: deque = deque()
+        self.estimate = float(tokens_per_article)
+        self.level = 'normal'
+        self.reset_stats()
+
+    @classmethod
+    def from_env(cls, storage, telemetry=None, model_router=None, story_clusters=None,
+                 prefilter=None) -> 'BudgetGovernor':
+        """Governor configured from BUDGET_* environment variables"""
+        return cls(
+            storage,
+            daily_tokens=int(os.getenv('BUDGET_DAILY_TOKENS', '0')),
+            hourly_tokens=int(os.getenv('BUDGET_HOURLY_TOKENS', '0')),
+            economy_at=float(os.getenv('BUDGET_ECONOMY_AT', '0.5')),
+            minimal_at=float(os.getenv('BUDGET_MINIMAL_AT', '0.2')),
+            tokens_per_article=int(os.getenv('BUDGET_TOKENS_PER_ARTICLE', '8000')),
+            refresh_seconds=float(os.getenv('BUDGET_REFRESH_SECONDS', '300')),
+            telemetry=telemetry,
+            model_router=model_router,
+            story_clusters=story_clusters,
+            prefilter=prefilter
+        )
+
+    def reset_stats(self):
+        """Start counting a new run"""
+        self.stats = {'candidates': 0, 'admitted': 0, 'deferred': 0, 'stopped': 0, 'research_skipped': 0,
+                      'tokens': 0.0, 'waits': [], 'lowest': self.level}
+
+    # --- spend ---
+
+    def refresh(self, force: bool = False):
+        """Re-read the spend of the budget windows from llm_calls, at most every refresh_seconds"""
+        if not self.enabled or self.telemetry is None or not self.telemetry.enabled:
+            return
+        now = time.time()
+        if not force and self.refreshed_at is not None and now - self.refreshed_at < self.refresh_seconds:
+            return
+        try:
+            for window in self.budgets:
+                tokens, cache_read = self.storage.llm_tokens_spent(BUDGET_WINDOWS[window])
+                self.baseline[window] = tokens + cache_read * CACHE_READ_FACTOR
+            articles, tokens, cache_read = self.storage.llm_tokens_per_article(ESTIMATE_DAYS)
+            if articles >= ESTIMATE_MIN_ARTICLES:
+                self.estimate = (tokens + cache_read * CACHE_READ_FACTOR) / articles
+        except Exception as e:
+            print(f"[WARNING] Could not read the token spend from llm_calls: {e}")
+            return
+        # Rows still queued in the telemetry writer are not in the baseline yet: local
+        # responses of the last flush interval are counted on top of it (at worst twice)
+        self.refreshed_at = now - self.telemetry.flush_seconds
+        while self.local and self.local[0][0] < self.refreshed_at:
+            self.local.popleft()
+        self.update_level()
+
+    def spend(self, usage):
+        """Count one response against the budget"""
+        if not self.enabled:
+            return
+        tokens = counted_tokens(usage)
+        now = time.time()
+        self.local.append((now, tokens))
+        while self.local and self.local[0][0] < now - BUDGET_WINDOWS['daily'] * 3600:
+            self.local.popleft()
+        self.stats['tokens'] += tokens
+        self.update_level()
+
+    def spent(self, window: str) -> float:
+        """Tokens counted in one budget window"""
+        since = time.time() - BUDGET_WINDOWS[window] * 3600
+        return self.baseline[window] + sum(tokens for at, tokens in self.local if at >= since)
+
+    def remaining(self) -> Dict[str, float]:
+        """{window: tokens left}"""
+        return {window: budget - self.spent(window) for window, budget in self.budgets.items()}
+
+    def remaining_share(self) -> float:
+        """Share of the tightest budget window that is left"""
+        return min((left / self.budgets[window] for window, left in self.remaining().items()), default=1.0)
+
+    def update_level(self):
+        """Level for the remaining budget, switching the router's budget mode with it"""
+        share = self.remaining_share()
+        if share <= 0:
+            level = 'exhausted'
+        elif share < self.minimal_at:
+            level = 'minimal'
+        elif share < self.economy_at:
+            level = 'economy'
+        else:
+            level = 'normal'
+        if level != self.level:
+            print(f"[BUDGET] {self.level} -> {level} ({max(0.0, share) * 100:.0f}% of the budget left)")
+            self.level = level
+        if BUDGET_LEVELS.index(level) > BUDGET_LEVELS.index(self.stats['lowest']):
+            self.stats['lowest'] = level
+        if self.model_router is not None:
+            self.model_router.budget_mode = self.router_budget_mode or level != 'normal'
+
+    # --- admission ---
+
+    def priority(self, article: Dict, clusters: List[Dict]) -> float:
+        """Weighted priority (0-1) of an unprocessed article"""
+        waiting = max(0.0, float(article.get('waiting_hours') or 0))
+        freshness = 0.5 ** (waiting / FRESHNESS_HALF_LIFE_HOURS)
+
+        size = 1
+        if clusters:
+            signature = story_signature(article['title'], article['clean_content'])
+            threshold = self.story_clusters.threshold
+            matches = [cluster for cluster in clusters if similarity(signature, cluster['signature']) >= threshold]
+            if matches:
+                size += max(cluster['article_count'] for cluster in matches)
+        cluster = min(1.0, (size - 1) / (CLUSTER_FOR_FULL_SCORE - 1))
+
+        relevance = keyword_score(article['title'])
+        if self.prefilter is not None:
+            relevance = max(relevance, 1.0 - self.prefilter.score(article['title'], article['clean_content']))
+
+        return (PRIORITY_WEIGHTS['freshness'] * freshness + PRIORITY_WEIGHTS['cluster'] * cluster
+                + PRIORITY_WEIGHTS['relevance'] * relevance)
+
+    def ranked(self, articles: List[Dict]) -> List[Dict]:
+        """Articles by priority, highest first (oldest first among equals)"""
+        clusters = []
+        if self.story_clusters is not None and self.story_clusters.enabled:
+            try:
+                clusters = self.storage.recent_story_clusters(self.story_clusters.window_hours)
+            except Exception as e:
+                print(f"[WARNING] Could not read the story clusters for the priorities: {e}")
+        for article in articles:
+            article['priority'] = round(self.priority(article, clusters), 3)
+        return sorted(articles, key=lambda article: article['priority'], reverse=True)
+
+    def capacity(self) -> int:
+        """Articles the remaining budget pays for"""
+        if self.level == 'exhausted':
+            return 0
+        return int(min(self.remaining().values()) // max(1.0, self.estimate))
+
+    def admit(self, articles: List[Dict], limit: Optional[int] = None) -> List[Dict]:
+        """The articles to process in this run, highest priority first"""
+        wanted = min(len(articles), limit) if limit else len(articles)
+        if not self.enabled:
+            return articles[:wanted]
+
+        self.refresh(force=True)
+        ranked = self.ranked(articles)
+        admitted = ranked[:min(wanted, self.capacity())]
+        self.stats['candidates'] += len(articles)
+        self.stats['admitted'] += len(admitted)
+        self.stats['deferred'] += wanted - len(admitted)
+        self.stats['waits'].extend(float(article.get('waiting_hours') or 0) for article in admitted)
+        if len(admitted) < wanted:
+            print(f"[BUDGET] Admitted {len(admitted)} of {wanted} articles "
+                  f"({self.remaining_summary()}, ~{self.estimate:.0f} tokens per article) - "
+                  f"{wanted - len(admitted)} deferred to a later run")
+        return admitted
+
+    def admits_more(self) -> bool:
+        """False once the budget is exhausted: no further article is started"""
+        if not self.enabled:
+            return True
+        self.refresh()
+        return self.level != 'exhausted'
+
+    def stopped(self):
+        """Count an admitted article that was not started because the budget ran out"""
+        self.stats['stopped'] += 1
+
+    # --- degradation ---
+
+    def allows_speculation(self) -> bool:
+        """Speculative research only at the normal level"""
+        return not self.enabled or self.level == 'normal'
+
+    def skip_research(self, articles: int = 1) -> bool:
+        """True when new research calls are skipped (minimal level and below), counting the articles"""
+        if not self.enabled or BUDGET_LEVELS.index(self.level) < BUDGET_LEVELS.index('minimal'):
+            return False
+        self.stats['research_skipped'] += articles
+        return True
+
+    # --- metrics ---
+
+    def remaining_summary(self) -> str:
+        """'daily 120000 of 500000 tokens left, hourly ...'"""
+        return ", ".join(f"{window} {max(0.0, left):.0f} of {self.budgets[window]} tokens left"
+                         for window, left in self.remaining().items())
+
+    def metrics(self) -> Dict:
+        """Remaining budget, level and queue wait of the current run"""
+        waits = self.stats['waits']
+        return {
+            'level': self.level,
+            'remaining': {window: round(max(0.0, left)) for window, left in self.remaining().items()},
+            'remaining_share': round(max(0.0, self.remaining_share()), 3),
+            'tokens_per_article': round(self.estimate),
+            'spent_this_run': round(self.stats['tokens']),
+            'admitted': self.stats['admitted'],
+            'deferred': self.stats['deferred'],
+            'stopped': self.stats['stopped'],
+            'research_skipped': self.stats['research_skipped'],
+            'queue_wait_avg_hours': round(sum(waits) / len(waits), 2) if waits else 0.0,
+            'queue_wait_max_hours': round(max(waits), 2) if waits else 0.0,
+        }
+
+    def summary(self) -> str:
+        """One-line statistics for the processing report"""
+        if not self.enabled:
+            return "disabled"
+        metrics = self.metrics()
+        return (f"{metrics['admitted']} of {self.stats['candidates']} articles admitted, "
+                f"{metrics['deferred']} deferred, {metrics['stopped']} stopped when the budget ran out - "
+                f"{metrics['spent_this_run']} tokens this run, {self.remaining_summary()} - "
+                f"level {self.level} (lowest {self.stats['lowest']}), {metrics['research_skipped']} research calls skipped - "
+                f"queue wait {metrics['queue_wait_avg_hours']:.1f}h avg, {metrics['queue_wait_max_hours']:.1f}h max")
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the token budget governor")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help="remaining budget, level and backlog")
+    queue_parser = subparsers.add_parser('queue', help="unprocessed articles in admission order")
+    queue_parser.add_argument('--limit', type=int, default=20, help="articles to show")
+    args = parser.parse_args()
+
+    storage = get_storage()
+    storage.init_schema()
+    try:
+        governor = BudgetGovernor.from_env(storage, CallTelemetry.from_env(storage),
+                                           story_clusters=StoryClusterer.from_env(storage),
+                                           prefilter=load_prefilter(storage))
+        if not governor.enabled:
+            print("[WARNING] No token budget - set BUDGET_DAILY_TOKENS and/or BUDGET_HOURLY_TOKENS")
+            return
+        governor.refresh(force=True)
+        if args.command == 'status':
+            for window, left in governor.remaining().items():
+                budget = governor.budgets[window]
+                print(f"{window:<8} {budget - left:>10.0f} spent, {max(0.0, left):>10.0f} of {budget} left "
+                      f"({max(0.0, left) / budget * 100:.0f}%)")
+            print(f"{'level':<8} {governor.level}")
+            print(f"{'article':<8} ~{governor.estimate:.0f} tokens - room for {governor.capacity()} more articles")
+            backlog, oldest = storage.get_unprocessed_backlog()
+            print(f"{'backlog':<8} {backlog} unprocessed articles, the oldest waiting {oldest:.1f}h")
+        elif args.command == 'queue':
+            ranked = governor.ranked(storage.get_unprocessed_articles())
+            capacity = governor.capacity()
+            for position, article in enumerate(ranked[:args.limit]):
+                status = 'admit' if position < capacity else 'defer'
+                print(f"{status:<6} {article['priority']:.3f}  {float(article['waiting_hours']):>6.1f}h  "
+                      f"[{article['id']}] {article['title'][:60]}")
+    except Exception as e:
+        print(f"[ERROR] {e}")
+    finally:
+        storage.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+"""
+Shared Helpers for the Scraper and Processor Modules
+Environment loading and the small statistics every report uses, kept in one
+place instead of a copy per module.
+"""
+
+import os
+from typing import Sequence
+from dotenv import load_dotenv
+
+ENV_FILE = '.env.local'
+
+def load_env(announce: bool = False):
+    """Load .env.local for local development; Railway provides the variables directly"""
+    if os.path.exists(ENV_FILE):
+        load_dotenv(ENV_FILE)
+        if announce:
+            print(f"Loaded environment variables from {ENV_FILE} (local development)")
+    elif announce:
+        print("Using environment variables from Railway (production)")
+
+def percentile(values: Sequence[float], share: float) -> float:
+    """Nearest-rank percentile of a list (0 for an empty one)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+"""
+Cold Field Compression Tool
+Measures and shrinks news_items by moving the rarely read raw fields
+(content, row_text) into the compressed news_item_archive side table.
+clean_content and process_data stay where they are - the web feed reads them.
+
+Commands:
+    python compress_storage.py report              # table size, cache hit rate, feed latency
+    python compress_storage.py train-dict          # train a zstd dictionary on stored Hebrew text
+    python compress_storage.py migrate --vacuum    # compress existing rows in batches
+
+Typical run: report -> train-dict -> migrate --vacuum -> report, then set
+COMPRESS_COLD_FIELDS=1 so the scraper writes new articles compressed.
+"""
+
+import time
+import argparse
+from common import load_env, percentile
+from storage import get_storage
+from compression import train_dictionary, DEFAULT_DICT_SIZE
+
+# Same environment handling as the scraper and processor
+load_env()
+
+def format_bytes(value):
+    """Human readable size"""
+    if value is None:
+        return "n/a"
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if value < 1024:
+            return f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} TB"
+
+def measure_feed_latency(storage, pages=5, repeats=10, limit=20):
+    """Run the feed query for the first pages several times; returns latencies in ms"""
+    latencies = []
+    for _ in range(repeats):
+        for page in range(1, pages + 1):
+            start = time.perf_counter()
+            storage.get_feed_page(page, limit)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+def report(storage, pages=5, repeats=10):
+    """Print table size, buffer-cache hit rate and feed query latency"""
+    stats = storage.table_report()
+    latencies = measure_feed_latency(storage, pages, repeats)
+
+    print(f"\n[STATS] Storage report - {storage.describe()}")
+    print(f"   Total news_items size: {format_bytes(stats.get('total_bytes'))}")
+    if 'heap_bytes' in stats:
+        print(f"   Heap: {format_bytes(stats['heap_bytes'])}  "
+              f"TOAST: {format_bytes(stats['toast_bytes'])}  "
+              f"Indexes: {format_bytes(stats['index_bytes'])}")
+        print(f"   Archive side table: {format_bytes(stats['archive_bytes'])}")
+    if 'file_bytes' in stats:
+        print(f"   Database file: {format_bytes(stats['file_bytes'])}")
+
+    hit_rate = stats.get('cache_hit_rate')
+    print(f"   Buffer-cache hit rate: {hit_rate * 100:.2f}%" if hit_rate is not None
+          else "   Buffer-cache hit rate: n/a")
+
+    print(f"   Feed query latency ({len(latencies)} runs): "
+          f"p50 {percentile(latencies, 0.5):.2f} ms, p95 {percentile(latencies, 0.95):.2f} ms")
+
+def train(storage, sample_limit=2000, dict_size=DEFAULT_DICT_SIZE):
+    """Train and store a zstd dictionary from recent content"""
+    samples = storage.sample_cold_fields(sample_limit)
+    if len(samples) < 10:
+        print(f"[WARNING] Only {len(samples)} samples available - not enough to train a dictionary")
+        return None
+
+    print(f"[AI] Training a {format_bytes(dict_size)} zstd dictionary on {len(samples)} samples...")
+    dictionary = train_dictionary(samples, dict_size)
+    dict_id = storage.save_compression_dict('zstd-dict', dictionary, len(samples))
+    print(f"[OK] Stored dictionary {dict_id} ({format_bytes(len(dictionary))})")
+    return dict_id
+
+def migrate(storage, batch_size=500, vacuum=False):
+    """Move existing cold fields to the compressed archive, batch by batch"""
+    print(f"[START] Compressing cold fields with codec '{storage.compressor.codec}' "
+          f"in batches of {batch_size}...")
+
+    last_id = 0
+    total = 0
+    while True:
+        count, batch_last_id = storage.archive_cold_fields_batch(last_id, batch_size)
+        if batch_last_id is None:
+            break
+        last_id = batch_last_id
+        total += count
+        print(f"   [PROGRESS] {total} articles compressed (up to id {last_id})")
+
+    print(f"[OK] Compressed cold fields of {total} articles")
+
+    if vacuum:
+        # Plain VACUUM makes the freed pages reusable for new rows; only VACUUM FULL
+        # (which locks the table) gives the space back to the operating system
+        print("[WAIT] Running VACUUM (ANALYZE) so the freed space is reused...")
+        storage.vacuum_analyze()
+        print("[OK] VACUUM (ANALYZE) done")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure and compress cold article fields")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    report_parser = subparsers.add_parser('report', help="table size, cache hit rate and feed latency")
+    report_parser.add_argument('--pages', type=int, default=5, help="feed pages to query (default: 5)")
+    report_parser.add_argument('--repeats', type=int, default=10, help="runs per page (default: 10)")
+
+    train_parser = subparsers.add_parser('train-dict', help="train a zstd dictionary (needs zstandard)")
+    train_parser.add_argument('--samples', type=int, default=2000, help="max samples (default: 2000)")
+    train_parser.add_argument('--dict-size', type=int, default=DEFAULT_DICT_SIZE,
+                              help=f"dictionary size in bytes (default: {DEFAULT_DICT_SIZE})")
+
+    migrate_parser = subparsers.add_parser('migrate', help="compress existing rows into the archive table")
+    migrate_parser.add_argument('--batch-size', type=int, default=500, help="rows per transaction (default: 500)")
+    migrate_parser.add_argument('--vacuum', action='store_true', help="run VACUUM (ANALYZE) when done")
+
+    args = parser.parse_args()
+
+    storage = get_storage()
+    storage.init_schema()
+
+    try:
+        if args.command == 'report':
+            report(storage, args.pages, args.repeats)
+        elif args.command == 'train-dict':
+            train(storage, args.samples, args.dict_size)
+        elif args.command == 'migrate':
+            migrate(storage, args.batch_size, args.vacuum)
+    except KeyboardInterrupt:
+        print("\n[STOP] Interrupted - already compressed batches are committed")
+    except Exception as e:
+        print(f"[ERROR] {e}")
+    finally:
+        storage.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+"""
+Field Compression for News Balance Analyzer
+Compresses the cold text fields (raw page content, forum row text) before
+they are written to the news_item_archive side table.
+
+Uses zstd when the optional `zstandard` package is installed - with a
+dictionary trained on our own Hebrew forum text if one has been stored -
+and falls back to zlib from the standard library otherwise.
+"""
+
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, zlib always works
+    zstandard = None
+
+ZSTD_LEVEL = 9
+ZLIB_LEVEL = 9
+DEFAULT_DICT_SIZE = 64 * 1024
+
+class FieldCompressor:
+    """Compress/decompress text fields; remembers every dictionary it has seen"""
+
+    def __init__(self, dictionaries: Optional[Dict[int, bytes]] = None):
+        # dict_id -> raw dictionary bytes (as stored in compression_dicts)
+        self.dictionaries = dictionaries or {}
+        self.dict_id = max(self.dictionaries) if self.dictionaries else None
+        self._compressors = {}
+        self._decompressors = {}
+
+    @property
+    def codec(self) -> str:
+        """Codec used for new values"""
+        if zstandard is None:
+            return 'zlib'
+        return 'zstd-dict' if self.dict_id is not None else 'zstd'
+
+    def compress(self, text: Optional[str]) -> Tuple[Optional[bytes], str, Optional[int]]:
+        """Return (compressed bytes, codec, dict_id) for one field"""
+        if text is None:
+            return None, self.codec, None
+
+        data = text.encode('utf-8')
+        codec = self.codec
+        if codec == 'zlib':
+            return zlib.compress(data, ZLIB_LEVEL), codec, None
+
+        dict_id = self.dict_id if codec == 'zstd-dict' else None
+        if dict_id not in self._compressors:
+            if dict_id is None:
+                self._compressors[dict_id] = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+            else:
+                dictionary = zstandard.ZstdCompressionDict(self.dictionaries[dict_id])
+                self._compressors[dict_id] = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dictionary)
+        return self._compressors[dict_id].compress(data), codec, dict_id
+
+    def decompress(self, data, codec: str, dict_id: Optional[int] = None) -> Optional[str]:
+        """Decompress one field written by compress()"""
+        if data is None:
+            return None
+        data = bytes(data)  # psycopg2 returns memoryview for BYTEA
+
+        if codec == 'zlib':
+            return zlib.decompress(data).decode('utf-8')
+
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is required to read {codec} values")
+
+        key = dict_id if codec == 'zstd-dict' else None
+        if key not in self._decompressors:
+            if key is None:
+                self._decompressors[key] = zstandard.ZstdDecompressor()
+            elif key not in self.dictionaries:
+                raise ValueError(f"compression dictionary {key} is not in compression_dicts")
+            else:
+                dictionary = zstandard.ZstdCompressionDict(self.dictionaries[key])
+                self._decompressors[key] = zstandard.ZstdDecompressor(dict_data=dictionary)
+        return self._decompressors[key].decompress(data).decode('utf-8')
+
+def train_dictionary(samples: List[str], dict_size: int = DEFAULT_DICT_SIZE) -> bytes:
+    """Train a zstd dictionary from sample texts (needs zstandard)"""
+    if zstandard is None:
+        raise RuntimeError("zstandard is not installed - pip install zstandard")
+
+    encoded = [sample.encode('utf-8') for sample in samples if sample]
+    dictionary = zstandard.train_dictionary(dict_size, encoded)
+    return dictionary.as_bytes()
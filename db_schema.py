@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+"""
+Database schema for News Balance Analyzer
+Table definitions for PostgreSQL and SQLite, plus the upgrades that bring an
+existing PostgreSQL news_items table up to the current layout:
+- process_data stored as JSONB instead of a json.dumps TEXT blob
+- is_relevant, category, model_used and processed_at promoted to indexed columns
+- partial index for the relevant-and-processed feed ordered by publication time
+
+Table, column and index statements are idempotent and run on every start.
+Data migrations (the JSONB conversion and the backfill) run once: they are
+recorded in schema_migrations, serialized between processes by an advisory
+lock, and cast legacy values with helpers that return NULL on bad input, so
+one malformed row cannot block the upgrade. A failed migration is rolled back
+on its own and retried on the next start.
+"""
+
+# NOTIFY channel the scraper signals on when a new article is saved
+NEW_ARTICLE_CHANNEL = "news_items_new"
+
+POSTGRES_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS news_items (
+        id SERIAL PRIMARY KEY,
+        title TEXT NOT NULL,
+        url TEXT NOT NULL UNIQUE,
+        scraped_at TEXT NOT NULL,
+        row_text TEXT,
+        actual_datetime TEXT NOT NULL,
+        content TEXT,
+        clean_content TEXT,
+        content_length INTEGER,
+        date_time TEXT,
+        hash_id TEXT UNIQUE,
+        isProcessed INTEGER DEFAULT 0,
+        process_data JSONB,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS news_hashes (
+        hash_id TEXT PRIMARY KEY,
+        scraped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Cold fields (raw page content, forum row text) compressed by compression.py
+    """
+    CREATE TABLE IF NOT EXISTS news_item_archive (
+        news_item_id INTEGER PRIMARY KEY REFERENCES news_items (id) ON DELETE CASCADE,
+        codec TEXT NOT NULL,
+        dict_id INTEGER,
+        content BYTEA,
+        row_text BYTEA,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS compression_dicts (
+        id SERIAL PRIMARY KEY,
+        codec TEXT NOT NULL,
+        dictionary BYTEA NOT NULL,
+        sample_count INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Read-optimized web feed: one row per relevant article, display fields only
+    """
+    CREATE TABLE IF NOT EXISTS news_feed (
+        news_item_id INTEGER PRIMARY KEY REFERENCES news_items (id) ON DELETE CASCADE,
+        title TEXT NOT NULL,
+        url TEXT NOT NULL,
+        clean_content TEXT,
+        actual_datetime TEXT NOT NULL,
+        process_data JSONB,
+        created_at TIMESTAMP,
+        refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS news_feed_order_idx ON news_feed (actual_datetime DESC, news_item_id DESC)",
+    # Anthropic responses keyed by a hash of model, parameters and prompt (llm_cache.py)
+    """
+    CREATE TABLE IF NOT EXISTS llm_cache (
+        cache_key TEXT PRIMARY KEY,
+        stage TEXT,
+        model TEXT,
+        response TEXT NOT NULL,
+        input_tokens INTEGER DEFAULT 0,
+        output_tokens INTEGER DEFAULT 0,
+        size_bytes INTEGER DEFAULT 0,
+        hit_count INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS llm_cache_last_used_idx ON llm_cache (last_used_at)",
+    # Trained local classifiers (prefilter.py), newest row per name wins
+    """
+    CREATE TABLE IF NOT EXISTS classifier_models (
+        id SERIAL PRIMARY KEY,
+        name TEXT NOT NULL,
+        model BYTEA NOT NULL,
+        sample_count INTEGER,
+        metrics JSONB,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Output of every finished processor stage, so a restart resumes at the first missing one
+    """
+    CREATE TABLE IF NOT EXISTS article_stages (
+        news_item_id INTEGER NOT NULL REFERENCES news_items (id) ON DELETE CASCADE,
+        stage TEXT NOT NULL,
+        output TEXT,
+        attempts INTEGER DEFAULT 0,
+        last_error TEXT,
+        partial_output TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (news_item_id, stage)
+    )
+    """,
+    # News events: articles about the same story share one research result (story_clusters.py)
+    """
+    CREATE TABLE IF NOT EXISTS story_clusters (
+        id SERIAL PRIMARY KEY,
+        title TEXT NOT NULL,
+        signature TEXT NOT NULL,
+        research TEXT,
+        article_count INTEGER DEFAULT 1,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS story_clusters_created_idx ON story_clusters (created_at)",
+    # Stage 2 findings keyed by a normalized topic signature (research_cache.py)
+    """
+    CREATE TABLE IF NOT EXISTS research_cache (
+        topic_key TEXT PRIMARY KEY,
+        topic TEXT,
+        research TEXT NOT NULL,
+        hit_count INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS research_cache_last_used_idx ON research_cache (last_used_at)",
+    # Small JSON state the processor learns across runs, e.g. token budget calibration (token_budget.py)
+    """
+    CREATE TABLE IF NOT EXISTS processor_state (
+        name TEXT PRIMARY KEY,
+        data TEXT NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # One row per Anthropic call: tokens, latency, retries, outcome and cost (telemetry.py)
+    """
+    CREATE TABLE IF NOT EXISTS llm_calls (
+        id SERIAL PRIMARY KEY,
+        news_item_id INTEGER,
+        stage TEXT NOT NULL,
+        model TEXT,
+        input_tokens INTEGER DEFAULT 0,
+        output_tokens INTEGER DEFAULT 0,
+        cache_creation_input_tokens INTEGER DEFAULT 0,
+        cache_read_input_tokens INTEGER DEFAULT 0,
+        latency_ms INTEGER,
+        retries INTEGER DEFAULT 0,
+        outcome TEXT NOT NULL,
+        batch BOOLEAN DEFAULT FALSE,
+        cost_usd DOUBLE PRECISION DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS llm_calls_created_idx ON llm_calls (created_at)",
+    # One-time data migrations already applied (see MIGRATIONS)
+    """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        name TEXT PRIMARY KEY,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+]
+
+# Same layout for local SQLite runs - process_data holds JSON text
+SQLITE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS news_items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        url TEXT NOT NULL UNIQUE,
+        scraped_at TEXT NOT NULL,
+        row_text TEXT,
+        actual_datetime TEXT NOT NULL,
+        content TEXT,
+        clean_content TEXT,
+        content_length INTEGER,
+        date_time TEXT,
+        hash_id TEXT UNIQUE,
+        isProcessed INTEGER DEFAULT 0,
+        process_data TEXT,
+        is_relevant INTEGER,
+        category TEXT,
+        model_used TEXT,
+        processed_at TEXT,
+        story_cluster_id INTEGER,
+        controversy_type TEXT,
+        relevance_confidence REAL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS news_hashes (
+        hash_id TEXT PRIMARY KEY,
+        scraped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS news_item_archive (
+        news_item_id INTEGER PRIMARY KEY REFERENCES news_items (id) ON DELETE CASCADE,
+        codec TEXT NOT NULL,
+        dict_id INTEGER,
+        content BLOB,
+        row_text BLOB,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS compression_dicts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        codec TEXT NOT NULL,
+        dictionary BLOB NOT NULL,
+        sample_count INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS news_feed (
+        news_item_id INTEGER PRIMARY KEY REFERENCES news_items (id) ON DELETE CASCADE,
+        title TEXT NOT NULL,
+        url TEXT NOT NULL,
+        clean_content TEXT,
+        actual_datetime TEXT NOT NULL,
+        process_data TEXT,
+        created_at TIMESTAMP,
+        refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS news_feed_order_idx ON news_feed (actual_datetime DESC, news_item_id DESC)",
+    """
+    CREATE TABLE IF NOT EXISTS llm_cache (
+        cache_key TEXT PRIMARY KEY,
+        stage TEXT,
+        model TEXT,
+        response TEXT NOT NULL,
+        input_tokens INTEGER DEFAULT 0,
+        output_tokens INTEGER DEFAULT 0,
+        size_bytes INTEGER DEFAULT 0,
+        hit_count INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS llm_cache_last_used_idx ON llm_cache (last_used_at)",
+    """
+    CREATE TABLE IF NOT EXISTS classifier_models (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        model BLOB NOT NULL,
+        sample_count INTEGER,
+        metrics TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS article_stages (
+        news_item_id INTEGER NOT NULL REFERENCES news_items (id) ON DELETE CASCADE,
+        stage TEXT NOT NULL,
+        output TEXT,
+        attempts INTEGER DEFAULT 0,
+        last_error TEXT,
+        partial_output TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (news_item_id, stage)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS story_clusters (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        signature TEXT NOT NULL,
+        research TEXT,
+        article_count INTEGER DEFAULT 1,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS story_clusters_created_idx ON story_clusters (created_at)",
+    """
+    CREATE TABLE IF NOT EXISTS research_cache (
+        topic_key TEXT PRIMARY KEY,
+        topic TEXT,
+        research TEXT NOT NULL,
+        hit_count INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS research_cache_last_used_idx ON research_cache (last_used_at)",
+    """
+    CREATE TABLE IF NOT EXISTS processor_state (
+        name TEXT PRIMARY KEY,
+        data TEXT NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS llm_calls (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        news_item_id INTEGER,
+        stage TEXT NOT NULL,
+        model TEXT,
+        input_tokens INTEGER DEFAULT 0,
+        output_tokens INTEGER DEFAULT 0,
+        cache_creation_input_tokens INTEGER DEFAULT 0,
+        cache_read_input_tokens INTEGER DEFAULT 0,
+        latency_ms INTEGER,
+        retries INTEGER DEFAULT 0,
+        outcome TEXT NOT NULL,
+        batch INTEGER DEFAULT 0,
+        cost_usd REAL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS llm_calls_created_idx ON llm_calls (created_at)",
+    "CREATE INDEX IF NOT EXISTS news_items_unprocessed_idx ON news_items (isProcessed, created_at)",
+    "CREATE INDEX IF NOT EXISTS news_items_category_idx ON news_items (category)",
+    "CREATE INDEX IF NOT EXISTS news_items_model_used_idx ON news_items (model_used)",
+    "CREATE INDEX IF NOT EXISTS news_items_processed_at_idx ON news_items (processed_at)",
+    "CREATE INDEX IF NOT EXISTS news_items_story_cluster_idx ON news_items (story_cluster_id)",
+    """
+    CREATE INDEX IF NOT EXISTS news_items_feed_idx
+        ON news_items (actual_datetime DESC, id DESC)
+        WHERE isProcessed = 1 AND is_relevant = 1
+    """,
+]
+
+# Promoted columns that the processor writes next to process_data, and later additions to other tables
+PROMOTED_COLUMNS = [
+    "ALTER TABLE news_items ADD COLUMN IF NOT EXISTS is_relevant BOOLEAN",
+    "ALTER TABLE news_items ADD COLUMN IF NOT EXISTS category TEXT",
+    "ALTER TABLE news_items ADD COLUMN IF NOT EXISTS model_used TEXT",
+    "ALTER TABLE news_items ADD COLUMN IF NOT EXISTS processed_at TIMESTAMP",
+    "ALTER TABLE news_items ADD COLUMN IF NOT EXISTS story_cluster_id INTEGER",
+    "ALTER TABLE news_items ADD COLUMN IF NOT EXISTS controversy_type TEXT",
+    "ALTER TABLE news_items ADD COLUMN IF NOT EXISTS relevance_confidence REAL",
+    "ALTER TABLE article_stages ADD COLUMN IF NOT EXISTS partial_output TEXT",
+]
+
+# Columns added after the first SQLite layout: (table, column, type) - SQLite has no ADD COLUMN IF NOT EXISTS
+SQLITE_ADDED_COLUMNS = [
+    ("news_items", "story_cluster_id", "INTEGER"),
+    ("news_items", "controversy_type", "TEXT"),
+    ("news_items", "relevance_confidence", "REAL"),
+    ("article_stages", "partial_output", "TEXT"),
+]
+
+# Casts of legacy text values that return NULL instead of failing the migration
+TRY_JSONB = """
+    CREATE OR REPLACE FUNCTION try_jsonb(value TEXT) RETURNS JSONB AS $$
+    BEGIN
+        RETURN NULLIF(value, '')::jsonb;
+    EXCEPTION WHEN others THEN
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql IMMUTABLE
+"""
+TRY_BOOLEAN = """
+    CREATE OR REPLACE FUNCTION try_boolean(value TEXT) RETURNS BOOLEAN AS $$
+    BEGIN
+        RETURN value::boolean;
+    EXCEPTION WHEN others THEN
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql IMMUTABLE
+"""
+TRY_TIMESTAMP = """
+    CREATE OR REPLACE FUNCTION try_timestamp(value TEXT) RETURNS TIMESTAMP AS $$
+    BEGIN
+        RETURN value::timestamp;
+    EXCEPTION WHEN others THEN
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql IMMUTABLE
+"""
+
+# Convert the legacy TEXT column - empty strings written by the scraper and unreadable JSON become NULL
+CONVERT_PROCESS_DATA = """
+    DO $$
+    BEGIN
+        IF (SELECT data_type FROM information_schema.columns
+            WHERE table_name = 'news_items' AND column_name = 'process_data') = 'text' THEN
+            ALTER TABLE news_items
+                ALTER COLUMN process_data TYPE JSONB
+                USING try_jsonb(process_data);
+        END IF;
+    END $$;
+"""
+
+# Fill the promoted columns for rows processed before they existed
+BACKFILL_PROMOTED_COLUMNS = """
+    UPDATE news_items
+    SET is_relevant = COALESCE(try_boolean(process_data->>'is_relevant'), isProcessed = 1),
+        category = COALESCE(process_data->>'category', process_data->'analysis'->>'category'),
+        model_used = process_data->>'model_used',
+        processed_at = try_timestamp(process_data->>'processed_at')
+    WHERE process_data IS NOT NULL
+      AND is_relevant IS NULL
+"""
+
+# One-time data migrations in order: (name recorded in schema_migrations, statements)
+MIGRATIONS = [
+    ('convert_process_data', [TRY_JSONB, CONVERT_PROCESS_DATA]),
+    ('backfill_promoted_columns', [TRY_BOOLEAN, TRY_TIMESTAMP, BACKFILL_PROMOTED_COLUMNS]),
+]
+
+# pg_advisory_xact_lock key serializing the migrations of processes starting together
+MIGRATION_LOCK = 7_304_150_026
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS news_items_is_relevant_idx ON news_items (is_relevant)",
+    "CREATE INDEX IF NOT EXISTS news_items_category_idx ON news_items (category)",
+    "CREATE INDEX IF NOT EXISTS news_items_model_used_idx ON news_items (model_used)",
+    "CREATE INDEX IF NOT EXISTS news_items_processed_at_idx ON news_items (processed_at)",
+    "CREATE INDEX IF NOT EXISTS news_items_story_cluster_idx ON news_items (story_cluster_id)",
+    # The processor queue: unprocessed articles oldest first
+    """
+    CREATE INDEX IF NOT EXISTS news_items_unprocessed_idx
+        ON news_items (created_at)
+        WHERE isProcessed = 0
+    """,
+    # The web feed: relevant, processed articles newest first
+    """
+    CREATE INDEX IF NOT EXISTS news_items_feed_idx
+        ON news_items (actual_datetime DESC, id DESC)
+        WHERE isProcessed = 1 AND is_relevant
+    """,
+]
+
+def apply_migrations(cursor):
+    """Run the data migrations not yet recorded in schema_migrations, each in its own savepoint"""
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK,))
+    cursor.execute("SELECT name FROM schema_migrations")
+    applied = {row[0] for row in cursor.fetchall()}
+    for name, statements in MIGRATIONS:
+        if name in applied:
+            continue
+        cursor.execute("SAVEPOINT migration")
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+            rows = cursor.rowcount
+            cursor.execute("INSERT INTO schema_migrations (name) VALUES (%s)", (name,))
+            cursor.execute("RELEASE SAVEPOINT migration")
+        except Exception as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT migration")
+            print(f"[WARNING] Migration {name} failed - retried on the next start: {e}")
+            continue
+        print(f"[DATABASE] Applied migration {name}" + (f" ({rows} rows)" if rows > 0 else ""))
+
+def ensure_schema(conn) -> bool:
+    """Create tables and apply all schema upgrades on an open psycopg2 connection"""
+    try:
+        cursor = conn.cursor()
+
+        for statement in POSTGRES_TABLES:
+            cursor.execute(statement)
+
+        for statement in PROMOTED_COLUMNS:
+            cursor.execute(statement)
+
+        apply_migrations(cursor)
+
+        for statement in INDEXES:
+            cursor.execute(statement)
+
+        conn.commit()
+        return True
+
+    except Exception as e:
+        conn.rollback()
+        print(f"[ERROR] Error upgrading database schema: {e}")
+        return False
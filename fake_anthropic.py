@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+"""
+Offline stand-in for the Anthropic API
+A small local server that answers the endpoints the processor uses, so the
+pipeline (including the Message Batches mode) can be run and tested without
+an API key or network access:
+
+    POST /v1/messages                      - one message (streamed as SSE with "stream": true)
+    POST /v1/messages/batches              - create a Message Batch
+    GET  /v1/messages/batches/{id}         - batch status
+    GET  /v1/messages/batches/{id}/results - batch results (.jsonl)
+
+Usage:
+    python fake_anthropic.py --port 8765 --batch-delay 5
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8765 ANTHROPIC_API_KEY=test python process_articles.py --batch-api
+
+Answers are canned: relevance prompts come back political unless the title
+looks like sport/entertainment/weather (as a structured verdict when the tool
+call is forced; batched relevance prompts get one verdict per article, leaving
+out titles with "חסר"), research on a rumour (a topic with "שמועה") says it
+found nothing and then rambles on, everything else gets a short Hebrew text
+that passes the research quality check.
+
+Prompt caching is emulated: a system prefix ending in a cache_control block is
+reported as cache_creation_input_tokens the first time and as
+cache_read_input_tokens while it stays warm (5 minutes), so
+`process_articles.py --check-prompt-cache` can verify the prompt split offline.
+"""
+
+import json
+import time
+import uuid
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timezone, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, List
+
+# Prompt cache entries stay warm this long after their last use, like the API's default
+PROMPT_CACHE_TTL = 300
+
+# Titles containing these are answered as non-political by the relevance stand-in
+NON_POLITICAL_TITLE_WORDS = ["ספורט", "כדורגל", "כדורסל", "מזג האוויר", "מזג אוויר", "בידור", "סלבס"]
+
+# Research topics containing this get the "nothing found" answer
+NO_INFO_TOPIC_WORD = "שמועה"
+
+# Titles containing this are left out of batched relevance answers, to exercise the fallback
+MISSING_VERDICT_WORD = "חסר"
+
+# Characters per content_block_delta of a streamed answer
+STREAM_CHUNK_CHARS = 20
+
+def message_text(params: Dict) -> str:
+    """All user text of a messages.create request"""
+    parts = []
+    for message in params.get('messages', []):
+        content = message.get('content')
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.extend(block.get('text', '') for block in content or [] if isinstance(block, dict))
+    return "\n".join(parts)
+
+def relevance_reply(title_line: str) -> str:
+    """Relevance answer for one title"""
+    if any(word in title_line for word in NON_POLITICAL_TITLE_WORDS):
+        return "ספורט - כתבה שגרתית, לא נושא שנוי במחלוקת"
+    return "כן - נושא פוליטי שנוי במחלוקת בין הקואליציה לאופוזיציה"
+
+def relevance_verdict(title_line: str) -> Dict:
+    """Structured relevance verdict (record_relevance tool input) for one title"""
+    if any(word in title_line for word in NON_POLITICAL_TITLE_WORDS):
+        return {'relevant': False, 'category': "ספורט", 'controversy_type': 'none', 'confidence': 0.95}
+    return {'relevant': True, 'category': "פוליטיקה", 'controversy_type': 'political', 'confidence': 0.9}
+
+def batched_items(text: str):
+    """(article id, title line) of each article in a batched relevance prompt, minus MISSING_VERDICT_WORD titles"""
+    for item in text.split('מזהה:')[1:]:
+        article_id = int(item.split('\n', 1)[0].strip())
+        title_line = item.split('כותרת:', 1)[1].split('\n', 1)[0] if 'כותרת:' in item else ''
+        if MISSING_VERDICT_WORD not in title_line:
+            yield article_id, title_line
+
+def batched_relevance_reply(text: str) -> str:
+    """JSON verdicts for a batched free-text relevance prompt"""
+    verdicts = [{'id': article_id, 'answer': relevance_reply(title_line)} for article_id, title_line in batched_items(text)]
+    return json.dumps(verdicts, ensure_ascii=False)
+
+def tool_input(params: Dict) -> Dict:
+    """Input of the forced tool call of a structured relevance request"""
+    text = message_text(params)
+    if params['tool_choice']['name'] == 'record_relevance_verdicts':
+        return {'verdicts': [dict(relevance_verdict(title_line), id=article_id)
+                             for article_id, title_line in batched_items(text)]}
+    title_line = text.split('כותרת:', 1)[1].split('\n', 1)[0] if 'כותרת:' in text else ''
+    return relevance_verdict(title_line)
+
+def canned_reply(params: Dict) -> str:
+    """Deterministic answer for one request"""
+    text = message_text(params)
+    if 'מזהה:' in text:
+        return batched_relevance_reply(text)
+    if 'כותרת:' in text:
+        return relevance_reply(text.split('כותרת:', 1)[1].split('\n', 1)[0])
+    if 'נושא:' in text and NO_INFO_TOPIC_WORD in text.split('נושא:', 1)[1].split('\n', 1)[0]:
+        return "לא מצאתי מידע נוסף על הנושא. " + "ייתכן שמדובר בשמועה שלא אומתה. " * 40
+    return ("לפי דיווח בעיתון הארץ ועל פי הצהרה של משרד ראש הממשלה, הנושא נמצא במחלוקת. "
+            "לדברי גורמים באופוזיציה המהלך פוגע באיזון, ובאתר ישראל היום הוצגה עמדה מנוגדת. "
+            "זהו טקסט דמה שנוצר על ידי השרת המקומי לצורך בדיקות בלבד.")
+
+def count_tokens(text: str) -> int:
+    """Token estimate used for the fake usage numbers (~2 Hebrew characters per token)"""
+    return len(text) // 2
+
+def cached_prefix(params: Dict) -> str:
+    """Text up to and including the last system block marked with cache_control"""
+    system = params.get('system')
+    if not isinstance(system, list):
+        return ""
+    prefix = ""
+    text = ""
+    for block in system:
+        text += block.get('text', '')
+        if block.get('cache_control'):
+            prefix = text
+    return prefix
+
+def iso(moment: datetime) -> str:
+    """RFC 3339 timestamp"""
+    return moment.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
+
+class FakeAnthropicState:
+    """Batches and prompt-cache entries of one server; batches end after batch_delay seconds"""
+
+    def __init__(self, batch_delay: float = 5.0, message_delay: float = 0.0, min_cache_tokens: int = 0,
+                 fail_prompt: str = None, chunk_delay: float = 0.0, overloaded_model: str = None):
+        self.batch_delay = batch_delay
+        self.message_delay = message_delay
+        # Pause between the chunks of a streamed answer
+        self.chunk_delay = chunk_delay
+        self.min_cache_tokens = min_cache_tokens
+        # Requests whose prompt contains this text get a 500, to exercise stage retries
+        self.fail_prompt = fail_prompt
+        # Requests for this model get a 529, to exercise the overload fallback
+        self.overloaded_model = overloaded_model
+        self.batches: Dict[str, Dict] = {}
+        # Prompt cache: hash of model + cached prefix -> expiry time (5 minute TTL, refreshed on read)
+        self.prompt_cache: Dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def usage(self, params: Dict, reply: str) -> Dict:
+        """Token usage with prompt caching applied like the real API reports it"""
+        prefix = cached_prefix(params)
+        system = params.get('system')
+        system_text = system if isinstance(system, str) else "".join(
+            block.get('text', '') for block in system or [])
+        total = count_tokens(system_text) + count_tokens(message_text(params)) + 10
+        usage = {'input_tokens': total, 'output_tokens': count_tokens(reply) + 1,
+                 'cache_creation_input_tokens': 0, 'cache_read_input_tokens': 0}
+
+        prefix_tokens = count_tokens(prefix)
+        if not prefix or prefix_tokens < self.min_cache_tokens:
+            return usage
+
+        key = hashlib.sha256(f"{params.get('model')}\n{prefix}".encode('utf-8')).hexdigest()
+        now = time.time()
+        with self.lock:
+            hit = self.prompt_cache.get(key, 0) > now
+            self.prompt_cache[key] = now + PROMPT_CACHE_TTL
+        usage['cache_read_input_tokens' if hit else 'cache_creation_input_tokens'] = prefix_tokens
+        usage['input_tokens'] = total - prefix_tokens
+        return usage
+
+    def should_fail(self, params: Dict) -> bool:
+        """True for requests matching --fail-prompt"""
+        if not self.fail_prompt:
+            return False
+        return self.fail_prompt in json.dumps(params, ensure_ascii=False)
+
+    def make_message(self, params: Dict) -> Dict:
+        """A Messages API response body for one request"""
+        if (params.get('tool_choice') or {}).get('type') == 'tool':
+            tool_call = tool_input(params)
+            reply = json.dumps(tool_call, ensure_ascii=False)
+            content = [{'type': 'tool_use', 'id': f"toolu_{uuid.uuid4().hex[:24]}",
+                        'name': params['tool_choice']['name'], 'input': tool_call}]
+        else:
+            reply = canned_reply(params)
+            content = [{'type': 'text', 'text': reply}]
+        return {
+            'id': f"msg_{uuid.uuid4().hex[:24]}",
+            'type': 'message',
+            'role': 'assistant',
+            'model': params.get('model', 'claude-3-haiku-20240307'),
+            'content': content,
+            'stop_reason': 'tool_use' if content[0]['type'] == 'tool_use' else 'end_turn',
+            'stop_sequence': None,
+            'usage': self.usage(params, reply)
+        }
+
+    def stream_events(self, params: Dict):
+        """(event, data) pairs of a streamed Messages API response"""
+        message = self.make_message(params)
+        reply = message['content'][0]['text']
+        start = dict(message, content=[], stop_reason=None, usage=dict(message['usage'], output_tokens=1))
+        yield 'message_start', {'type': 'message_start', 'message': start}
+        yield 'content_block_start', {'type': 'content_block_start', 'index': 0,
+                                      'content_block': {'type': 'text', 'text': ''}}
+        for offset in range(0, len(reply), STREAM_CHUNK_CHARS):
+            if self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            yield 'content_block_delta', {'type': 'content_block_delta', 'index': 0,
+                                          'delta': {'type': 'text_delta', 'text': reply[offset:offset + STREAM_CHUNK_CHARS]}}
+        yield 'content_block_stop', {'type': 'content_block_stop', 'index': 0}
+        yield 'message_delta', {'type': 'message_delta', 'delta': {'stop_reason': 'end_turn', 'stop_sequence': None},
+                                'usage': {'output_tokens': message['usage']['output_tokens']}}
+        yield 'message_stop', {'type': 'message_stop'}
+
+    def create_batch(self, requests: List[Dict]) -> Dict:
+        """Store a new batch; its results are computed right away but released later"""
+        batch_id = f"msgbatch_{uuid.uuid4().hex[:24]}"
+        results = [{
+            'custom_id': request['custom_id'],
+            'result': {'type': 'succeeded', 'message': self.make_message(request['params'])}
+        } for request in requests]
+        with self.lock:
+            self.batches[batch_id] = {
+                'created': datetime.now(timezone.utc),
+                'results': results
+            }
+        return self.batch_object(batch_id, None)
+
+    def batch_object(self, batch_id: str, base_url) -> Dict:
+        """MessageBatch body in its current state"""
+        batch = self.batches[batch_id]
+        created = batch['created']
+        ended = (datetime.now(timezone.utc) - created).total_seconds() >= self.batch_delay
+        count = len(batch['results'])
+        return {
+            'id': batch_id,
+            'type': 'message_batch',
+            'processing_status': 'ended' if ended else 'in_progress',
+            'request_counts': {
+                'processing': 0 if ended else count,
+                'succeeded': count if ended else 0,
+                'errored': 0,
+                'canceled': 0,
+                'expired': 0
+            },
+            'created_at': iso(created),
+            'expires_at': iso(created + timedelta(hours=24)),
+            'ended_at': iso(created + timedelta(seconds=self.batch_delay)) if ended else None,
+            'archived_at': None,
+            'cancel_initiated_at': None,
+            'results_url': f"{base_url}/v1/messages/batches/{batch_id}/results" if ended and base_url else None
+        }
+
+def make_handler(state: FakeAnthropicState):
+    """Request handler bound to one server state"""
+
+    class FakeAnthropicHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def base_url(self) -> str:
+            return f"http://{self.headers.get('Host', '127.0.0.1')}"
+
+        def send_body(self, status: int, body: str, content_type: str = 'application/json'):
+            data = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.send_header('request-id', f"req_{uuid.uuid4().hex[:24]}")
+            self.end_headers()
+            self.wfile.write(data)
+
+        def send_json(self, status: int, body: Dict):
+            self.send_body(status, json.dumps(body, ensure_ascii=False))
+
+        def send_stream(self, params: Dict):
+            """Server-sent events until the answer is done or the client hangs up"""
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('request-id', f"req_{uuid.uuid4().hex[:24]}")
+            self.end_headers()
+            try:
+                for event, data in state.stream_events(params):
+                    self.wfile.write(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def not_found(self):
+            self.send_json(404, {'type': 'error', 'error': {'type': 'not_found_error', 'message': self.path}})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            path = self.path.split('?', 1)[0]
+
+            if path == '/v1/messages':
+                if state.message_delay:
+                    time.sleep(state.message_delay)
+                if state.should_fail(body):
+                    self.send_json(500, {'type': 'error', 'error': {'type': 'api_error', 'message': 'injected failure'}})
+                elif state.overloaded_model and body.get('model') == state.overloaded_model:
+                    self.send_json(529, {'type': 'error', 'error': {'type': 'overloaded_error', 'message': 'Overloaded'}})
+                elif body.get('stream'):
+                    self.send_stream(body)
+                else:
+                    self.send_json(200, state.make_message(body))
+            elif path == '/v1/messages/batches':
+                batch = state.create_batch(body.get('requests', []))
+                self.send_json(200, batch)
+            else:
+                self.not_found()
+
+        def do_GET(self):
+            parts = self.path.split('?', 1)[0].strip('/').split('/')
+            # v1 / messages / batches / {id} [/ results]
+            if len(parts) < 4 or parts[:3] != ['v1', 'messages', 'batches'] or parts[3] not in state.batches:
+                return self.not_found()
+
+            batch_id = parts[3]
+            if len(parts) == 4:
+                self.send_json(200, state.batch_object(batch_id, self.base_url()))
+            elif len(parts) == 5 and parts[4] == 'results':
+                lines = [json.dumps(result, ensure_ascii=False) for result in state.batches[batch_id]['results']]
+                self.send_body(200, "\n".join(lines) + "\n", 'application/binary')
+            else:
+                self.not_found()
+
+    return FakeAnthropicHandler
+
+def run_server(port: int = 8765, batch_delay: float = 5.0, message_delay: float = 0.0,
+               min_cache_tokens: int = 0, fail_prompt: str = None, chunk_delay: float = 0.0,
+               overloaded_model: str = None):
+    """Serve until interrupted"""
+    state = FakeAnthropicState(batch_delay, message_delay, min_cache_tokens, fail_prompt, chunk_delay,
+                               overloaded_model)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(state))
+    print(f"[START] Fake Anthropic API on http://127.0.0.1:{port} (batches end after {batch_delay}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[STOP] Fake Anthropic API stopped")
+    finally:
+        server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline stand-in for the Anthropic API")
+    parser.add_argument('--port', type=int, default=8765, help="port to listen on (default: 8765)")
+    parser.add_argument('--batch-delay', type=float, default=5.0,
+                        help="seconds before a submitted batch ends (default: 5)")
+    parser.add_argument('--message-delay', type=float, default=0.0,
+                        help="simulated latency of a single message call (default: 0)")
+    parser.add_argument('--min-cache-tokens', type=int, default=0,
+                        help="shortest prefix that gets prompt-cached, like the real per-model minimum (default: 0)")
+    parser.add_argument('--fail-prompt', default=None,
+                        help="answer 500 to single messages whose prompt contains this text (tests stage retries)")
+    parser.add_argument('--chunk-delay', type=float, default=0.0,
+                        help="pause between the chunks of a streamed answer (default: 0)")
+    parser.add_argument('--overloaded-model', default=None,
+                        help="answer 529 to single messages for this model (tests the overload fallback)")
+    args = parser.parse_args()
+    run_server(args.port, args.batch_delay, args.message_delay, args.min_cache_tokens, args.fail_prompt,
+               args.chunk_delay, args.overloaded_model)
+
+if __name__ == "__main__":
+    main()
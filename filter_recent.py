@@ -5,30 +5,25 @@ This now scrapes live from the website instead of just filtering existing data.
 """
 
 import json
-from datetime import datetime, timedelta
+from datetime import datetime
 import re
 import requests
 from bs4 import BeautifulSoup
 import time
-import psycopg2
-import psycopg2.extras
 import hashlib
-import os
-from dotenv import load_dotenv
+from common import load_env
+from storage import get_storage
+from title_triage import TitleTriage
 
 # Load environment variables
 # Try to load from .env.local for local development, but Railway will provide env vars directly
-if os.path.exists('.env.local'):
-    load_dotenv('.env.local')
-    print("Loaded environment variables from .env.local (local development)")
-else:
-    print("Using environment variables from Railway (production)")
+load_env(announce=True)
 
 class LiveRotterScraper:
     def __init__(self):
         self.base_url = "https://rotter.net"
         self.forum_url = "https://rotter.net/forum/"
-        self.db_url = os.getenv('DATABASE_URL')
+        self.storage = get_storage()
         # Create a session for better connection handling
         self.session = requests.Session()
         
@@ -44,55 +39,16 @@ class LiveRotterScraper:
         
         # Initialize database
         self.init_database()
-    
-    def get_db_connection(self):
-        """Get a database connection"""
-        try:
-            return psycopg2.connect(self.db_url)
-        except Exception as e:
-            print(f"Error connecting to database: {e}")
-            return None
+        
+        # Optional title triage before content downloads (TITLE_TRIAGE=local/llm)
+        self.triage = TitleTriage.from_env(self.storage)
     
     def init_database(self):
-        """Initialize the PostgreSQL database and create tables if they don't exist."""
+        """Initialize the database and create tables if they don't exist."""
         try:
-            conn = self.get_db_connection()
-            if not conn:
-                return
-                
-            cursor = conn.cursor()
-            
-            # Create news_items table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS news_items (
-                    id SERIAL PRIMARY KEY,
-                    title TEXT NOT NULL,
-                    url TEXT NOT NULL UNIQUE,
-                    scraped_at TEXT NOT NULL,
-                    row_text TEXT,
-                    actual_datetime TEXT NOT NULL,
-                    content TEXT,
-                    clean_content TEXT,
-                    content_length INTEGER,
-                    date_time TEXT,
-                    hash_id TEXT UNIQUE,
-                    isProcessed INTEGER DEFAULT 0,
-                    process_data TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Create a hash table for quick lookup
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS news_hashes (
-                    hash_id TEXT PRIMARY KEY,
-                    scraped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            conn.commit()
-            conn.close()
-            print(f"Database initialized successfully")
+            # Also upgrades older tables (JSONB process_data, relevance columns, feed index)
+            if self.storage.init_schema():
+                print(f"Database initialized successfully: {self.storage.describe()}")
         except Exception as e:
             print(f"Error initializing database: {e}")
     
@@ -104,15 +60,7 @@ class LiveRotterScraper:
     def is_article_exists(self, hash_id):
         """Check if an article already exists in the database"""
         try:
-            conn = self.get_db_connection()
-            if not conn:
-                return False
-                
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM news_items WHERE hash_id = %s", (hash_id,))
-            count = cursor.fetchone()[0]
-            conn.close()
-            return count > 0
+            return self.storage.article_exists(hash_id)
         except Exception as e:
             print(f"Error checking article existence: {e}")
             return False
@@ -120,35 +68,12 @@ class LiveRotterScraper:
     def show_database_summary(self):
         """Show a summary of what's already in the database before scraping"""
         try:
-            conn = self.get_db_connection()
-            if not conn:
-                return
-                
-            cursor = conn.cursor()
-            
-            # Get recent articles count
-            cursor.execute("""
-                SELECT COUNT(*) FROM news_items 
-                WHERE created_at >= NOW() - INTERVAL '1 day'
-            """)
-            recent_count = cursor.fetchone()[0]
-            
-            # Get total count
-            cursor.execute("SELECT COUNT(*) FROM news_items")
-            total_count = cursor.fetchone()[0]
-            
-            # Get latest article timestamp
-            cursor.execute("""
-                SELECT created_at FROM news_items 
-                ORDER BY created_at DESC LIMIT 1
-            """)
-            latest_result = cursor.fetchone()
-            latest_timestamp = latest_result[0] if latest_result else "None"
-            
-            conn.close()
+            stats = self.storage.get_processing_stats()
+            latest_timestamp = self.storage.get_latest_created_at() or "None"
+            recent_count = stats['last_24h']
             
             print(f"Database Summary:")
-            print(f"   Total articles stored: {total_count}")
+            print(f"   Total articles stored: {stats['total']}")
             print(f"   Articles from last 24 hours: {recent_count}")
             print(f"   Latest article added: {latest_timestamp}")
             
@@ -162,48 +87,16 @@ class LiveRotterScraper:
             return 0
     
     def save_article_to_db(self, article_data):
-        """Save an article to the database"""
+        """Save an article as soon as its content is in, so the processor is notified right away
+        
+        Returns True only when the article was inserted.
+        """
+        article_data['hash_id'] = self.generate_article_hash(article_data['title'], article_data['url'])
         try:
-            conn = self.get_db_connection()
-            if not conn:
-                return False
-                
-            cursor = conn.cursor()
-            
-            # Generate hash for this article
-            hash_id = self.generate_article_hash(article_data['title'], article_data['url'])
-            
-            # Check if article already exists
-            if self.is_article_exists(hash_id):
+            if self.storage.save_article(article_data) is None:
                 print(f"    [WARNING]  Article already exists in database (skipping)")
-                conn.close()
                 return False
-            
-            # Insert new article
-            cursor.execute('''
-                INSERT INTO news_items (
-                    title, url, scraped_at, row_text, actual_datetime, 
-                    content, clean_content, content_length, date_time, hash_id,
-                    isProcessed, process_data
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ''', (
-                article_data['title'],
-                article_data['url'],
-                article_data['scraped_at'],
-                article_data.get('row_text', ''),
-                article_data.get('actual_datetime', ''),
-                article_data.get('content', ''),
-                article_data.get('clean_content', ''),
-                article_data.get('content_length', 0),
-                article_data.get('date_time', ''),
-                hash_id,
-                0,  # isProcessed defaults to False (0)
-                ''   # process_data starts empty
-            ))
-            
-            conn.commit()
-            conn.close()
-            print(f"    Article saved to database with hash: {hash_id[:8]}...")
+            print(f"    Article saved to database with hash: {article_data['hash_id'][:8]}...")
             return True
             
         except Exception as e:
@@ -213,36 +106,11 @@ class LiveRotterScraper:
     def get_database_stats(self):
         """Get statistics from the database"""
         try:
-            conn = self.get_db_connection()
-            if not conn:
-                return {'total': 0, 'last_24h': 0, 'last_hour': 0}
-                
-            cursor = conn.cursor()
-            
-            # Get total count
-            cursor.execute("SELECT COUNT(*) FROM news_items")
-            total_count = cursor.fetchone()[0]
-            
-            # Get count from last 24 hours
-            cursor.execute("""
-                SELECT COUNT(*) FROM news_items 
-                WHERE created_at >= NOW() - INTERVAL '1 day'
-            """)
-            last_24h_count = cursor.fetchone()[0]
-            
-            # Get count from last hour
-            cursor.execute("""
-                SELECT COUNT(*) FROM news_items 
-                WHERE created_at >= NOW() - INTERVAL '1 hour'
-            """)
-            last_hour_count = cursor.fetchone()[0]
-            
-            conn.close()
-            
+            stats = self.storage.get_processing_stats()
             return {
-                'total': total_count,
-                'last_24h': last_24h_count,
-                'last_hour': last_hour_count
+                'total': stats['total'],
+                'last_24h': stats['last_24h'],
+                'last_hour': stats['last_hour']
             }
             
         except Exception as e:
@@ -252,37 +120,7 @@ class LiveRotterScraper:
     def export_recent_articles_from_db(self, hours=5, limit=100):
         """Export recent articles from database to JSON format"""
         try:
-            conn = self.get_db_connection()
-            if not conn:
-                return []
-                
-            cursor = conn.cursor()
-            
-            # Get recent articles from the last N hours
-            cursor.execute("""
-                SELECT id, title, url, actual_datetime, clean_content, content_length, date_time, created_at
-                FROM news_items 
-                WHERE actual_datetime >= NOW() - INTERVAL '{} hours'
-                ORDER BY actual_datetime DESC
-                LIMIT %s
-            """.format(hours), (limit,))
-            
-            rows = cursor.fetchall()
-            conn.close()
-            
-            articles = []
-            for row in rows:
-                articles.append({
-                    'id': row[0],
-                    'title': row[1],
-                    'url': row[2],
-                    'actual_datetime': row[3],
-                    'clean_content': row[4],
-                    'content_length': row[5],
-                    'date_time': row[6],
-                    'created_at': row[7]
-                })
-            
+            articles = self.storage.export_recent_articles(hours, limit)
             print(f"Exported {len(articles)} articles from database (last {hours} hours)")
             return articles
             
@@ -293,27 +131,7 @@ class LiveRotterScraper:
     def check_article_exists_in_db(self, title, url):
         """Quick check if article already exists in database (faster than full hash check)"""
         try:
-            conn = self.get_db_connection()
-            if not conn:
-                return False
-                
-            cursor = conn.cursor()
-            
-            # Check by URL first (most reliable)
-            cursor.execute("SELECT COUNT(*) FROM news_items WHERE url = %s", (url,))
-            url_count = cursor.fetchone()[0]
-            
-            if url_count > 0:
-                conn.close()
-                return True
-            
-            # Also check by title similarity (for cases where URL might be slightly different)
-            cursor.execute("SELECT COUNT(*) FROM news_items WHERE title = %s", (title,))
-            title_count = cursor.fetchone()[0]
-            
-            conn.close()
-            return title_count > 0
-            
+            return self.storage.article_exists_by_url_or_title(title, url)
         except Exception as e:
             print(f"Error checking article existence: {e}")
             return False
@@ -747,6 +565,17 @@ class LiveRotterScraper:
         print(f"\n[NEWS] Found {len(recent_news_items)} recent news items from live website!")
         print("=" * 60)
         
+        # Step 1.5: Look up each item once - the triage and the download loop both need to know
+        stored = [(item, self.check_article_exists_in_db(item['title'], item['url'])) for item in recent_news_items]
+
+        # Triage the titles of new threads, so clearly non-political ones are not downloaded
+        if self.triage.enabled:
+            new_items = [item for item, exists in stored if not exists]
+            print(f"\n[TRIAGE] Triaging {len(new_items)} new titles ({self.triage.mode})...")
+            stored = [(item, True) for item, exists in stored if exists] + \
+                [(item, False) for item in self.triage.triage(new_items)]
+        recent_news_items = [item for item, _ in stored]
+        
         # Step 2: Get full content for the filtered items
         print(f"\n[NEWS] Getting full content for {len(recent_news_items)} recent items...")
         print("=" * 60)
@@ -757,11 +586,11 @@ class LiveRotterScraper:
         skipped_count = 0
         processed_count = 0
         
-        for i, item in enumerate(recent_news_items, 1):
+        for i, (item, exists) in enumerate(stored, 1):
             print(f"\nProcessing {i}/{len(recent_news_items)}: {item['title'][:50]}...")
             
-            # Check if article already exists in database
-            if self.check_article_exists_in_db(item['title'], item['url']):
+            # Skip articles that already exist in the database
+            if exists:
                 print(f"  [WARNING]  Article already exists in database (skipping): {item['title'][:50]}")
                 skipped_count += 1
                 continue
@@ -801,9 +630,11 @@ class LiveRotterScraper:
                     print(f"  [WARNING]  No datetime found for this article")
                 
                 # Save to database
-                self.save_article_to_db(item)
-                events_with_content.append(item)
-                processed_count += 1
+                if self.save_article_to_db(item):
+                    events_with_content.append(item)
+                    processed_count += 1
+                else:
+                    skipped_count += 1
             else:
                 print(f"  ✗ No content found")
                 skipped_count += 1
@@ -815,6 +646,9 @@ class LiveRotterScraper:
         print(f"[STATS] Processing Summary:")
         print(f"   ✓ New articles processed: {processed_count}")
         print(f"   [WARNING]  Articles skipped (already exist): {skipped_count}")
+        if self.triage.enabled:
+            print(f"   [TRIAGE] {self.triage.summary()}")
+            self.triage.flush()
         print(f"   [NEWS] Total recent events from last 5 hours: {len(events_with_content)}")
         
         # Sort articles by datetime (newest to oldest)
@@ -889,7 +723,7 @@ def main():
         scraper.save_to_json(events)
         print(f"\n[OK] All {len(events)} live recent news events have been saved to recent_news_only.json")
         print(f"🌐 You can now view these in your web interface at http://localhost:8080/news_scroller.html")
-        print(f"💾 Articles are also stored in SQLite database: {scraper.db_path}")
+        print(f"💾 Articles are also stored in the database: {scraper.storage.describe()}")
         
         # Show final summary
         print(f"\n🎯 Final Summary:")
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+"""
+Persistent LLM Response Cache for News Balance Analyzer
+Sits in front of every Anthropic messages call of the processor, so a reset
+(reset_database.py) or a crash mid-batch does not pay for the same four calls
+again. Entries live in the llm_cache table of the configured storage (SQLite
+or Postgres), are keyed by a hash of model, temperature and the full prompt,
+expire after a TTL and are evicted least-recently-used once the table grows
+past a size limit.
+
+max_tokens is not part of the key: it only caps the answer's length, and the
+adaptive max_tokens of token_budget.py changes from run to run. Answers that
+hit the cap are not stored, so a cut-off answer is never served. Article text
+trimmed to a token budget is part of the prompt, so changing TOKEN_BUDGETS (or
+the calibration moving a cut to another sentence) does change the key.
+
+Configuration:
+    LLM_CACHE=0                 # disable the cache
+    LLM_CACHE_TTL_HOURS=168     # entry lifetime (default: 7 days)
+    LLM_CACHE_MAX_MB=200        # size limit before LRU eviction
+
+Commands:
+    python llm_cache.py stats              # entries, size and hits per stage
+    python llm_cache.py clear [--stage X]  # drop cached responses
+    python llm_cache.py evict              # apply TTL and size limit now
+"""
+
+import os
+import json
+import hashlib
+import argparse
+from typing import Dict, Optional
+from common import load_env
+from storage import get_storage
+
+# Same environment handling as the scraper and processor
+load_env()
+
+# Stages whose answer depends on the moment it is asked
+UNCACHED_STAGES = {'internet_test'}
+
+# Run size-based eviction after this many new entries
+EVICT_EVERY = 100
+
+# Request parameters that limit the answer without shaping it
+UNKEYED_PARAMS = {'max_tokens'}
+
+def cache_key(params: Dict) -> str:
+    """Hash of everything that shapes the answer: model, sampling parameters and prompt"""
+    keyed = {name: value for name, value in params.items() if name not in UNKEYED_PARAMS}
+    encoded = json.dumps(keyed, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+class ResponseCache:
+    """Disk-backed response cache with per-run hit statistics"""
+
+    def __init__(self, storage, ttl_hours: int = 168, max_mb: int = 200, enabled: bool = True):
+        self.storage = storage
+        self.ttl_hours = ttl_hours
+        self.max_bytes = max_mb * 1024 * 1024
+        self.enabled = enabled
+        self.new_entries = 0
+        self.reset_stats()
+
+    @classmethod
+    def from_env(cls, storage) -> 'ResponseCache':
+        """Cache configured from LLM_CACHE* environment variables"""
+        return cls(
+            storage,
+            ttl_hours=int(os.getenv('LLM_CACHE_TTL_HOURS', '168')),
+            max_mb=int(os.getenv('LLM_CACHE_MAX_MB', '200')),
+            enabled=os.getenv('LLM_CACHE', '1') != '0'
+        )
+
+    def reset_stats(self):
+        """Start counting hits for a new run"""
+        self.stats = {'hits': 0, 'misses': 0, 'tokens_saved': 0}
+
+    def get(self, stage: str, params: Dict) -> Optional[str]:
+        """Cached response text, or None on a miss"""
+        if not self.enabled or stage in UNCACHED_STAGES:
+            return None
+        try:
+            entry = self.storage.get_cached_response(cache_key(params), self.ttl_hours)
+        except Exception as e:
+            print(f"[WARNING] Response cache lookup failed: {e}")
+            return None
+
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        self.stats['tokens_saved'] += entry['input_tokens'] + entry['output_tokens']
+        return entry['response']
+
+    def put(self, stage: str, params: Dict, response: str, usage=None, stop_reason: Optional[str] = None):
+        """Store a fresh response; answers cut off at max_tokens are not stored"""
+        if not self.enabled or stage in UNCACHED_STAGES or stop_reason == 'max_tokens':
+            return
+        try:
+            self.storage.put_cached_response(
+                cache_key(params), stage, params.get('model'), response,
+                getattr(usage, 'input_tokens', 0) or 0,
+                getattr(usage, 'output_tokens', 0) or 0
+            )
+            self.new_entries += 1
+            if self.new_entries % EVICT_EVERY == 0:
+                self.evict()
+        except Exception as e:
+            print(f"[WARNING] Response cache write failed: {e}")
+
+    def evict(self) -> int:
+        """Apply TTL and size limit"""
+        deleted = self.storage.evict_cached_responses(self.ttl_hours, self.max_bytes)
+        if deleted:
+            print(f"[CACHE] Evicted {deleted} cached responses")
+        return deleted
+
+    def hit_rate(self) -> float:
+        """Share of lookups answered from the cache in this run"""
+        lookups = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
+
+    def summary(self) -> str:
+        """One-line statistics for the processing report"""
+        if not self.enabled:
+            return "disabled"
+        return (f"hit rate {self.hit_rate() * 100:.1f}% "
+                f"({self.stats['hits']} hits / {self.stats['misses']} misses) - "
+                f"{self.stats['tokens_saved']} tokens saved")
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and maintain the LLM response cache")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('stats', help="entries, size and hits per stage")
+    clear_parser = subparsers.add_parser('clear', help="delete cached responses")
+    clear_parser.add_argument('--stage', help="only this stage (relevance, research, analysis, journalistic)")
+    subparsers.add_parser('evict', help="apply TTL and size limit now")
+    args = parser.parse_args()
+
+    storage = get_storage()
+    storage.init_schema()
+    cache = ResponseCache.from_env(storage)
+
+    try:
+        if args.command == 'stats':
+            rows = storage.cache_report()
+            print(f"[STATS] LLM response cache - {storage.describe()}")
+            for row in rows:
+                print(f"   {row['stage']:<14} {row['entries']:>7} entries  {row['size_bytes'] / 1024:>9.1f} KB  "
+                      f"{row['hits']:>7} hits  {row['tokens']:>10} tokens stored")
+            if not rows:
+                print("   (empty)")
+        elif args.command == 'clear':
+            deleted = storage.clear_cached_responses(args.stage)
+            print(f"[OK] Deleted {deleted} cached responses")
+        elif args.command == 'evict':
+            if not cache.evict():
+                print("[OK] Nothing to evict")
+    except Exception as e:
+        print(f"[ERROR] {e}")
+    finally:
+        storage.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+"""
+Model Routing for the Article Processor
+Every stage used to be sent to the same model. The router picks the model per
+stage from a routing table, and per article: a stage can name a second model
+for complex articles - long ones, big stories (many articles in the story
+cluster) or breaking news. In budget mode every stage uses the cheap fallback
+model instead. The fallback model also answers when the routed model is
+overloaded (529): the call switches to it instead of waiting out the backoff.
+
+The model that served each call is recorded in llm_calls (telemetry.py,
+`python telemetry.py report` breaks cost and latency down per model) and in
+the article's process_data (models per stage, model_used).
+
+Configuration:
+    MODEL_ROUTES="research=claude-3-5-haiku-20241022,analysis=claude-3-haiku-20240307/claude-sonnet-4-20250514"
+                                   # stage=model[/model for complex articles]; other stages keep the default
+    MODEL_FALLBACK=claude-3-haiku-20240307   # overload fallback and budget-mode model
+    MODEL_BUDGET_MODE=1            # every stage on the fallback model, no upgrades
+    MODEL_COMPLEX_CHARS=3000       # article length that counts as complex (0 = off)
+    MODEL_COMPLEX_CLUSTER=3        # story cluster size that counts as complex (0 = off)
+    MODEL_COMPLEX_BREAKING=1       # breaking-news titles count as complex
+
+Commands:
+    python model_router.py routes                  # the routing table in effect
+    python model_router.py route STAGE "כותרת" [--chars N] [--cluster N]   # model for one article
+"""
+
+import os
+import argparse
+from typing import Dict, Optional, Tuple
+from common import load_env
+
+# Same environment handling as the scraper and processor
+load_env()
+
+DEFAULT_MODEL = "claude-3-haiku-20240307"
+
+# Stages the routing table covers; the batch mode's research retry follows research
+ROUTED_STAGES = ['relevance', 'relevance_batch', 'research', 'analysis', 'journalistic', 'title_triage']
+STAGE_ALIASES = {'research-retry': 'research'}
+
+# Title words of breaking news on the forum
+BREAKING_TERMS = ['דחוף', 'מבזק', 'בהול']
+
+def parse_routes(spec: Optional[str]) -> Dict[str, Tuple[str, Optional[str]]]:
+    """'analysis=model-a/model-b,research=model-c' -> {'analysis': ('model-a', 'model-b'), 'research': ('model-c', None)}"""
+    routes = {}
+    for part in (spec or '').split(','):
+        if '=' not in part:
+            continue
+        stage, models = (value.strip() for value in part.split('=', 1))
+        if stage not in ROUTED_STAGES:
+            raise ValueError(f"MODEL_ROUTES: unknown stage {stage!r} (one of {', '.join(ROUTED_STAGES)})")
+        model, _, complex_model = models.partition('/')
+        routes[stage] = (model.strip() or DEFAULT_MODEL, complex_model.strip() or None)
+    return routes
+
+def short_name(model: Optional[str]) -> str:
+    """claude-3-haiku-20240307 -> claude-3-haiku"""
+    name = model or 'unknown'
+    head, _, tail = name.rpartition('-')
+    return head if head and tail.isdigit() and len(tail) == 8 else name
+
+class ModelRouter:
+    """Routing table, per-article complexity and the record of which model served each call"""
+
+    def __init__(self, storage=None, routes: Optional[Dict[str, Tuple[str, Optional[str]]]] = None,
+                 fallback_model: str = DEFAULT_MODEL, budget_mode: bool = False, complex_chars: int = 0,
+                 complex_cluster: int = 0, complex_breaking: bool = False):
+        self.storage = storage
+        self.routes = {stage: (DEFAULT_MODEL, None) for stage in ROUTED_STAGES}
+        self.routes.update(routes or {})
+        self.fallback_model = fallback_model
+        self.budget_mode = budget_mode
+        self.complex_chars = complex_chars
+        self.complex_cluster = complex_cluster
+        self.complex_breaking = complex_breaking
+        # article id -> {'chars', 'breaking', 'cluster'}, registered when an article starts
+        self.profiles: Dict[int, Dict] = {}
+        # article id -> {stage: model that served it in this run}
+        self.served_by: Dict[int, Dict[str, str]] = {}
+        self.reset_stats()
+
+    @classmethod
+    def from_env(cls, storage=None) -> 'ModelRouter':
+        """Router configured from MODEL_* environment variables"""
+        return cls(
+            storage,
+            routes=parse_routes(os.getenv('MODEL_ROUTES')),
+            fallback_model=os.getenv('MODEL_FALLBACK', DEFAULT_MODEL),
+            budget_mode=os.getenv('MODEL_BUDGET_MODE', '0') == '1',
+            complex_chars=int(os.getenv('MODEL_COMPLEX_CHARS', '0')),
+            complex_cluster=int(os.getenv('MODEL_COMPLEX_CLUSTER', '0')),
+            complex_breaking=os.getenv('MODEL_COMPLEX_BREAKING', '0') == '1'
+        )
+
+    def reset_stats(self):
+        """Start counting a new run"""
+        self.stats = {'calls': {}, 'complex': {}, 'budget': 0, 'fallbacks': 0}
+        self.profiles = {}
+        self.served_by = {}
+
+    # --- routing ---
+
+    def profile(self, article_id: Optional[int], title: str, content: str):
+        """Remember what the routing rules need to know about an article"""
+        if article_id is None:
+            return
+        self.profiles[article_id] = {
+            'chars': len(content or ''),
+            'breaking': any(term in (title or '') for term in BREAKING_TERMS),
+            'cluster': None,
+        }
+
+    def cluster_size(self, article_id: int) -> int:
+        """Articles in the story cluster of an article (looked up once, after it was clustered)"""
+        profile = self.profiles[article_id]
+        if not profile['cluster'] and self.storage is not None:
+            try:
+                profile['cluster'] = self.storage.get_story_cluster_size(article_id)
+            except Exception as e:
+                print(f"[WARNING] Could not read the story cluster size of article {article_id}: {e}")
+        return profile['cluster'] or 1
+
+    def complexity(self, article_id: Optional[int]) -> Optional[str]:
+        """Why an article counts as complex ('long', 'cluster', 'breaking'), or None"""
+        profile = self.profiles.get(article_id)
+        if profile is None:
+            return None
+        if self.complex_breaking and profile['breaking']:
+            return 'breaking'
+        if self.complex_chars and profile['chars'] >= self.complex_chars:
+            return 'long'
+        if self.complex_cluster and self.cluster_size(article_id) >= self.complex_cluster:
+            return 'cluster'
+        return None
+
+    def choose(self, stage: str, article_id: Optional[int] = None) -> Tuple[Optional[str], str]:
+        """(model, reason) for one call; (None, 'unrouted') for stages outside the table"""
+        route = self.routes.get(STAGE_ALIASES.get(stage, stage))
+        if route is None:
+            return None, 'unrouted'
+        if self.budget_mode:
+            return self.fallback_model, 'budget'
+        model, complex_model = route
+        if complex_model:
+            reason = self.complexity(article_id)
+            if reason:
+                return complex_model, reason
+        return model, 'default'
+
+    def route(self, stage: str, params: Dict, article_id: Optional[int] = None) -> Dict:
+        """The request with the routed model (a copy; unrouted stages are returned as they are)"""
+        model, reason = self.choose(stage, article_id)
+        if model is None:
+            return params
+        if reason == 'budget':
+            self.stats['budget'] += 1
+        elif reason != 'default':
+            self.stats['complex'][reason] = self.stats['complex'].get(reason, 0) + 1
+        return dict(params, model=model)
+
+    def fallback_for(self, params: Dict) -> Optional[str]:
+        """Model to switch to when the request's model is overloaded, if there is another one"""
+        return self.fallback_model if params.get('model') != self.fallback_model else None
+
+    # --- served models ---
+
+    def served(self, stage: str, article_id: Optional[int], params: Dict, model: Optional[str]) -> bool:
+        """Record the model that answered a call; True when it was the overload fallback"""
+        model = model or params.get('model')
+        fell_back = model == self.fallback_model != params.get('model')
+        if fell_back:
+            self.stats['fallbacks'] += 1
+        key = (stage, short_name(model))
+        self.stats['calls'][key] = self.stats['calls'].get(key, 0) + 1
+        if article_id is not None:
+            self.served_by.setdefault(article_id, {})[STAGE_ALIASES.get(stage, stage)] = model
+        return fell_back
+
+    def served_models(self, article_id: Optional[int]) -> Dict[str, str]:
+        """{stage: model} of the calls made for an article in this run, forgetting the article"""
+        self.profiles.pop(article_id, None)
+        return self.served_by.pop(article_id, {})
+
+    def summary(self) -> str:
+        """One-line statistics for the processing report"""
+        calls = ", ".join(f"{stage} {model} x{count}" for (stage, model), count in sorted(self.stats['calls'].items()))
+        complex_calls = sum(self.stats['complex'].values())
+        reasons = ", ".join(f"{count} {reason}" for reason, count in sorted(self.stats['complex'].items()))
+        return (f"{calls or 'no calls'} - {complex_calls} complex-article calls"
+                + (f" ({reasons})" if reasons else "")
+                + f", {self.stats['budget']} budget-mode calls, {self.stats['fallbacks']} overload fallbacks")
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the model routing table")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('routes', help="the routing table in effect")
+    route_parser = subparsers.add_parser('route', help="model for one article")
+    route_parser.add_argument('stage', choices=ROUTED_STAGES)
+    route_parser.add_argument('title')
+    route_parser.add_argument('--chars', type=int, default=0, help="article length in characters")
+    route_parser.add_argument('--cluster', type=int, default=1, help="articles in the story cluster")
+    args = parser.parse_args()
+
+    try:
+        router = ModelRouter.from_env()
+        if args.command == 'routes':
+            for stage in ROUTED_STAGES:
+                model, complex_model = router.routes[stage]
+                print(f"{stage:<16} {model}" + (f"  (complex: {complex_model})" if complex_model else ""))
+            print(f"{'fallback':<16} {router.fallback_model}" + ("  (budget mode: every stage)" if router.budget_mode else ""))
+        elif args.command == 'route':
+            router.profile(0, args.title, 'x' * args.chars)
+            router.profiles[0]['cluster'] = args.cluster
+            model, reason = router.choose(args.stage, 0)
+            print(f"{args.stage}: {model} ({reason})")
+    except Exception as e:
+        print(f"[ERROR] {e}")
+
+if __name__ == "__main__":
+    main()
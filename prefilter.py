@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+"""
+Local Relevance Pre-filter for News Balance Analyzer
+A small Naive Bayes classifier over hashed character and word n-grams of the
+title and lead of an article. It is trained from the verdicts already stored
+in news_items (isProcessed = 1 relevant, 2 non-relevant) and lets the
+processor skip the Stage 1 Anthropic call for articles that are clearly not
+political - sports results, weather, celebrity news. Everything it is not
+sure about still goes to the LLM.
+
+The decision threshold is calibrated on held-out articles so that skipped
+articles are non-political with at least the requested precision. A second
+threshold is calibrated on the titles of the same articles alone, for the
+scraper's title triage (title_triage.py): a title carries less evidence than
+title and lead, so its scores are spread differently.
+
+Commands:
+    python prefilter.py train --precision 0.98   # train, calibrate and store a model
+    python prefilter.py evaluate                 # precision/recall of the stored model
+    python prefilter.py score "כותרת" ["תוכן"]    # probability that an article is non-political
+"""
+
+import os
+import re
+import json
+import math
+import zlib
+import argparse
+from typing import Dict, List, Optional, Tuple
+from common import load_env
+from storage import get_storage
+
+# Same environment handling as the scraper and processor
+load_env()
+
+MODEL_NAME = 'relevance-prefilter'
+# model_used written for articles the pre-filter decided, so they are never used for training
+PREFILTER_MODEL_USED = 'local-prefilter'
+
+HASH_BUCKETS = 2 ** 18
+CONTENT_CHARS = 1000
+TITLE_WEIGHT = 3
+CHAR_NGRAMS = (3, 4)
+SMOOTHING = 0.1
+
+NIQQUD = re.compile(r'[֑-ׇ]')
+WORD = re.compile(r'\w+', re.UNICODE)
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased words without niqqud, digits folded to 0"""
+    text = NIQQUD.sub('', text or '').lower()
+    return [re.sub(r'\d', '0', word) for word in WORD.findall(text)]
+
+def bucket(feature: str) -> int:
+    """Stable hash of one feature string (crc32, the same in every process)"""
+    return zlib.crc32(feature.encode('utf-8')) & (HASH_BUCKETS - 1)
+
+def extract_features(title: str, content: str = '') -> Dict[int, float]:
+    """Hashed n-gram counts; title features are kept apart and weighted higher"""
+    features: Dict[int, float] = {}
+
+    def add(prefix: str, words: List[str], weight: float):
+        for word in words:
+            key = bucket(f"{prefix}w:{word}")
+            features[key] = features.get(key, 0) + weight
+            # Character n-grams handle Hebrew prefixes (ה, ו, ב, ל, מ, ש) and inflection
+            padded = f" {word} "
+            for n in CHAR_NGRAMS:
+                for i in range(len(padded) - n + 1):
+                    key = bucket(f"{prefix}c:{padded[i:i + n]}")
+                    features[key] = features.get(key, 0) + weight
+        for first, second in zip(words, words[1:]):
+            key = bucket(f"{prefix}b:{first} {second}")
+            features[key] = features.get(key, 0) + weight
+
+    add('t', tokenize(title), TITLE_WEIGHT)
+    add('c', tokenize((content or '')[:CONTENT_CHARS]), 1)
+    return features
+
+class NaiveBayesPrefilter:
+    """Multinomial Naive Bayes: class 1 = non-political, class 0 = relevant"""
+
+    def __init__(self, threshold: float = 1.01, title_threshold: float = 1.01):
+        self.counts: Dict[int, List[float]] = {}
+        self.totals = [0.0, 0.0]
+        self.documents = [0, 0]
+        # Minimum P(non-political) to skip the LLM; above 1 means "never skip"
+        self.threshold = threshold
+        # The same for a title scored alone (title triage)
+        self.title_threshold = title_threshold
+        self.stats = {'skipped': 0, 'passed': 0}
+
+    def fit(self, samples: List[Tuple[Dict[int, float], int]]):
+        """Count features per class"""
+        for features, label in samples:
+            self.documents[label] += 1
+            for key, value in features.items():
+                counts = self.counts.setdefault(key, [0.0, 0.0])
+                counts[label] += value
+                self.totals[label] += value
+
+    def non_political_probability(self, features: Dict[int, float]) -> float:
+        """P(non-political | features)"""
+        if not all(self.documents):
+            return 0.0
+        documents = sum(self.documents)
+        scores = []
+        for label in (0, 1):
+            score = math.log(self.documents[label] / documents)
+            denominator = self.totals[label] + SMOOTHING * HASH_BUCKETS
+            for key, value in features.items():
+                count = self.counts.get(key, (0.0, 0.0))[label]
+                score += value * math.log((count + SMOOTHING) / denominator)
+            scores.append(score)
+        # Normalise the two log scores without overflowing
+        top = max(scores)
+        relevant, non_political = (math.exp(score - top) for score in scores)
+        return non_political / (relevant + non_political)
+
+    def score(self, title: str, content: str = '') -> float:
+        """P(non-political) for one article"""
+        return self.non_political_probability(extract_features(title, content))
+
+    def should_skip(self, title: str, content: str = '') -> Tuple[bool, float]:
+        """(skip the LLM relevance check, probability) - counted in self.stats"""
+        probability = self.score(title, content)
+        skip = probability >= self.threshold
+        self.stats['skipped' if skip else 'passed'] += 1
+        return skip, probability
+
+    def reset_stats(self):
+        """Start counting a new run"""
+        self.stats = {'skipped': 0, 'passed': 0}
+
+    def summary(self) -> str:
+        """One-line statistics for the processing report"""
+        total = self.stats['skipped'] + self.stats['passed']
+        share = self.stats['skipped'] / total * 100 if total else 0.0
+        return (f"{self.stats['skipped']} of {total} articles skipped the relevance call "
+                f"({share:.1f}%, threshold {self.threshold:.3f})")
+
+    def to_bytes(self) -> bytes:
+        """Compressed JSON of the counts"""
+        data = {
+            'buckets': HASH_BUCKETS,
+            'totals': self.totals,
+            'documents': self.documents,
+            'threshold': self.threshold,
+            'title_threshold': self.title_threshold,
+            'counts': {str(key): [round(value, 3) for value in values] for key, values in self.counts.items()}
+        }
+        return zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'), 9)
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> 'NaiveBayesPrefilter':
+        """Inverse of to_bytes"""
+        data = json.loads(zlib.decompress(blob).decode('utf-8'))
+        if data.get('buckets') != HASH_BUCKETS:
+            raise ValueError("model was trained with a different feature hash size")
+        # Models stored before title calibration never skip on a title alone
+        model = cls(data['threshold'], data.get('title_threshold', 1.01))
+        model.totals = data['totals']
+        model.documents = data['documents']
+        model.counts = {int(key): values for key, values in data['counts'].items()}
+        return model
+
+def calibrate_threshold(scored: List[Tuple[float, int]], precision: float, min_skipped: int = 20) -> Tuple[float, Dict]:
+    """Lowest threshold whose skipped set is non-political with at least `precision`
+
+    scored holds (P(non-political), label) pairs of held-out articles. Returns the
+    threshold (above 1 if no threshold is precise enough) and its metrics.
+    """
+    ordered = sorted(scored, key=lambda item: item[0], reverse=True)
+    non_political_total = sum(label for _, label in ordered)
+    best = (1.01, {'precision': None, 'recall': 0.0, 'skip_rate': 0.0})
+
+    true_positive = 0
+    for index, (probability, label) in enumerate(ordered, 1):
+        true_positive += label
+        # Only cut between distinct scores
+        if index < len(ordered) and ordered[index][0] == probability:
+            continue
+        current_precision = true_positive / index
+        if index >= min_skipped and current_precision >= precision:
+            best = (probability, {
+                'precision': round(current_precision, 4),
+                'recall': round(true_positive / non_political_total, 4) if non_political_total else 0.0,
+                'skip_rate': round(index / len(ordered), 4)
+            })
+    return best
+
+def split_samples(articles: List[Dict], titles_only: bool = False) -> Tuple[List, List]:
+    """Deterministic 80/20 train/validation split by article id"""
+    train, validation = [], []
+    for article in articles:
+        sample = (extract_features(article['title'], '' if titles_only else article['clean_content']),
+                  1 if article['isProcessed'] == 2 else 0)
+        (validation if article['id'] % 5 == 0 else train).append(sample)
+    return train, validation
+
+def train(storage, precision: float = 0.98, limit: int = 20000) -> Optional[NaiveBayesPrefilter]:
+    """Train on stored verdicts, calibrate on held-out ones and save the model"""
+    articles = storage.get_labeled_articles(limit, exclude_model=PREFILTER_MODEL_USED)
+    train_set, validation_set = split_samples(articles)
+    labels = [label for _, label in train_set]
+    if len(train_set) < 50 or not 0 < sum(labels) < len(labels):
+        print(f"[WARNING] Not enough labeled articles to train ({len(articles)} found, both classes needed)")
+        return None
+
+    print(f"[AI] Training on {len(train_set)} articles ({sum(labels)} non-political), "
+          f"validating on {len(validation_set)}...")
+    model = NaiveBayesPrefilter()
+    model.fit(train_set)
+
+    scored = [(model.non_political_probability(features), label) for features, label in validation_set]
+    model.threshold, metrics = calibrate_threshold(scored, precision)
+    _, title_set = split_samples(articles, titles_only=True)
+    title_scored = [(model.non_political_probability(features), label) for features, label in title_set]
+    model.title_threshold, title_metrics = calibrate_threshold(title_scored, precision)
+    metrics.update({'target_precision': precision, 'threshold': model.threshold,
+                    'train_size': len(train_set), 'validation_size': len(validation_set)})
+    metrics.update({f'title_{key}': value for key, value in title_metrics.items()})
+    metrics['title_threshold'] = model.title_threshold
+
+    if model.threshold > 1:
+        print(f"[WARNING] No threshold reaches {precision:.1%} precision - the model will never skip articles")
+    else:
+        print(f"[OK] Threshold {model.threshold:.4f}: precision {metrics['precision']:.1%}, "
+              f"catches {metrics['recall']:.1%} of non-political articles, "
+              f"skips {metrics['skip_rate']:.1%} of all relevance calls")
+    if model.title_threshold > 1:
+        print(f"[WARNING] No title-only threshold reaches {precision:.1%} precision - title triage will download every thread")
+    else:
+        print(f"[OK] Title-only threshold {model.title_threshold:.4f}: precision {title_metrics['precision']:.1%}, "
+              f"skips {title_metrics['skip_rate']:.1%} of held-out titles")
+
+    model_id = storage.save_classifier_model(MODEL_NAME, model.to_bytes(), len(train_set), metrics)
+    print(f"[OK] Stored pre-filter model {model_id}")
+    return model
+
+def load_prefilter(storage) -> Optional[NaiveBayesPrefilter]:
+    """The stored model, or None when disabled (PREFILTER=0) or not trained yet
+
+    PREFILTER_THRESHOLD overrides the calibrated threshold.
+    """
+    if os.getenv('PREFILTER', '1') == '0':
+        return None
+    try:
+        stored = storage.load_classifier_model(MODEL_NAME)
+        if stored is None:
+            return None
+        model = NaiveBayesPrefilter.from_bytes(stored[0])
+        if os.getenv('PREFILTER_THRESHOLD'):
+            model.threshold = float(os.getenv('PREFILTER_THRESHOLD'))
+        return model
+    except Exception as e:
+        print(f"[WARNING] Could not load the relevance pre-filter: {e}")
+        return None
+
+def evaluate(storage, model: NaiveBayesPrefilter, limit: int = 20000):
+    """Precision and recall of the stored model on the validation split"""
+    articles = storage.get_labeled_articles(limit, exclude_model=PREFILTER_MODEL_USED)
+    _, validation_set = split_samples(articles)
+    skipped = correct = non_political = 0
+    for features, label in validation_set:
+        non_political += label
+        if model.non_political_probability(features) >= model.threshold:
+            skipped += 1
+            correct += label
+    print(f"[STATS] Pre-filter on {len(validation_set)} held-out articles (threshold {model.threshold:.4f}):")
+    print(f"   Skipped: {skipped} ({skipped / len(validation_set) * 100 if validation_set else 0:.1f}%)")
+    print(f"   Precision: {correct / skipped * 100 if skipped else 0:.1f}%")
+    print(f"   Recall (non-political caught): {correct / non_political * 100 if non_political else 0:.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="Local relevance pre-filter")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    train_parser = subparsers.add_parser('train', help="train and store a model from processed articles")
+    train_parser.add_argument('--precision', type=float, default=0.98,
+                              help="required precision of skipped articles (default: 0.98)")
+    train_parser.add_argument('--limit', type=int, default=20000, help="newest labeled articles to use")
+    evaluate_parser = subparsers.add_parser('evaluate', help="precision/recall of the stored model")
+    evaluate_parser.add_argument('--limit', type=int, default=20000, help="newest labeled articles to use")
+    score_parser = subparsers.add_parser('score', help="score one title (and optional content)")
+    score_parser.add_argument('title')
+    score_parser.add_argument('content', nargs='?', default='')
+    args = parser.parse_args()
+
+    storage = get_storage()
+    storage.init_schema()
+
+    try:
+        if args.command == 'train':
+            train(storage, args.precision, args.limit)
+            return
+
+        model = load_prefilter(storage)
+        if model is None:
+            print("[ERROR] No pre-filter model stored - run: python prefilter.py train")
+        elif args.command == 'evaluate':
+            evaluate(storage, model, args.limit)
+        elif args.command == 'score':
+            probability = model.score(args.title, args.content)
+            verdict = "skip (non-political)" if probability >= model.threshold else "send to LLM"
+            print(f"P(non-political) = {probability:.4f} -> {verdict}")
+    except Exception as e:
+        print(f"[ERROR] {e}")
+    finally:
+        storage.close()
+
+if __name__ == "__main__":
+    main()
@@ -9,34 +9,131 @@ Reads unprocessed articles from the database and processes them using a 4-stage
 4. Journalistic Writing
 """
 
-import psycopg2
-import psycopg2.extras
 import os
 import json
 import time
+import asyncio
+import select
+import argparse
 from datetime import datetime
+from types import SimpleNamespace
 from typing import List, Dict, Optional, Tuple
 import anthropic
-from dotenv import load_dotenv
+from common import load_env
+from db_schema import NEW_ARTICLE_CHANNEL
+from storage import get_storage
+from rate_governor import RateLimitGovernor
+from llm_cache import ResponseCache
+from prefilter import load_prefilter, PREFILTER_MODEL_USED
+from stage_pipeline import PipelineStage, StagePipeline, parse_worker_spec
+from story_clusters import StoryClusterer
+from research_cache import ResearchCache
+from stream_guard import StreamGuard, StreamedResponse
+from token_budget import TokenBudget, request_text
+from telemetry import CallTelemetry
+from speculation import Speculator, count_speculative_usage
+from relevance_batch import RelevanceBatcher, parse_verdicts, TOKENS_PER_VERDICT
+from model_router import ModelRouter, DEFAULT_MODEL
+from budget_governor import BudgetGovernor, RESEARCH_SKIPPED_TEXT
+from relevance_verdict import (RELEVANCE_TOOL, RELEVANCE_BATCH_TOOL, tool_params, parse_verdict,
+                               verdict_reason)
 
 # Load environment variables from .env.local file (for local development)
 # Railway will provide environment variables directly
-if os.path.exists('.env.local'):
-    load_dotenv('.env.local')
-    print("Loaded environment variables from .env.local (local development)")
-else:
-    print("Using environment variables from Railway (production)")
+load_env(announce=True)
+
+# Requests per Message Batch submission (the API accepts up to 100,000)
+MESSAGE_BATCH_MAX_REQUESTS = 10000
+
+# Failed attempts of one stage before the article is set aside as failed (isProcessed = 3)
+STAGE_MAX_ATTEMPTS = int(os.getenv('STAGE_MAX_ATTEMPTS', '3'))
+
+# Workers per stage in pipeline mode: cheap relevance screening gets the most
+DEFAULT_STAGE_WORKERS = {'relevance': 8, 'research': 4, 'analysis': 4, 'journalistic': 4}
+
+def batch_article_id(custom_id: str) -> Optional[int]:
+    """Article id of a Message Batches custom_id ('article-42' -> 42)"""
+    try:
+        return int(custom_id.rsplit('-', 1)[1])
+    except (IndexError, ValueError):
+        return None
+
+def message_text(message) -> str:
+    """Text of a response; the input of a forced tool call as JSON"""
+    for block in message.content or []:
+        if block.type == 'tool_use':
+            return json.dumps(block.input, ensure_ascii=False)
+    return message.content[0].text if message.content else ""
+
+class StageFailed(Exception):
+    """A stage call failed; the article resumes at this stage next run, or is set aside once final"""
+
+    def __init__(self, stage: str, error: Exception, attempts: Optional[int]):
+        counted = f"attempt {attempts}/{STAGE_MAX_ATTEMPTS}" if attempts is not None else "attempt not recorded"
+        super().__init__(f"{stage} failed ({counted}): {error}")
+        self.stage = stage
+        # Out of attempts: the article is marked failed instead of being retried
+        self.final = attempts is not None and attempts >= STAGE_MAX_ATTEMPTS
 
 class ArticleProcessor:
-    def __init__(self, db_url: str = None):
+    def __init__(self, db_url: str = None, concurrency: Optional[int] = None,
+                 pipeline: Optional[bool] = None, stage_workers: Optional[Dict[str, int]] = None):
         """Initialize the article processor with database URL"""
-        self.db_url = db_url or os.getenv('DATABASE_URL')
+        self.storage = get_storage(db_url)
+        self.api_key = None
         self.anthropic_client = None
+        self.async_client = None
+        # Tokens used in the current run; cache_* are prompt-prefix cache writes and reads
+        self.token_usage = {'input_tokens': 0, 'cache_creation_input_tokens': 0,
+                            'cache_read_input_tokens': 0, 'output_tokens': 0}
+        # Paces every Anthropic call against the account's rate limits
+        self.rate_governor = RateLimitGovernor.from_env()
+        # Earlier answers to identical requests, kept across runs and resets
+        self.response_cache = ResponseCache.from_env(self.storage)
+        # Stages 2-4 are streamed, checkpointed as they arrive and stopped early when useless
+        self.stream_guard = StreamGuard.from_env()
+        # Article text trimmed to a token budget per stage, max_tokens sized from observed outputs
+        self.token_budget = TokenBudget.from_env(self.storage)
+        # One llm_calls row per call (tokens, latency, retries, outcome, cost), written in the background
+        self.telemetry = CallTelemetry.from_env(self.storage)
+        # Model per stage and per article (MODEL_ROUTES), with a fallback model for overloads
+        self.model_router = ModelRouter.from_env(self.storage)
+        # Articles processed at the same time; 1 keeps the original sequential loop
+        self.concurrency = max(1, concurrency or int(os.getenv('PROCESSOR_CONCURRENCY', '1')))
+        # Staged pipeline: a queue and worker pool per stage instead of one task per article
+        self.pipeline_mode = pipeline if pipeline is not None else os.getenv('PROCESSOR_PIPELINE', '0') == '1'
+        self.stage_workers = dict(DEFAULT_STAGE_WORKERS)
+        self.stage_workers.update(parse_worker_spec(os.getenv('PIPELINE_WORKERS')))
+        self.stage_workers.update(stage_workers or {})
+        self.pipeline = None
         self.init_anthropic()
+        self.init_database()
+        # Local classifier that answers clear non-political articles without Stage 1
+        self.prefilter = load_prefilter(self.storage)
+        # Research started next to the relevance check for articles that look political
+        self.speculator = Speculator.from_env(self.prefilter)
+        # Stage 1 for several articles per call (RELEVANCE_BATCH_SIZE)
+        self.relevance_batcher = RelevanceBatcher.from_env()
+        # Stage 1 answers as schema-checked verdicts recorded through a forced tool call
+        self.structured_relevance = os.getenv('STRUCTURED_RELEVANCE', '1') != '0'
+        self.screened_ids = set()
+        # Articles about the same news event share one Stage 2 research call
+        self.story_clusters = StoryClusterer.from_env(self.storage)
+        self.cluster_locks: Dict[int, asyncio.Lock] = {}
+        # Recent research per normalized topic, shared across stories
+        self.research_cache = ResearchCache.from_env(self.storage)
+        # Daily / hourly token budget: admission by priority, cheaper model and no research as it runs out
+        self.budget_governor = BudgetGovernor.from_env(self.storage, self.telemetry, self.model_router,
+                                                       self.story_clusters, self.prefilter)
+        
+        # Each stage prompt is split in two: the long static instructions go into a
+        # system block marked for prompt caching, the article-specific text into a
+        # short user message. Nothing variable may be interpolated into the *_prompt
+        # strings, otherwise every request has a different prefix and nothing is cached.
         
         # Stage 1: Relevance check prompt
         self.relevance_prompt = """
-אתה עיתונאי ישראלי מנוסה. קרא את הכתבה הבאה וענה בקצרה:
+אתה עיתונאי ישראלי מנוסה. קרא את הכתבה שתישלח אליך וענה בקצרה:
 
 1. האם זה נושא פוליטי או חברתי שנוי במחלוקת בישראל?
 2. אם כן - מה סוג המחלוקת?
@@ -45,19 +142,63 @@ class ArticleProcessor:
 שים לב: משלים כמו "כדור השלג" או "משחקי כוח" הם בדרך כלל פוליטיים, לא ספורט.
 
 ענה בקצרה - עד 50 מילים.
+"""
+        self.relevance_input = """כותרת: {title}
+תוכן: {content}"""
+        
+        # Stage 1, structured: the same questions answered through the record_relevance tool
+        self.relevance_tool_prompt = """
+אתה עיתונאי ישראלי מנוסה. קרא את הכתבה שתישלח אליך והחלט:
 
-כותרת: {title}
-תוכן: {content}
+1. האם זה נושא פוליטי או חברתי שנוי במחלוקת בישראל?
+2. אם כן - מה סוג המחלוקת?
+3. מה קטגוריית הכתבה?
+
+שים לב: משלים כמו "כדור השלג" או "משחקי כוח" הם בדרך כלל פוליטיים, לא ספורט.
+מדיניות כלכלית שנויה במחלוקת היא נושא רלוונטי.
+
+רשום את ההחלטה בכלי record_relevance בלבד.
 """
         
+        # Stage 1, batched: several articles per request, one JSON verdict per article id
+        self.relevance_batch_prompt = """
+אתה עיתונאי ישראלי מנוסה. יישלחו אליך כמה כתבות, לכל אחת מזהה, כותרת ותחילת התוכן.
+לכל כתבה ענה בקצרה:
+
+1. האם זה נושא פוליטי או חברתי שנוי במחלוקת בישראל?
+2. אם כן - מה סוג המחלוקת?
+3. אם לא - מה קטגוריית הכתבה?
+
+שים לב: משלים כמו "כדור השלג" או "משחקי כוח" הם בדרך כלל פוליטיים, לא ספורט.
+
+החזר JSON בלבד - מערך עם אובייקט לכל כתבה, בסדר שבו נשלחו:
+[{"id": <מזהה>, "answer": "<תשובה קצרה, עד 30 מילים>"}]
+"""
+        self.relevance_batch_tool_prompt = """
+אתה עיתונאי ישראלי מנוסה. יישלחו אליך כמה כתבות, לכל אחת מזהה, כותרת ותחילת התוכן.
+לכל כתבה החלט:
+
+1. האם זה נושא פוליטי או חברתי שנוי במחלוקת בישראל?
+2. אם כן - מה סוג המחלוקת?
+3. מה קטגוריית הכתבה?
+
+שים לב: משלים כמו "כדור השלג" או "משחקי כוח" הם בדרך כלל פוליטיים, לא ספורט.
+מדיניות כלכלית שנויה במחלוקת היא נושא רלוונטי.
+
+רשום החלטה לכל כתבה, לפי המזהה שלה, בכלי record_relevance_verdicts בלבד.
+"""
+        self.relevance_batch_item = """מזהה: {id}
+כותרת: {title}
+תוכן: {content}"""
+        
         # Stage 2: Research with verification
         self.research_prompt = """
-חשוב מאוד: בצע חיפוש מעמיק באינטרנט על הנושא הזה עכשיו!
+חשוב מאוד: בצע חיפוש מעמיק באינטרנט על הנושא שיישלח אליך עכשיו!
 
 חפש בעברית:
-1. "{main_topic}"
-2. "{main_topic} + מחלוקת"
-3. "{main_topic} + עמדות שונות"
+1. את הנושא עצמו
+2. את הנושא + "מחלוקת"
+3. את הנושא + "עמדות שונות"
 
 חובה למצוא:
 - לפחות 3 מקורות שונים
@@ -65,14 +206,13 @@ class ArticleProcessor:
 - הצהרות רשמיות אם יש
 
 אם לא מוצא מידע נוסף - כתוב במפורש "לא מצאתי מידע נוסף"
-
-נושא: {main_topic}
-מידע ראשוני: {article_summary}
 """
+        self.research_input = """נושא: {main_topic}
+מידע ראשוני: {article_summary}"""
         
         # Stage 3: Analysis
         self.analysis_prompt = """
-כתוב ניתוח מאוזן תוך שילוב המחקר:
+כתוב ניתוח מאוזן של הטקסט המקורי תוך שילוב ממצאי המחקר שיישלחו אליך:
 
 כתוב כתבה עיתונאית זורמת וקריאה שתכלול את כל המידע החשוב מהמחקר, אבל בלי כותרות משנה או חלוקה לסעיפים. הכתבה צריכה להיות טקסט רציף וזורם שכולל:
 
@@ -84,14 +224,13 @@ class ArticleProcessor:
 - סיכום מאוזן
 
 חשוב: אל תכתוב כותרות כמו "כותרת אובייקטיבית", "פתיח", "עובדות מוסכמות" וכו'. כתוב טקסט רציף וזורם.
-
-טקסט מקורי: {original_text}
-ממצאי מחקר: {research_findings}
 """
+        self.analysis_input = """טקסט מקורי: {original_text}
+ממצאי מחקר: {research_findings}"""
         
         # Stage 4: Journalistic writing
         self.journalistic_prompt = """
-הפך את הניתוח הטכני הזה לכתבה עיתונאית זורמת וקריאה:
+הפך את הניתוח הטכני שיישלח אליך לכתבה עיתונאית זורמת וקריאה:
 
 - שפה עיתונאית נעימה
 - מעברים חלקים
@@ -100,9 +239,8 @@ class ArticleProcessor:
 - טקסט רציף וזורם בלי כותרות משנה או חלוקה לסעיפים
 
 חשוב: אל תכתוב כותרות כמו "כותרת אובייקטיבית", "פתיח", "עובדות מוסכמות", "הצגת כל הצדדים", "מה שחסר מהדיווח", "הקשר רחב", "סיכום מאוזן". כתוב טקסט רציף וזורם.
-
-ניתוח טכני: {technical_analysis}
 """
+        self.journalistic_input = """ניתוח טכני: {technical_analysis}"""
 
     def init_anthropic(self):
         """Initialize Anthropic client with API key from environment"""
@@ -112,25 +250,34 @@ class ArticleProcessor:
             return False
         
         try:
-            self.anthropic_client = anthropic.Anthropic(api_key=api_key)
+            self.api_key = api_key
+            # Retries are left to the rate governor so it sees every 429/529
+            self.anthropic_client = anthropic.Anthropic(api_key=api_key, max_retries=0)
             print("[OK] Anthropic client initialized successfully")
             return True
         except Exception as e:
             print(f"[ERROR] Error initializing Anthropic client: {e}")
             return False
 
+    def init_database(self):
+        """Make sure news_items has the JSONB process_data and relevance columns"""
+        try:
+            return self.storage.init_schema()
+        except Exception as e:
+            print(f"[ERROR] Error initializing database schema: {e}")
+            return False
+
     def test_internet_access(self):
         """Test if the model has internet access"""
         test_prompt = "חפש באינטרנט מה קרה היום בחדשות ישראל"
         
         try:
-            response = self.anthropic_client.messages.create(
-                model="claude-3-haiku-20240307",
-                max_tokens=200,
-                messages=[{"role": "user", "content": test_prompt}]
-            )
+            result = self.create_message('internet_test', {
+                'model': DEFAULT_MODEL,
+                'max_tokens': 200,
+                'messages': [{"role": "user", "content": test_prompt}]
+            })
             
-            result = response.content[0].text
             if "לא יכול לגשת" in result or "אין לי גישה" in result:
                 print("[ERROR] Model has no internet access!")
                 return False
@@ -153,195 +300,595 @@ class ArticleProcessor:
         
         return has_sources and not is_too_short and not is_generic
 
-    def check_article_relevance(self, article_content: str, article_title: str) -> Tuple[bool, str]:
-        """Check if article is relevant"""
+    def record_usage(self, usage):
+        """Add one response's token usage, split by prompt-cache status, to the run totals"""
+        for key in self.token_usage:
+            self.token_usage[key] += getattr(usage, key, 0) or 0
+        count_speculative_usage(usage)
+        self.budget_governor.spend(usage)
+
+    async def send_message_async(self, stage: str, params: Dict, attempts: Optional[List[float]] = None):
+        """One paced Anthropic call, bypassing the response cache; returns the Message
+        
+        The start time of every attempt is appended to attempts, for the telemetry.
+        """
+        def send(request):
+            if attempts is not None:
+                attempts.append(time.time())
+            return self.async_client.messages.with_raw_response.create(**request)
+        
+        response = await self.rate_governor.call_async(send, params, stage, self.model_router.fallback_for(params))
+        self.record_usage(response.usage)
+        return response
+
+    def partial_writer(self, stage: str, article_id: Optional[int]):
+        """Callback saving a stream's text so far into the article's stage checkpoint"""
+        if article_id is None:
+            return None
+        return lambda text: self.storage.save_partial_output(article_id, stage, text)
+
+    async def stream_message_async(self, stage: str, params: Dict, article_id: Optional[int] = None,
+                                   attempts: Optional[List[float]] = None):
+        """One paced, streamed Anthropic call; returns (Message, the StreamWatch of the last attempt)"""
+        watches = []
+        
+        async def send(request):
+            if attempts is not None:
+                attempts.append(time.time())
+            watch = self.stream_guard.watch(stage, self.partial_writer(stage, article_id))
+            watches.append(watch)
+            async with self.async_client.messages.stream(**request, timeout=self.stream_guard.idle_seconds) as stream:
+                async for chunk in stream.text_stream:
+                    if watch.feed(chunk):
+                        break
+                message = stream.current_message_snapshot if watch.stop_reason else await stream.get_final_message()
+                self.stream_guard.finish(watch, message)
+                return StreamedResponse(message, stream.response.headers)
+        
         try:
-            prompt = self.relevance_prompt.format(
-                title=article_title,
-                content=article_content[:2000]
-            )
-            
-            response = self.anthropic_client.messages.create(
-                model="claude-3-haiku-20240307",
-                max_tokens=200,
-                temperature=0.1,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            relevance_text = response.content[0].text
-            
-            # Check if the AI explicitly said it's not relevant
-            non_relevant_keywords = ["ספורט", "בידור", "עסקים", "שגרתי", "כלכלי"]
-            is_relevant = not any(keyword in relevance_text for keyword in non_relevant_keywords)
-            
-            return is_relevant, relevance_text
-            
-        except Exception as e:
-            print(f"[ERROR] Error in relevance check: {e}")
-            return True, "Error in checking relevance"
+            response = await self.rate_governor.call_async(send, params, stage, self.model_router.fallback_for(params))
+        except asyncio.CancelledError:
+            if watches:
+                # A cancelled stream (dropped speculative research) never reports its usage
+                self.record_usage(SimpleNamespace(input_tokens=self.token_budget.estimate(request_text(params)),
+                                                  output_tokens=len(watches[-1].text) // 2))
+            raise
+        self.record_usage(response.usage)
+        return response, watches[-1]
+
+    def record_call(self, stage: str, params: Dict, attempts: List[float], article_id: Optional[int],
+                    response=None, stop_reason: Optional[str] = None, error: Optional[Exception] = None):
+        """Queue the telemetry row of one live call; latency covers its last attempt"""
+        if error is not None:
+            outcome = f"error: {error.__class__.__name__}"
+        else:
+            outcome = f"stopped-{stop_reason}" if stop_reason else 'ok'
+        self.telemetry.record(
+            stage, getattr(response, 'model', None) or params.get('model'), getattr(response, 'usage', None),
+            latency=time.time() - attempts[-1] if attempts else None, retries=max(0, len(attempts) - 1),
+            outcome=outcome, article_id=article_id
+        )
+
+    def create_message(self, stage: str, params: Dict, article_id: Optional[int] = None) -> str:
+        """create_message_async for the one-off calls made outside the processing loop"""
+        return asyncio.run(self.with_async_client(self.create_message_async(stage, params, article_id)))
 
-    def research_topic(self, main_topic: str, article_summary: str) -> str:
-        """Research with quality verification"""
+    async def create_message_async(self, stage: str, params: Dict, article_id: Optional[int] = None) -> str:
+        """Send one request to Anthropic and return the response text
+        
+        The request goes to the model the router picks for the stage and article.
+        Streamed stages write their partial text to the checkpoint of article_id.
+        Answers cut short by the stream guard are not cached.
+        """
+        params = self.model_router.route(stage, params, article_id)
+        cached = self.response_cache.get(stage, params)
+        if cached is not None:
+            self.telemetry.record(stage, params.get('model'), outcome='cached', article_id=article_id)
+            self.model_router.served(stage, article_id, params, params.get('model'))
+            return cached
+        
+        attempts = []
         try:
-            prompt = self.research_prompt.format(
-                main_topic=main_topic,
-                article_summary=article_summary
-            )
-            
-            response = self.anthropic_client.messages.create(
-                model="claude-3-haiku-20240307",
-                max_tokens=1500,
-                temperature=0.3,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            research_result = response.content[0].text
-            
-            # Verify quality
-            if not self.verify_research_quality(research_result):
-                print("[WARNING] Research quality low - trying again...")
-                retry_prompt = f"בצע חיפוש מעמיק יותר על: {main_topic}. חובה למצוא מקורות אמיתיים!"
-                retry_response = self.anthropic_client.messages.create(
-                    model="claude-3-haiku-20240307",
-                    max_tokens=1500,
-                    messages=[{"role": "user", "content": retry_prompt}]
-                )
-                research_result = retry_response.content[0].text
-            
+            if self.stream_guard.streams(stage):
+                response, watch = await self.stream_message_async(stage, params, article_id, attempts)
+                stop_reason = watch.stop_reason
+            else:
+                response, stop_reason = await self.send_message_async(stage, params, attempts), None
+        except (Exception, asyncio.CancelledError) as e:
+            self.record_call(stage, params, attempts, article_id, error=e)
+            raise
+        self.record_call(stage, params, attempts, article_id, response, stop_reason)
+        
+        # An answer of the overload fallback is not cached under the routed model's request
+        fell_back = self.model_router.served(stage, article_id, params, getattr(response, 'model', None))
+        text = message_text(response)
+        if stop_reason is None:
+            if self.valid_answer(stage, text) and not fell_back:
+                self.response_cache.put(stage, params, text, response.usage, response.stop_reason)
+            self.token_budget.observe(stage, params, response.usage, response.stop_reason)
+        return text
+
+    def valid_answer(self, stage: str, text: str) -> bool:
+        """False for a relevance answer that should be a structured verdict and is not"""
+        return not (stage == 'relevance' and self.structured_relevance and parse_verdict(text) is None)
+
+    def stage_request(self, instructions: str, user_text: str, max_tokens: int,
+                      temperature: Optional[float] = None) -> Dict:
+        """Request with the static instructions as a cacheable system block
+        
+        The model is the default one; create_message routes it per stage and article.
+        """
+        params = {
+            'model': DEFAULT_MODEL,
+            'max_tokens': max_tokens,
+            'system': [{
+                "type": "text",
+                "text": instructions.strip(),
+                "cache_control": {"type": "ephemeral"}
+            }],
+            'messages': [{"role": "user", "content": user_text}]
+        }
+        if temperature is not None:
+            params['temperature'] = temperature
+        return params
+
+    def reset_token_usage(self):
+        """Start counting tokens for a new run"""
+        for key in self.token_usage:
+            self.token_usage[key] = 0
+
+    def prompt_cache_summary(self) -> str:
+        """Input tokens of this run split into prompt-cache reads, writes and uncached"""
+        read = self.token_usage['cache_read_input_tokens']
+        written = self.token_usage['cache_creation_input_tokens']
+        uncached = self.token_usage['input_tokens']
+        total = read + written + uncached
+        share = read / total * 100 if total else 0.0
+        return (f"{read} read / {written} written / {uncached} uncached input tokens "
+                f"({share:.1f}% served from the prompt cache)")
+
+    def check_prompt_cache(self) -> bool:
+        """Verify the stage prompts share a cached prefix across different articles
+        
+        Sends every stage for two different sample articles, bypassing the response
+        cache; the second request must read the system block written by the first.
+        Works against the real API or against fake_anthropic.py via ANTHROPIC_BASE_URL.
+        """
+        samples = [
+            {'title': "הממשלה אישרה את תקציב המדינה", 'content': "הממשלה אישרה הלילה את הצעת התקציב לאחר דיון סוער."},
+            {'title': "הכנסת דנה ברפורמה המשפטית", 'content': "ועדת החוקה התכנסה לדיון נוסף על הצעת החוק."}
+        ]
+        stages = [
+            ('relevance', lambda article: self.relevance_request(article['content'], article['title'])),
+            ('research', lambda article: self.research_request(article['title'], article['content'])),
+            ('analysis', lambda article: self.analysis_request(article['content'], "ממצאי מחקר לדוגמה")),
+            ('journalistic', lambda article: self.journalistic_request(article['content'])),
+        ]
+        
+        async def send_pairs():
+            return [[(await self.send_message_async(stage, build_request(article))).usage for article in samples]
+                    for stage, build_request in stages]
+        
+        print("[SEARCH] Checking prompt-prefix caching for every stage...")
+        all_cached = True
+        for (stage, _), (first, second) in zip(stages, asyncio.run(self.with_async_client(send_pairs()))):
+            written = getattr(first, 'cache_creation_input_tokens', 0) or 0
+            read = getattr(second, 'cache_read_input_tokens', 0) or 0
+            if read > 0:
+                print(f"   [OK] {stage}: first call wrote {written} tokens, second read {read} cached "
+                      f"+ {second.input_tokens} uncached")
+            else:
+                all_cached = False
+                print(f"   [WARNING] {stage}: no cache read on the second call "
+                      f"(wrote {written}, {second.input_tokens} uncached)")
+        
+        if not all_cached:
+            print("[WARNING] Prefixes shorter than the model's minimum cacheable length "
+                  "(1024-2048 tokens depending on the model) are not cached by the API")
+        return all_cached
+
+    def relevance_request(self, article_content: str, article_title: str) -> Dict:
+        """Stage 1 request parameters"""
+        user_text = self.relevance_input.format(title=article_title,
+                                                content=self.token_budget.trim('relevance', article_content, 2000))
+        if not self.structured_relevance:
+            return self.stage_request(self.relevance_prompt, user_text,
+                                      max_tokens=self.token_budget.max_tokens('relevance', 200), temperature=0.1)
+        params = self.stage_request(self.relevance_tool_prompt, user_text,
+                                    max_tokens=self.token_budget.max_tokens('relevance', 100), temperature=0.1)
+        params.update(tool_params(RELEVANCE_TOOL))
+        return params
+
+    def relevance_batch_request(self, articles: List[Dict]) -> Dict:
+        """Batched stage 1 request: the title and lead of each article under its id"""
+        items = [
+            self.relevance_batch_item.format(
+                id=article['id'], title=article['title'],
+                content=self.token_budget.trim('relevance_batch', article['clean_content'], 600))
+            for article in articles
+        ]
+        if not self.structured_relevance:
+            return self.stage_request(self.relevance_batch_prompt, "\n\n".join(items),
+                                      max_tokens=TOKENS_PER_VERDICT * len(articles), temperature=0.1)
+        params = self.stage_request(self.relevance_batch_tool_prompt, "\n\n".join(items),
+                                    max_tokens=TOKENS_PER_VERDICT * len(articles), temperature=0.1)
+        params.update(tool_params(RELEVANCE_BATCH_TOOL))
+        return params
+
+    def parse_relevance(self, relevance_text: str) -> Tuple[bool, str]:
+        """Turn the stage 1 answer into (is_relevant, reason)
+        
+        A structured verdict decides by its relevant field.
+        """
+        verdict = parse_verdict(relevance_text)
+        if verdict is not None:
+            return verdict['relevant'], verdict_reason(verdict)
+        
+        # Free-text answer (STRUCTURED_RELEVANCE=0 or an older checkpoint)
+        # Check if the AI explicitly said it's not relevant
+        non_relevant_keywords = ["ספורט", "בידור", "עסקים", "שגרתי", "כלכלי"]
+        is_relevant = not any(keyword in relevance_text for keyword in non_relevant_keywords)
+        
+        return is_relevant, relevance_text
+
+    def research_request(self, main_topic: str, article_summary: str) -> Dict:
+        """Stage 2 request parameters"""
+        return self.stage_request(
+            self.research_prompt,
+            self.research_input.format(main_topic=main_topic,
+                                       article_summary=self.token_budget.trim('research', article_summary, 500)),
+            max_tokens=self.token_budget.max_tokens('research', 1500), temperature=0.3
+        )
+
+    def research_retry_request(self, main_topic: str) -> Dict:
+        """Stage 2 retry parameters, used when the first research looks empty"""
+        retry_prompt = f"בצע חיפוש מעמיק יותר על: {main_topic}. חובה למצוא מקורות אמיתיים!"
+        return self.stage_request(self.research_prompt, retry_prompt,
+                                  max_tokens=self.token_budget.max_tokens('research', 1500))
+
+    def analysis_request(self, original_text: str, research_findings: str) -> Dict:
+        """Stage 3 request parameters"""
+        return self.stage_request(
+            self.analysis_prompt,
+            self.analysis_input.format(original_text=self.token_budget.trim('analysis', original_text, 2000),
+                                       research_findings=research_findings),
+            max_tokens=self.token_budget.max_tokens('analysis', 2000), temperature=0.3
+        )
+
+    def journalistic_request(self, technical_analysis: str) -> Dict:
+        """Stage 4 request parameters"""
+        return self.stage_request(
+            self.journalistic_prompt,
+            self.journalistic_input.format(technical_analysis=technical_analysis),
+            max_tokens=self.token_budget.max_tokens('journalistic', 2000), temperature=0.4
+        )
+
+    # Stage calls raise on failure; run_stage_async decides whether the article
+    # waits for the next run or finishes with the failure text.
+
+    def cache_research(self, main_topic: str, research_result: str):
+        """Keep research for later articles on the topic, if it passes the quality check"""
+        if self.verify_research_quality(research_result):
+            self.research_cache.put(main_topic, research_result)
+
+    async def check_article_relevance_async(self, article_content: str, article_title: str,
+                                            article_id: Optional[int] = None) -> str:
+        """Stage 1: the model's relevance answer (parsed by parse_relevance)"""
+        relevance_text = await self.create_message_async(
+            'relevance', self.relevance_request(article_content, article_title), article_id)
+        if not self.valid_answer('relevance', relevance_text):
+            raise ValueError(f"relevance verdict does not match the schema: {relevance_text[:200]}")
+        return relevance_text
+
+    async def research_topic_async(self, main_topic: str, article_summary: str,
+                                   article_id: Optional[int] = None, share: bool = True) -> str:
+        """Stage 2: research with quality verification; recent research on the same topic is reused as is
+        
+        With share=False the result is not put in the topic cache (speculative research).
+        """
+        cached = self.research_cache.get(main_topic)
+        if cached is not None:
+            return cached
+        
+        if self.budget_governor.skip_research():
+            print(f"[BUDGET] Research skipped for '{main_topic[:40]}' - the token budget is nearly used up")
+            return RESEARCH_SKIPPED_TEXT
+        
+        research_result = await self.create_message_async(
+            'research', self.research_request(main_topic, article_summary), article_id)
+        
+        if not self.verify_research_quality(research_result):
+            print(f"[WARNING] Research quality low for '{main_topic[:40]}' - trying again...")
+            research_result = await self.create_message_async(
+                'research', self.research_retry_request(main_topic), article_id)
+        
+        if share:
+            self.cache_research(main_topic, research_result)
+        return research_result
+
+    async def clustered_research_async(self, article_id: Optional[int], article_title: str, article_content: str) -> str:
+        """Stage 2 once per story: reuse the research of the article's cluster, or do it and share it
+        
+        Members of one story wait for the call already in flight.
+        """
+        cluster_id = self.story_clusters.assign(article_id, article_title, article_content)
+        if cluster_id is None:
+            return await self.research_topic_async(article_title, article_content, article_id)
+        
+        async with self.cluster_locks.setdefault(cluster_id, asyncio.Lock()):
+            shared = self.story_clusters.shared_research(cluster_id)
+            if shared is not None:
+                print(f"[CLUSTER] [{article_id}] Reusing the research of story #{cluster_id}")
+                return shared
+            research_result = await self.research_topic_async(article_title, article_content, article_id)
+            if research_result != RESEARCH_SKIPPED_TEXT:
+                self.story_clusters.save_research(cluster_id, research_result)
             return research_result
-            
-        except Exception as e:
-            print(f"[ERROR] Error in research stage: {e}")
-            return "Research failed"
 
-    def create_technical_analysis(self, original_text: str, research_findings: str) -> str:
+    async def keep_speculation(self, article_id: Optional[int], article_title: str, article_content: str,
+                               speculation) -> str:
+        """The speculative research of an article found relevant, shared with its story and topic
+        
+        Speculative research only calls the model: the article joins a story cluster and the
+        research enters the shared caches here, once the verdict says the article is relevant.
+        """
+        research_result = await self.speculator.keep(speculation)
+        cluster_id = self.story_clusters.assign(article_id, article_title, article_content)
+        if research_result != RESEARCH_SKIPPED_TEXT:
+            self.cache_research(article_title, research_result)
+            self.story_clusters.offer_research(cluster_id, research_result)
+        return research_result
+
+    async def speculative_relevance(self, article_id: Optional[int], article_content: str, article_title: str,
+                                    checkpoints: Dict[str, Dict]) -> Tuple[str, Optional[str]]:
+        """Stages 1 and 2 at once: research runs during the relevance check and is dropped if not relevant
+        
+        Returns (relevance answer, research findings or None for a non-relevant article).
+        """
+        speculation = self.speculator.launch(
+            self.research_topic_async(article_title, article_content, article_id, share=False))
+        tag = f"[{article_id}] " if article_id is not None else ""
+        print(f"[SPECULATE] {tag}Researching during the relevance check")
+        try:
+            relevance_text = await self.run_stage_async(
+                article_id, 'relevance', checkpoints,
+                lambda: self.check_article_relevance_async(article_content, article_title, article_id))
+        except BaseException:
+            await self.speculator.discard(speculation)
+            raise
+        
+        if not self.parse_relevance(relevance_text)[0]:
+            await self.speculator.discard(speculation)
+            return relevance_text, None
+        research_findings = await self.run_stage_async(article_id, 'research', checkpoints,
+                                                       lambda: self.keep_speculation(article_id, article_title,
+                                                                                     article_content, speculation))
+        return relevance_text, research_findings
+
+    async def create_technical_analysis_async(self, original_text: str, research_findings: str,
+                                              article_id: Optional[int] = None) -> str:
         """Stage 3: Create technical analysis using the analysis prompt"""
+        return await self.create_message_async(
+            'analysis', self.analysis_request(original_text, research_findings), article_id)
+
+    async def create_journalistic_article_async(self, technical_analysis: str, article_id: Optional[int] = None) -> str:
+        """Stage 4: Convert technical analysis to readable article using the journalistic prompt"""
+        return await self.create_message_async(
+            'journalistic', self.journalistic_request(technical_analysis), article_id)
+
+    # --- stage checkpoints ---
+
+    def load_checkpoints(self, article_id: Optional[int]) -> Dict[str, Dict]:
+        """Stages saved by earlier runs for one article ({} without an id)"""
+        if article_id is None:
+            return {}
         try:
-            prompt = self.analysis_prompt.format(
-                original_text=original_text[:2000],
-                research_findings=research_findings
-            )
-            
-            response = self.anthropic_client.messages.create(
-                model="claude-3-haiku-20240307",
-                max_tokens=2000,
-                temperature=0.3,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            return response.content[0].text
-            
+            return self.storage.get_stage_checkpoints([article_id]).get(article_id, {})
         except Exception as e:
-            print(f"[ERROR] Error in technical analysis: {e}")
-            return f"Technical analysis failed: {e}"
+            print(f"[WARNING] Could not load stage checkpoints of article {article_id}: {e}")
+            return {}
 
-    def create_journalistic_article(self, technical_analysis: str) -> str:
-        """Stage 4: Convert technical analysis to readable article using the journalistic prompt"""
+    def save_checkpoints(self, outputs: List[Tuple[int, str, str]]):
+        """Persist finished (article_id, stage, output) triples right away"""
         try:
-            prompt = self.journalistic_prompt.format(
-                technical_analysis=technical_analysis
-            )
-            
-            response = self.anthropic_client.messages.create(
-                model="claude-3-haiku-20240307",
-                max_tokens=2000,
-                temperature=0.4,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            return response.content[0].text
-            
+            self.storage.save_stage_outputs(outputs)
+        except Exception as e:
+            print(f"[WARNING] Could not save stage checkpoints: {e}")
+
+    def saved_output(self, checkpoints: Dict[str, Dict], stage: str, article_id: Optional[int]) -> Optional[str]:
+        """Output of a stage completed in an earlier run, or None"""
+        saved = checkpoints.get(stage)
+        if saved is None or saved['output'] is None:
+            return None
+        tag = f"[{article_id}] " if article_id is not None else ""
+        if stage == 'relevance' and article_id in self.screened_ids:
+            print(f"[SCREEN] {tag}relevance answered by the batched screening")
+        else:
+            print(f"[RESUME] {tag}{stage} already done in an earlier run - reusing it")
+        return saved['output']
+
+    def stage_failed(self, article_id: Optional[int], stage: str, error: Exception) -> StageFailed:
+        """Count a failed attempt of a stage; returns the StageFailed to raise
+        
+        A failure never becomes the stage's output. An attempt that could not be counted
+        is not final, so a database hiccup does not give up on the article.
+        """
+        print(f"[ERROR] Error in {stage} stage: {error}")
+        attempts = None
+        if article_id is not None:
+            try:
+                attempts = self.storage.record_stage_failure(article_id, stage, str(error)[:1000])
+            except Exception as e:
+                print(f"[WARNING] Could not record the failure of {stage}: {e}")
+        return StageFailed(stage, error, attempts)
+
+    async def run_stage_async(self, article_id: Optional[int], stage: str, checkpoints: Dict[str, Dict], compute) -> str:
+        """Output of one stage: the saved checkpoint, or await compute() persisted as soon as it returns"""
+        saved = self.saved_output(checkpoints, stage, article_id)
+        if saved is not None:
+            return saved
+        try:
+            output = await compute()
         except Exception as e:
-            print(f"[ERROR] Error in journalistic writing: {e}")
-            return f"Journalistic writing failed: {e}"
+            raise self.stage_failed(article_id, stage, e) from e
+        if article_id is not None:
+            self.save_checkpoints([(article_id, stage, output)])
+        return output
 
-    def analyze_article_with_anthropic(self, article_content: str, article_title: str) -> Optional[Dict]:
-        """Main analysis pipeline using 4-stage approach"""
-        print(f"[START] Starting 4-stage analysis for: {article_title[:50]}...")
+    def non_relevant_result(self, relevance_reason: str, model_used: Optional[str] = None,
+                            verdict: Optional[Dict] = None, models: Optional[Dict[str, str]] = None) -> Dict:
+        """process_data for an article that failed the relevance check
         
-        # Stage 1: Check relevance
-        print("📋 Stage 1: Checking relevance...")
-        is_relevant, relevance_reason = self.check_article_relevance(article_content, article_title)
+        models are the models that served the article's calls in this run, by stage.
+        """
+        models = models or {}
+        result = {
+            'analysis': {
+                'relevant': False,
+                'reason': relevance_reason,
+                'category': verdict['category'] if verdict else 'non-political'
+            },
+            'category': 'non-political',
+            'model_used': (model_used or models.get('relevance') or models.get('relevance_batch')
+                           or self.model_router.choose('relevance')[0]),
+            'processed_at': datetime.now().isoformat(),
+            'is_relevant': False
+        }
+        if verdict:
+            result['relevance'] = verdict
+        if models:
+            result['models'] = models
+        return result
+
+    def prefilter_verdict(self, article_content: str, article_title: str) -> Optional[Dict]:
+        """Non-relevant result when the local pre-filter is confident, None otherwise"""
+        if self.prefilter is None:
+            return None
+        skip, probability = self.prefilter.should_skip(article_title, article_content)
+        if not skip:
+            return None
+        result = self.non_relevant_result(f"Local pre-filter: non-political (p={probability:.3f})",
+                                          model_used=PREFILTER_MODEL_USED)
+        result['analysis']['prefilter_score'] = round(probability, 4)
+        return result
+
+    def screen_relevance(self, articles: List[Dict]):
+        """Batched stage 1 for the articles without a relevance checkpoint
         
-        if not is_relevant:
-            print(f"[BLOCKED] Article not relevant: {relevance_reason}")
-            return {
-                'analysis': {
-                    'relevant': False,
-                    'reason': relevance_reason,
-                    'category': 'non-political'
-                },
-                'model_used': "claude-3-haiku-20240307",
-                'processed_at': datetime.now().isoformat(),
-                'is_relevant': False
-            }
-        
-        print(f"[OK] Article is relevant: {relevance_reason}")
-        
-        # Stage 2: Research
-        print("[SEARCH] Stage 2: Researching topic...")
-        main_topic = article_title  # Simple topic extraction
-        article_summary = article_content[:500]  # First 500 chars as summary
-        research_findings = self.research_topic(main_topic, article_summary)
-        
-        print(f"📚 Research completed, findings length: {len(research_findings)} characters")
-        
-        # Add delay between stages
-        time.sleep(1)
-        
-        # Stage 3: Technical Analysis
-        print("[WRITE] Stage 3: Technical analysis...")
-        technical_analysis = self.create_technical_analysis(article_content, research_findings)
-        time.sleep(1)
-        
-        # Stage 4: Journalistic Writing
-        print("[WRITE] Stage 4: Final article...")
-        final_article = self.create_journalistic_article(technical_analysis)
-        
-        # Combine results
-        final_result = {
+        Answers are saved as relevance checkpoints; articles left without one get the
+        single-article call when they are processed.
+        """
+        try:
+            checkpoints = self.storage.get_stage_checkpoints([article['id'] for article in articles])
+        except Exception as e:
+            print(f"[WARNING] Could not load stage checkpoints: {e}")
+            checkpoints = {}
+        pending = []
+        for article in articles:
+            saved = checkpoints.get(article['id'], {}).get('relevance')
+            if saved and saved['output'] is not None:
+                continue
+            if self.prefilter and self.prefilter.score(article['title'], article['clean_content']) >= self.prefilter.threshold:
+                continue
+            pending.append(article)
+        if not pending:
+            return
+        
+        print(f"📋 Stage 1: Screening {len(pending)} articles, {self.relevance_batcher.size} per call...")
+        for group in self.relevance_batcher.groups(pending):
+            started = time.time()
+            tokens_before = sum(self.token_usage.values())
+            try:
+                verdicts = parse_verdicts(self.create_message('relevance_batch', self.relevance_batch_request(group)),
+                                          [article['id'] for article in group], self.structured_relevance)
+            except Exception as e:
+                print(f"[WARNING] Batched relevance call failed: {e}")
+                verdicts = {}
+            if len(verdicts) < len(group):
+                print(f"[WARNING] {len(group) - len(verdicts)} of {len(group)} articles without a batched "
+                      f"verdict - they get a single relevance call")
+            self.save_checkpoints([(article_id, 'relevance', answer) for article_id, answer in verdicts.items()])
+            self.screened_ids.update(verdicts)
+            self.relevance_batcher.record(len(group), len(verdicts), sum(self.token_usage.values()) - tokens_before,
+                                          time.time() - started)
+
+    def relevant_result(self, research_findings: str, technical_analysis: str, final_article: str,
+                        verdict: Optional[Dict] = None, models: Optional[Dict[str, str]] = None) -> Dict:
+        """process_data for an article that went through all four stages; model_used wrote the final article"""
+        models = models or {}
+        result = {
             'technical_analysis': technical_analysis,
             'journalistic_article': final_article,
             'research_notes': research_findings,
-            'model_used': "claude-3-haiku-20240307",
+            'category': 'political',
+            'model_used': models.get('journalistic') or self.model_router.choose('journalistic')[0],
             'processed_at': datetime.now().isoformat(),
             'is_relevant': True
         }
+        if verdict:
+            result['relevance'] = verdict
+        if models:
+            result['models'] = models
+        return result
+
+    async def analyze_article_async(self, article: Dict) -> Optional[Dict]:
+        """Main analysis pipeline using 4-stage approach, awaiting each stage in order
+        
+        Each stage is checkpointed as soon as it completes and stages finished by an
+        earlier run are reused; a failing stage raises StageFailed. Every line is tagged
+        with the article id, as other articles may run next to it.
+        """
+        article_id = article['id']
+        article_content = article['clean_content']
+        article_title = article['title']
+        print(f"[START] [{article_id}] Starting 4-stage analysis for: {article_title[:50]}...")
+        checkpoints = self.load_checkpoints(article_id)
+        self.model_router.profile(article_id, article_title, article_content)
+        
+        prefiltered = self.prefilter_verdict(article_content, article_title)
+        if prefiltered:
+            print(f"[BLOCKED] [{article_id}] {prefiltered['analysis']['reason']}")
+            return prefiltered
+        
+        research_findings = None
+        if self.budget_governor.allows_speculation() and self.speculator.should_speculate(
+                checkpoints, article_title, article_content):
+            relevance_text, research_findings = await self.speculative_relevance(
+                article_id, article_content, article_title, checkpoints)
+        else:
+            relevance_text = await self.run_stage_async(
+                article_id, 'relevance', checkpoints,
+                lambda: self.check_article_relevance_async(article_content, article_title, article_id))
+        is_relevant, relevance_reason = self.parse_relevance(relevance_text)
+        if not is_relevant:
+            print(f"[BLOCKED] [{article_id}] Article not relevant: {relevance_reason[:80]}")
+            return self.non_relevant_result(relevance_reason, verdict=parse_verdict(relevance_text),
+                                            models=self.model_router.served_models(article_id))
+        
+        if research_findings is None:
+            print(f"[SEARCH] [{article_id}] Relevant - researching topic...")
+            research_findings = await self.run_stage_async(
+                article_id, 'research', checkpoints,
+                lambda: self.clustered_research_async(article_id, article_title, article_content))
         
-        print("🎉 4-stage analysis completed successfully")
-        print("\n" + "="*80)
-        print("[WRITE] FINAL ARTICLE:")
-        print("="*80)
-        print(final_article)
-        print("="*80)
-        print()
+        print(f"[WRITE] [{article_id}] Research done ({len(research_findings)} characters) - technical analysis...")
+        technical_analysis = await self.run_stage_async(
+            article_id, 'analysis', checkpoints,
+            lambda: self.create_technical_analysis_async(article_content, research_findings, article_id))
         
-        return final_result
+        print(f"[WRITE] [{article_id}] Writing final article...")
+        final_article = await self.run_stage_async(
+            article_id, 'journalistic', checkpoints,
+            lambda: self.create_journalistic_article_async(technical_analysis, article_id))
+        
+        print(f"🎉 [{article_id}] 4-stage analysis completed ({len(final_article)} characters)")
+        return self.relevant_result(research_findings, technical_analysis, final_article,
+                                    parse_verdict(relevance_text), self.model_router.served_models(article_id))
 
-    def get_unprocessed_articles(self) -> List[Dict]:
-        """Get all articles where isProcessed = 0"""
+    def get_unprocessed_articles(self, limit: Optional[int] = None) -> List[Dict]:
+        """Get all articles where isProcessed = 0 (oldest first, optionally limited)"""
         try:
-            conn = psycopg2.connect(self.db_url)
-            cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-            
-            cursor.execute("""
-                SELECT id, title, url, clean_content, created_at 
-                FROM news_items 
-                WHERE isProcessed = 0 
-                ORDER BY created_at ASC
-            """)
-            
-            articles = []
-            for row in cursor.fetchall():
-                articles.append({
-                    'id': row['id'],
-                    'title': row['title'],
-                    'url': row['url'],
-                    'clean_content': row['clean_content'],
-                    'created_at': row['created_at']
-                })
-            
-            conn.close()
+            articles = self.storage.get_unprocessed_articles(limit)
             print(f"[NEWS] Found {len(articles)} unprocessed articles")
             return articles
             
@@ -352,146 +899,941 @@ class ArticleProcessor:
     def update_article_as_processed(self, article_id: int, analysis_data: Dict):
         """Mark article as processed and save analysis data"""
         try:
-            conn = psycopg2.connect(self.db_url)
-            cursor = conn.cursor()
-            
-            # Determine the isProcessed value based on relevance
+            # isProcessed = 1 for relevant articles, 2 for non-relevant ones
             if analysis_data.get('is_relevant', True):
-                is_processed_value = 1  # Relevant article - fully processed
                 print(f"[OK] Article {article_id} marked as RELEVANT (isProcessed = 1)")
             else:
-                is_processed_value = 2  # Non-relevant article - marked as such
                 print(f"[BLOCKED] Article {article_id} marked as NOT RELEVANT (isProcessed = 2)")
             
-            # Update the article with the new 4-stage result structure
-            cursor.execute("""
-                UPDATE news_items 
-                SET isProcessed = ?, 
-                    process_data = ? 
-                WHERE id = ?
-            """, (is_processed_value, json.dumps(analysis_data), article_id))
-            
-            conn.commit()
-            conn.close()
+            # Store the analysis and promote the fields the feed filters on
+            self.storage.update_article_as_processed(article_id, analysis_data)
             
             print(f"[OK] Article {article_id} updated successfully with 4-stage analysis")
             
         except Exception as e:
             print(f"[ERROR] Error updating article {article_id}: {e}")
 
-    def process_articles(self, limit: Optional[int] = None):
-        """Main function to process unprocessed articles automatically"""
+    def refresh_feed_snapshot(self, article_ids: List[int]):
+        """Update the precomputed web feed for articles processed in this batch"""
+        if not article_ids:
+            return
+        
+        try:
+            feed_count = self.storage.refresh_feed(article_ids)
+            print(f"[OK] Feed snapshot updated: {feed_count} of {len(article_ids)} articles in the feed")
+        except Exception as e:
+            print(f"[ERROR] Error updating feed snapshot: {e}")
+
+    def record_result(self, article: Dict, analysis_result: Optional[Dict], counts: Dict, feed_ids: List[int]):
+        """Save one pipeline result and update the run counters"""
+        if analysis_result:
+            # Update the article as processed
+            self.update_article_as_processed(article['id'], analysis_result)
+            counts['processed'] += 1
+            feed_ids.append(article['id'])
+            if len(feed_ids) >= 10:
+                self.refresh_feed_snapshot(feed_ids)
+                feed_ids.clear()
+            
+            # Count relevant vs non-relevant
+            if analysis_result.get('is_relevant', True):
+                counts['relevant'] += 1
+                print(f"   [OK] Marked as RELEVANT")
+            else:
+                counts['non_relevant'] += 1
+                print(f"   [BLOCKED] Marked as NOT RELEVANT")
+        else:
+            counts['errors'] += 1
+            print(f"   [ERROR] Failed to process")
+
+    def process_articles(self, limit: Optional[int] = None) -> int:
+        """Main function to process unprocessed articles automatically
+        
+        Returns the number of articles finished (saved as relevant or not). Failed articles
+        stay unprocessed and are not counted, so callers drain in batches only while the
+        batches make progress.
+        """
         print("[START] Starting automatic article processing with 4-stage pipeline...")
         print("=" * 60)
         
-        # Get unprocessed articles
-        articles = self.get_unprocessed_articles()
+        # Get unprocessed articles (all of them to rank when a token budget decides what runs)
+        articles = self.get_unprocessed_articles(None if self.budget_governor.enabled else limit)
         
         if not articles:
             print("✨ No unprocessed articles found!")
-            return
+            return 0
+        
+        self.budget_governor.reset_stats()
+        articles = self.budget_governor.admit(articles, limit)
+        if not articles:
+            print(f"[BUDGET] Nothing admitted - {self.budget_governor.remaining_summary()}")
+            return 0
         
-        # Apply limit if specified
         if limit:
-            articles = articles[:limit]
             print(f"[WRITE] Processing limited to {limit} articles")
         else:
             print(f"[WRITE] Processing ALL {len(articles)} unprocessed articles automatically")
         
-        processed_count = 0
-        relevant_count = 0
-        non_relevant_count = 0
-        error_count = 0
+        counts = {'processed': 0, 'relevant': 0, 'non_relevant': 0, 'errors': 0}
+        self.response_cache.reset_stats()
+        self.stream_guard.reset_stats()
+        self.reset_token_usage()
+        if self.prefilter:
+            self.prefilter.reset_stats()
+        self.story_clusters.reset_stats()
+        self.research_cache.reset_stats()
+        self.token_budget.reset_stats()
+        self.speculator.reset_stats()
+        self.relevance_batcher.reset_stats()
+        self.model_router.reset_stats()
+        self.screened_ids = set()
+        self.cluster_locks = {}
         
-        for i, article in enumerate(articles, 1):
-            print(f"\n[NEWS] Processing article {i}/{len(articles)}: {article['title'][:60]}...")
-            print(f"   ID: {article['id']}")
-            print(f"   URL: {article['url']}")
-            print(f"   Content length: {len(article['clean_content'])} characters")
-            
-            # Analyze the article using 4-stage pipeline
-            analysis_result = self.analyze_article_with_anthropic(
-                article['clean_content'], 
-                article['title']
+        # Processed ids waiting to be pushed to the feed snapshot (one write per few articles)
+        feed_ids = []
+        
+        start_time = time.time()
+        if self.relevance_batcher.enabled:
+            self.screen_relevance(articles)
+        if self.pipeline_mode:
+            asyncio.run(self.with_async_client(self.process_articles_pipelined(articles, counts, feed_ids)))
+        else:
+            asyncio.run(self.with_async_client(self.process_articles_concurrently(articles, counts, feed_ids)))
+        elapsed = time.time() - start_time
+        
+        self.refresh_feed_snapshot(feed_ids)
+        self.token_budget.save()
+        self.telemetry.flush()
+        
+        print("\n" + "=" * 60)
+        print(f"🎉 Processing complete!")
+        print(f"   [OK] Successfully processed: {counts['processed']}")
+        print(f"   [SEARCH] Relevant articles: {counts['relevant']}")
+        print(f"   [BLOCKED] Non-relevant articles: {counts['non_relevant']}")
+        print(f"   [ERROR] Errors: {counts['errors']}")
+        print(f"   [STATS] Total articles: {len(articles)}")
+        if elapsed > 0:
+            mode = "staged pipeline" if self.pipeline_mode else f"concurrency {self.concurrency}"
+            print(f"   [TIME] {elapsed:.1f}s - {len(articles) / elapsed * 60:.1f} articles/min ({mode})")
+        if self.pipeline_mode and self.pipeline:
+            for line in self.pipeline.summary_lines():
+                print(f"   [PIPELINE] {line}")
+        for line in self.stream_guard.summary_lines():
+            print(f"   [STREAM] {line}")
+        print(f"   [RATE] {self.rate_governor.summary()}")
+        print(f"   [CACHE] {self.response_cache.summary()}")
+        print(f"   [PROMPT CACHE] {self.prompt_cache_summary()}")
+        if self.prefilter:
+            print(f"   [PREFILTER] {self.prefilter.summary()}")
+        print(f"   [CLUSTERS] {self.story_clusters.summary()}")
+        print(f"   [TOPIC CACHE] {self.research_cache.summary()}")
+        print(f"   [TOKENS] {self.token_budget.summary()}")
+        print(f"   [SPECULATE] {self.speculator.summary()}")
+        print(f"   [SCREEN] {self.relevance_batcher.summary()}")
+        print(f"   [MODELS] {self.model_router.summary()}")
+        print(f"   [BUDGET] {self.budget_governor.summary()}")
+        
+        return counts['processed']
+
+    def report_stage_failure(self, article_id: int, error: StageFailed):
+        """An article whose stage failed resumes there next run; after STAGE_MAX_ATTEMPTS it is set aside
+        
+        A set-aside article is marked failed (isProcessed = 3): it leaves the queue, never reaches
+        the feed and keeps its stage rows, so `reset_database.py --status 3` retries it.
+        """
+        if not error.final:
+            print(f"[WARNING] [{article_id}] {error} - the article resumes at this stage next run")
+            return
+        print(f"[ERROR] [{article_id}] {error} - giving up, marked as failed (isProcessed = 3)")
+        try:
+            self.storage.mark_articles_failed([article_id])
+        except Exception as e:
+            print(f"[ERROR] Could not mark article {article_id} as failed: {e}")
+
+    def defer_article(self, article: Dict):
+        """Leave an admitted article unprocessed because the token budget ran out"""
+        self.budget_governor.stopped()
+        print(f"[BUDGET] [{article['id']}] Token budget used up - left for a later run")
+
+    async def process_articles_concurrently(self, articles: List[Dict], counts: Dict, feed_ids: List[int]):
+        """Run up to self.concurrency articles through the pipeline at once
+        
+        The stages of one article still run in order; the semaphore only bounds how many
+        articles are in flight. Database writes happen on the event loop thread as each
+        article finishes, so the storage connection is never shared between threads.
+        With concurrency 1 this is the sequential mode, which also prints each final article.
+        """
+        sequential = self.concurrency == 1
+        if not sequential:
+            print(f"[START] Concurrent mode: up to {self.concurrency} articles in flight")
+        semaphore = asyncio.Semaphore(self.concurrency)
+        started = done = 0
+        
+        async def run_one(article: Dict):
+            nonlocal started, done
+            async with semaphore:
+                started += 1
+                if sequential:
+                    print(f"\n[NEWS] Processing article {started}/{len(articles)}: {article['title'][:60]}...")
+                    print(f"   ID: {article['id']}")
+                    print(f"   URL: {article['url']}")
+                    print(f"   Content length: {len(article['clean_content'])} characters")
+                if not self.budget_governor.admits_more():
+                    self.defer_article(article)
+                    return
+                try:
+                    analysis_result = await self.analyze_article_async(article)
+                except StageFailed as e:
+                    self.report_stage_failure(article['id'], e)
+                    analysis_result = None
+                except Exception as e:
+                    print(f"[ERROR] [{article['id']}] Pipeline error: {e}")
+                    analysis_result = None
+            done += 1
+            if not sequential:
+                print(f"\n[PROGRESS] {done}/{len(articles)} - article {article['id']}: {article['title'][:60]}")
+            elif analysis_result and analysis_result.get('is_relevant'):
+                print("\n" + "="*80)
+                print("[WRITE] FINAL ARTICLE:")
+                print("="*80)
+                print(analysis_result['journalistic_article'])
+                print("="*80)
+                print()
+            self.record_result(article, analysis_result, counts, feed_ids)
+        
+        if sequential:
+            for article in articles:
+                await run_one(article)
+        else:
+            await asyncio.gather(*(run_one(article) for article in articles))
+
+    async def with_async_client(self, coroutine):
+        """Await an async processing mode with a fresh AsyncAnthropic client
+        
+        A fresh client per run: its connection pool belongs to this event loop.
+        """
+        async with anthropic.AsyncAnthropic(api_key=self.api_key, max_retries=0) as client:
+            self.async_client = client
+            try:
+                return await coroutine
+            finally:
+                self.async_client = None
+
+    # --- staged pipeline ---
+
+    async def pipeline_relevance(self, item: Dict) -> Optional[str]:
+        """Pipeline stage 1: pre-filter and relevance; non-relevant articles end here"""
+        article = item['article']
+        if not self.budget_governor.admits_more():
+            item['deferred'] = True
+            return None
+        item['checkpoints'] = self.load_checkpoints(article['id'])
+        self.model_router.profile(article['id'], article['title'], article['clean_content'])
+        
+        prefiltered = self.prefilter_verdict(article['clean_content'], article['title'])
+        if prefiltered:
+            print(f"[BLOCKED] [{article['id']}] {prefiltered['analysis']['reason']}")
+            item['result'] = prefiltered
+            return None
+        
+        # A speculative research task keeps running while the article waits in the research queue
+        speculation = None
+        if self.budget_governor.allows_speculation() and self.speculator.should_speculate(
+                item['checkpoints'], article['title'], article['clean_content']):
+            print(f"[SPECULATE] [{article['id']}] Researching during the relevance check")
+            speculation = self.speculator.launch(
+                self.research_topic_async(article['title'], article['clean_content'], article['id'], share=False))
+        try:
+            relevance_text = await self.run_stage_async(
+                article['id'], 'relevance', item['checkpoints'],
+                lambda: self.check_article_relevance_async(article['clean_content'], article['title'], article['id']))
+        except BaseException:
+            await self.speculator.discard(speculation)
+            raise
+        is_relevant, relevance_reason = self.parse_relevance(relevance_text)
+        if not is_relevant:
+            await self.speculator.discard(speculation)
+            print(f"[BLOCKED] [{article['id']}] Article not relevant: {relevance_reason[:80]}")
+            item['result'] = self.non_relevant_result(relevance_reason, verdict=parse_verdict(relevance_text),
+                                                      models=self.model_router.served_models(article['id']))
+            return None
+        item['speculation'] = speculation
+        item['verdict'] = parse_verdict(relevance_text)
+        
+        print(f"[SEARCH] [{article['id']}] Relevant - queued for research")
+        return 'research'
+
+    async def pipeline_research(self, item: Dict) -> Optional[str]:
+        """Pipeline stage 2: research with the quality retry, or the speculative research already running
+        
+        Articles that reach it after the token budget ran out wait for a later run (relevance is checkpointed).
+        """
+        article = item['article']
+        speculation = item.pop('speculation', None)
+        if speculation is None and not self.budget_governor.admits_more():
+            item['deferred'] = True
+            return None
+        if speculation is not None:
+            compute = lambda: self.keep_speculation(article['id'], article['title'], article['clean_content'],
+                                                    speculation)
+        else:
+            compute = lambda: self.clustered_research_async(article['id'], article['title'], article['clean_content'])
+        item['research'] = await self.run_stage_async(article['id'], 'research', item['checkpoints'], compute)
+        return 'analysis'
+
+    async def pipeline_analysis(self, item: Dict) -> str:
+        """Pipeline stage 3: technical analysis"""
+        article = item['article']
+        item['analysis'] = await self.run_stage_async(
+            article['id'], 'analysis', item['checkpoints'],
+            lambda: self.create_technical_analysis_async(article['clean_content'], item['research'], article['id']))
+        return 'journalistic'
+
+    async def pipeline_journalistic(self, item: Dict) -> None:
+        """Pipeline stage 4: the final article"""
+        article = item['article']
+        final_article = await self.run_stage_async(
+            article['id'], 'journalistic', item['checkpoints'],
+            lambda: self.create_journalistic_article_async(item['analysis'], article['id']))
+        print(f"🎉 [{article['id']}] 4-stage analysis completed ({len(final_article)} characters)")
+        item['result'] = self.relevant_result(item['research'], item['analysis'], final_article, item.get('verdict'),
+                                              self.model_router.served_models(article['id']))
+        return None
+
+    def build_pipeline(self, on_done) -> StagePipeline:
+        """The four stages with their worker pools; PIPELINE_QUEUE_SIZE bounds every queue"""
+        queue_size = int(os.getenv('PIPELINE_QUEUE_SIZE', '0')) or None
+        handlers = [
+            ('relevance', self.pipeline_relevance),
+            ('research', self.pipeline_research),
+            ('analysis', self.pipeline_analysis),
+            ('journalistic', self.pipeline_journalistic),
+        ]
+        self.pipeline = StagePipeline(
+            [PipelineStage(name, handler, self.stage_workers.get(name, 1), queue_size) for name, handler in handlers],
+            on_done
+        )
+        workers = ", ".join(f"{name} {self.stage_workers.get(name, 1)}" for name, _ in handlers)
+        print(f"[START] Staged pipeline - workers per stage: {workers}")
+        return self.pipeline
+
+    def finish_pipeline_item(self, item: Dict, error: Optional[Exception], counts: Dict, feed_ids: List[int]):
+        """Save one article that left the pipeline"""
+        article = item['article']
+        if item.get('deferred'):
+            self.model_router.served_models(article['id'])
+            self.defer_article(article)
+            return
+        if error is not None:
+            self.model_router.served_models(article['id'])
+        if isinstance(error, StageFailed):
+            self.report_stage_failure(article['id'], error)
+        elif error is not None:
+            print(f"[ERROR] [{article['id']}] Pipeline error: {error}")
+        self.record_result(article, item.get('result') if error is None else None, counts, feed_ids)
+
+    async def process_articles_pipelined(self, articles: List[Dict], counts: Dict, feed_ids: List[int]):
+        """Push a list of articles through the staged pipeline"""
+        done = 0
+        
+        def on_done(item: Dict, error: Optional[Exception]):
+            nonlocal done
+            done += 1
+            print(f"\n[PROGRESS] {done}/{len(articles)} - article {item['article']['id']}: "
+                  f"{item['article']['title'][:60]}")
+            self.finish_pipeline_item(item, error, counts, feed_ids)
+        
+        await self.build_pipeline(on_done).run([{'article': article} for article in articles])
+
+    def run_message_batch(self, stage: str, requests: Dict[str, Dict], poll_interval: float = 30) -> Dict[str, str]:
+        """Submit {custom_id: params} through the Message Batches API and wait for it
+        
+        Requests already in the response cache are answered locally and not submitted.
+        Returns {custom_id: response text} for the requests that succeeded; errored or
+        expired requests are left out so their articles stay unprocessed for the next run.
+        """
+        requests = {custom_id: self.model_router.route(stage, params, batch_article_id(custom_id))
+                    for custom_id, params in requests.items()}
+        results = {}
+        for custom_id, params in list(requests.items()):
+            cached = self.response_cache.get(stage, params)
+            if cached is not None:
+                results[custom_id] = cached
+                self.telemetry.record(stage, params.get('model'), outcome='cached',
+                                      article_id=batch_article_id(custom_id))
+                self.model_router.served(stage, batch_article_id(custom_id), params, params.get('model'))
+        if results:
+            print(f"[CACHE] {len(results)} of {len(requests)} {stage} requests answered from the cache")
+            requests = {custom_id: params for custom_id, params in requests.items() if custom_id not in results}
+        if not requests:
+            return results
+        
+        # The batch endpoints are not paced by the governor - let the SDK retry them
+        client = self.anthropic_client.with_options(max_retries=3)
+        items = list(requests.items())
+        batch_ids = []
+        for offset in range(0, len(items), MESSAGE_BATCH_MAX_REQUESTS):
+            chunk = items[offset:offset + MESSAGE_BATCH_MAX_REQUESTS]
+            batch = client.messages.batches.create(
+                requests=[{'custom_id': custom_id, 'params': params} for custom_id, params in chunk]
             )
-            
-            if analysis_result:
-                # Update the article as processed
-                self.update_article_as_processed(article['id'], analysis_result)
-                processed_count += 1
-                
-                # Count relevant vs non-relevant
-                if analysis_result.get('is_relevant', True):
-                    relevant_count += 1
-                    print(f"   [OK] Marked as RELEVANT")
+            batch_ids.append(batch.id)
+            print(f"[AI] Submitted {stage} batch {batch.id} with {len(chunk)} requests")
+        
+        start_time = time.time()
+        waiting = list(batch_ids)
+        while waiting:
+            time.sleep(poll_interval)
+            for batch_id in list(waiting):
+                batch = client.messages.batches.retrieve(batch_id)
+                counts = batch.request_counts
+                if batch.processing_status == 'ended':
+                    waiting.remove(batch_id)
+                    print(f"[OK] {stage} batch {batch_id} ended after {time.time() - start_time:.0f}s: "
+                          f"{counts.succeeded} succeeded, {counts.errored} errored, {counts.expired} expired")
+                else:
+                    print(f"[WAIT] {stage} batch {batch_id}: {counts.processing} processing "
+                          f"({time.time() - start_time:.0f}s)")
+        
+        for batch_id in batch_ids:
+            for entry in client.messages.batches.results(batch_id):
+                if entry.result.type == 'succeeded':
+                    message = entry.result.message
+                    results[entry.custom_id] = message_text(message)
+                    if self.valid_answer(stage, results[entry.custom_id]):
+                        self.response_cache.put(stage, requests[entry.custom_id], results[entry.custom_id],
+                                                message.usage, message.stop_reason)
+                    self.record_usage(message.usage)
+                    self.token_budget.observe(stage, requests[entry.custom_id], message.usage, message.stop_reason)
+                    self.telemetry.record(stage, message.model, message.usage, article_id=batch_article_id(entry.custom_id),
+                                          batch=True)
+                    self.model_router.served(stage, batch_article_id(entry.custom_id), requests[entry.custom_id],
+                                             message.model)
+                else:
+                    print(f"[ERROR] {stage} request {entry.custom_id} {entry.result.type}")
+                    self.telemetry.record(stage, requests[entry.custom_id].get('model'), outcome=entry.result.type,
+                                          article_id=batch_article_id(entry.custom_id), batch=True)
+        return results
+
+    def process_articles_batch(self, limit: Optional[int] = None, poll_interval: float = 30) -> int:
+        """Process the backlog through the Message Batches API, one batch per stage
+        
+        For large backlogs where latency does not matter: relevance for every pending
+        article goes out as one batch, then research, analysis and journalism as batches
+        for the relevant subset. Results are written back in bulk after each phase.
+        
+        Every stage's outputs are checkpointed when its batch ends, so a run that dies
+        while waiting for a later batch does not submit the earlier stages again.
+        Returns the number of articles finished, like process_articles.
+        """
+        print("[START] Starting backlog processing with the Message Batches API...")
+        print("=" * 60)
+        
+        articles = self.get_unprocessed_articles(None if self.budget_governor.enabled else limit)
+        if not articles:
+            print("✨ No unprocessed articles found!")
+            return 0
+        
+        self.budget_governor.reset_stats()
+        articles = self.budget_governor.admit(articles, limit)
+        if not articles:
+            print(f"[BUDGET] Nothing admitted - {self.budget_governor.remaining_summary()}")
+            return 0
+        
+        self.reset_token_usage()
+        self.response_cache.reset_stats()
+        if self.prefilter:
+            self.prefilter.reset_stats()
+        self.story_clusters.reset_stats()
+        self.research_cache.reset_stats()
+        self.token_budget.reset_stats()
+        self.model_router.reset_stats()
+        self.cluster_locks = {}
+        start_time = time.time()
+        by_key = {f"article-{article['id']}": article for article in articles}
+        for article in articles:
+            self.model_router.profile(article['id'], article['title'], article['clean_content'])
+        try:
+            checkpoints = self.storage.get_stage_checkpoints([article['id'] for article in articles])
+        except Exception as e:
+            print(f"[WARNING] Could not load stage checkpoints: {e}")
+            checkpoints = {}
+        
+        def split_saved(stage: str, keys) -> Tuple[Dict[str, str], List[str]]:
+            """({key: output saved by an earlier run}, keys still to submit)"""
+            saved, pending = {}, []
+            for key in keys:
+                checkpoint = checkpoints.get(by_key[key]['id'], {}).get(stage)
+                if checkpoint and checkpoint['output'] is not None:
+                    saved[key] = checkpoint['output']
                 else:
-                    non_relevant_count += 1
-                    print(f"   [BLOCKED] Marked as NOT RELEVANT")
+                    pending.append(key)
+            if saved:
+                print(f"[RESUME] {stage}: {len(saved)} articles already done in an earlier run")
+            return saved, pending
+        
+        def checkpoint(stage: str, outputs: Dict[str, str]):
+            self.save_checkpoints([(by_key[key]['id'], stage, output) for key, output in outputs.items()])
+        
+        # Stage 0: the local pre-filter answers obvious non-political items
+        non_relevant = []
+        candidates = {}
+        for key, article in by_key.items():
+            prefiltered = self.prefilter_verdict(article['clean_content'], article['title'])
+            if prefiltered:
+                non_relevant.append((article['id'], prefiltered))
+            else:
+                candidates[key] = article
+        if non_relevant:
+            print(f"[BLOCKED] Pre-filter skipped {len(non_relevant)} clearly non-political articles")
+        
+        # Stage 1: relevance for everything else
+        print(f"\n📋 Stage 1: Checking relevance of {len(candidates)} articles...")
+        verdicts, pending = split_saved('relevance', candidates)
+        fresh = self.run_message_batch('relevance', {
+            key: self.relevance_request(by_key[key]['clean_content'], by_key[key]['title'])
+            for key in pending
+        }, poll_interval)
+        invalid = [key for key, relevance_text in fresh.items() if not self.valid_answer('relevance', relevance_text)]
+        if invalid:
+            print(f"[WARNING] {len(invalid)} relevance verdicts do not match the schema - retried next run")
+        fresh = {key: relevance_text for key, relevance_text in fresh.items() if key not in invalid}
+        checkpoint('relevance', fresh)
+        verdicts.update(fresh)
+        
+        relevant_keys = []
+        for key, relevance_text in verdicts.items():
+            is_relevant, relevance_reason = self.parse_relevance(relevance_text)
+            if is_relevant:
+                relevant_keys.append(key)
             else:
-                error_count += 1
-                print(f"   [ERROR] Failed to process")
+                non_relevant.append((by_key[key]['id'],
+                                     self.non_relevant_result(relevance_reason, verdict=parse_verdict(relevance_text),
+                                                              models=self.model_router.served_models(by_key[key]['id']))))
+        
+        if non_relevant:
+            self.storage.update_articles_as_processed(non_relevant)
+            self.refresh_feed_snapshot([article_id for article_id, _ in non_relevant])
+        print(f"[BLOCKED] {len(non_relevant)} non-relevant articles saved, {len(relevant_keys)} relevant")
+        
+        # Stage 2: research once per story, with one retry batch for answers that look empty
+        print(f"\n[SEARCH] Stage 2: Researching {len(relevant_keys)} topics...")
+        research, pending = split_saved('research', relevant_keys)
+        
+        # The first article of each story is researched; the others copy its findings
+        fresh = {}
+        leaders = {}
+        followers = []
+        for key in pending:
+            article = by_key[key]
+            cluster_id = self.story_clusters.assign(article['id'], article['title'], article['clean_content'])
+            shared = self.story_clusters.shared_research(cluster_id)
+            if shared is not None:
+                fresh[key] = shared
+            elif cluster_id is not None and cluster_id in leaders:
+                followers.append((key, cluster_id))
+            else:
+                leaders[cluster_id if cluster_id is not None else key] = key
+        
+        # Leaders whose topic was researched recently skip the batch and the quality retry
+        topic_hits = {}
+        for key in leaders.values():
+            cached = self.research_cache.get(by_key[key]['title'])
+            if cached is not None:
+                topic_hits[key] = cached
+        
+        to_research = [key for key in leaders.values() if key not in topic_hits]
+        if to_research and self.budget_governor.skip_research(len(to_research)):
+            print(f"[BUDGET] Research skipped for {len(to_research)} articles - the token budget is nearly used up")
+            researched = {key: RESEARCH_SKIPPED_TEXT for key in to_research}
+        else:
+            researched = self.run_message_batch('research', {
+                key: self.research_request(by_key[key]['title'], by_key[key]['clean_content'])
+                for key in to_research
+            }, poll_interval)
             
-            # Add delay to avoid rate limiting
-            if i < len(articles):
-                print("   [WAIT] Waiting 2 seconds before next article...")
-                time.sleep(2)
+            weak_keys = [key for key, findings in researched.items() if not self.verify_research_quality(findings)]
+            if weak_keys:
+                print(f"[WARNING] Research quality low for {len(weak_keys)} articles - retrying them as a batch...")
+                researched.update(self.run_message_batch('research-retry', {
+                    key: self.research_retry_request(by_key[key]['title']) for key in weak_keys
+                }, poll_interval))
+            for key, findings in researched.items():
+                self.cache_research(by_key[key]['title'], findings)
+        researched.update(topic_hits)
+        
+        for cluster_id, key in leaders.items():
+            if key in researched and cluster_id != key and researched[key] != RESEARCH_SKIPPED_TEXT:
+                self.story_clusters.save_research(cluster_id, researched[key])
+        for key, cluster_id in followers:
+            if leaders[cluster_id] in researched:
+                fresh[key] = researched[leaders[cluster_id]]
+                self.story_clusters.stats['research_reused'] += 1
+        fresh.update(researched)
+        checkpoint('research', fresh)
+        research.update(fresh)
+        
+        # Stage 3: technical analysis
+        print(f"\n[WRITE] Stage 3: Technical analysis of {len(research)} articles...")
+        analyses, pending = split_saved('analysis', research)
+        fresh = self.run_message_batch('analysis', {
+            key: self.analysis_request(by_key[key]['clean_content'], research[key])
+            for key in pending
+        }, poll_interval)
+        checkpoint('analysis', fresh)
+        analyses.update(fresh)
+        
+        # Stage 4: journalistic writing
+        print(f"\n[WRITE] Stage 4: Writing {len(analyses)} final articles...")
+        final_articles, pending = split_saved('journalistic', analyses)
+        fresh = self.run_message_batch('journalistic', {
+            key: self.journalistic_request(analyses[key])
+            for key in pending
+        }, poll_interval)
+        checkpoint('journalistic', fresh)
+        final_articles.update(fresh)
+        
+        completed = [
+            (by_key[key]['id'], self.relevant_result(research[key], analyses[key], final_article,
+                                                     parse_verdict(verdicts[key]),
+                                                     self.model_router.served_models(by_key[key]['id'])))
+            for key, final_article in final_articles.items()
+        ]
+        if completed:
+            self.storage.update_articles_as_processed(completed)
+            self.refresh_feed_snapshot([article_id for article_id, _ in completed])
+        
+        unfinished = len(articles) - len(non_relevant) - len(completed)
+        elapsed = time.time() - start_time
+        self.token_budget.save()
+        self.telemetry.flush()
         
         print("\n" + "=" * 60)
-        print(f"🎉 Processing complete!")
-        print(f"   [OK] Successfully processed: {processed_count}")
-        print(f"   [SEARCH] Relevant articles: {relevant_count}")
-        print(f"   [BLOCKED] Non-relevant articles: {non_relevant_count}")
-        print(f"   [ERROR] Errors: {error_count}")
+        print(f"🎉 Batch processing complete!")
+        print(f"   [SEARCH] Relevant articles: {len(completed)}")
+        print(f"   [BLOCKED] Non-relevant articles: {len(non_relevant)}")
+        print(f"   [ERROR] Left unprocessed (failed in a batch): {unfinished}")
         print(f"   [STATS] Total articles: {len(articles)}")
+        print(f"   [TIME] {elapsed:.0f}s - {self.token_usage['output_tokens']} output tokens at batch pricing")
+        print(f"   [CACHE] {self.response_cache.summary()}")
+        print(f"   [PROMPT CACHE] {self.prompt_cache_summary()}")
+        if self.prefilter:
+            print(f"   [PREFILTER] {self.prefilter.summary()}")
+        print(f"   [CLUSTERS] {self.story_clusters.summary()}")
+        print(f"   [TOPIC CACHE] {self.research_cache.summary()}")
+        print(f"   [TOKENS] {self.token_budget.summary()}")
+        print(f"   [MODELS] {self.model_router.summary()}")
+        print(f"   [BUDGET] {self.budget_governor.summary()}")
+        
+        return len(completed) + len(non_relevant)
+
+    def process_pending_batches(self, batch_size: int):
+        """Drain the unprocessed backlog in batches of batch_size
+        
+        Stops after a batch that did not finish every article: when the API is down or
+        the key is bad, the failing articles wait for the next notification or poll
+        instead of being sent again at once.
+        """
+        while self.process_articles(limit=batch_size) >= batch_size:
+            print(f"[PROGRESS] Batch of {batch_size} done, more articles waiting...")
+
+    def wait_for_notifications(self, conn, timeout: float, debounce_seconds: float,
+                               max_wait_seconds: float) -> int:
+        """Block until new-article notifications arrive or timeout passes
+        
+        After the first notification keep collecting until the channel has been quiet
+        for debounce_seconds (but no longer than max_wait_seconds), so a scraper burst
+        becomes one batch. Returns the number of notifications received (0 on timeout).
+        """
+        received = 0
+        first_at = None
+        deadline = time.time() + timeout
+        
+        conn.poll()
+        if conn.notifies:
+            received += len(conn.notifies)
+            conn.notifies.clear()
+            first_at = time.time()
+        
+        while True:
+            now = time.time()
+            if first_at is None:
+                wait = deadline - now
+            else:
+                wait = min(debounce_seconds, first_at + max_wait_seconds - now)
+            if wait <= 0:
+                break
+            
+            ready, _, _ = select.select([conn], [], [], wait)
+            if not ready:
+                break  # Quiet period over, or poll timeout with nothing received
+            
+            conn.poll()
+            if conn.notifies:
+                received += len(conn.notifies)
+                conn.notifies.clear()
+                if first_at is None:
+                    first_at = time.time()
+        
+        return received
+
+    def listen_for_articles(self, batch_size: int = 20, debounce_seconds: float = 5,
+                            max_wait_seconds: float = 30, poll_interval: float = 60):
+        """Run as a listener - wake up on scraper NOTIFY, fall back to polling"""
+        print(f"[SIGNAL] Listening on '{NEW_ARTICLE_CHANNEL}' "
+              f"(batch {batch_size}, debounce {debounce_seconds}s, poll every {poll_interval}s)")
+        
+        conn = None
+        connected = False
+        while True:
+            try:
+                if not connected:
+                    conn = self.storage.open_listener()
+                    connected = True
+                    if conn is None:
+                        print(f"[WARNING] {self.storage.describe()} has no NOTIFY support - polling only")
+                    else:
+                        print("[OK] Listener connected")
+                    
+                    # Pick up anything saved while nobody was listening
+                    self.process_pending_batches(batch_size)
+                
+                if conn is None:
+                    time.sleep(poll_interval)
+                    received = 0
+                else:
+                    received = self.wait_for_notifications(conn, poll_interval, debounce_seconds, max_wait_seconds)
+                
+                if received:
+                    print(f"\n[SIGNAL] Woken by {received} new article notification(s)")
+                else:
+                    print(f"\n[TIME] No notifications for {poll_interval}s - polling for missed articles")
+                
+                self.process_pending_batches(batch_size)
+                
+            except KeyboardInterrupt:
+                raise
+            except Exception as e:
+                print(f"[ERROR] Listener connection error: {e}")
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                conn = None
+                connected = False
+                self.storage.close()
+                print("[WAIT] Reconnecting in 5 seconds...")
+                time.sleep(5)
+
+    async def wait_for_notifications_async(self, conn, timeout: float) -> int:
+        """Wait on the event loop for scraper notifications; returns how many arrived (0 on timeout)"""
+        if conn is None:
+            await asyncio.sleep(timeout)
+            return 0
+        
+        conn.poll()
+        if not conn.notifies:
+            loop = asyncio.get_running_loop()
+            ready = asyncio.Event()
+            loop.add_reader(conn, ready.set)
+            try:
+                await asyncio.wait_for(ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                loop.remove_reader(conn)
+            conn.poll()
+        
+        received = len(conn.notifies)
+        conn.notifies.clear()
+        return received
+
+    async def listen_pipelined(self, batch_size: int = 20, poll_interval: float = 60):
+        """Listen mode on the staged pipeline
+        
+        New articles enter the relevance queue as soon as they are announced, whatever
+        research and analysis are busy with; a full relevance queue holds the feeder back.
+        Articles whose stage failed are only picked up again at the next quiet poll.
+        """
+        counts = {'processed': 0, 'relevant': 0, 'non_relevant': 0, 'errors': 0}
+        feed_ids = []
+        in_flight = set()
+        retry_later = set()
+        reported = 0
+        
+        def on_done(item: Dict, error: Optional[Exception]):
+            article_id = item['article']['id']
+            in_flight.discard(article_id)
+            if error is not None or item.get('deferred'):
+                retry_later.add(article_id)
+            self.finish_pipeline_item(item, error, counts, feed_ids)
+        
+        pipeline = self.build_pipeline(on_done)
+        await pipeline.start()
+        print(f"[SIGNAL] Listening on '{NEW_ARTICLE_CHANNEL}' with the staged pipeline "
+              f"(fetch {batch_size}, poll every {poll_interval}s)")
+        
+        conn = None
+        connected = False
+        try:
+            while True:
+                try:
+                    if not connected:
+                        conn = self.storage.open_listener()
+                        connected = True
+                        if conn is None:
+                            print(f"[WARNING] {self.storage.describe()} has no NOTIFY support - polling only")
+                        else:
+                            print("[OK] Listener connected")
+                    
+                    skip = in_flight | retry_later
+                    articles = self.storage.get_unprocessed_articles(
+                        None if self.budget_governor.enabled else batch_size + len(skip))
+                    fresh = self.budget_governor.admit([article for article in articles if article['id'] not in skip],
+                                                       batch_size)
+                    for article in fresh:
+                        in_flight.add(article['id'])
+                        await pipeline.submit({'article': article})
+                    if len(fresh) >= batch_size:
+                        continue  # More waiting - keep feeding (the queue bound paces us)
+                    
+                    self.refresh_feed_snapshot(feed_ids)
+                    feed_ids.clear()
+                    
+                    received = await self.wait_for_notifications_async(conn, poll_interval)
+                    if received:
+                        print(f"\n[SIGNAL] Woken by {received} new article notification(s) "
+                              f"({len(in_flight)} articles in the pipeline)")
+                    else:
+                        retry_later.clear()
+                        finished = counts['processed'] + counts['errors']
+                        if finished != reported:
+                            reported = finished
+                            self.token_budget.save()
+                            self.telemetry.flush()
+                            print(f"\n[STATS] {counts['processed']} processed, {counts['errors']} errors, "
+                                  f"{len(in_flight)} in the pipeline")
+                            for line in pipeline.summary_lines():
+                                print(f"   [PIPELINE] {line}")
+                            for line in self.stream_guard.summary_lines():
+                                print(f"   [STREAM] {line}")
+                            print(f"   [RATE] {self.rate_governor.summary()}")
+                            print(f"   [CLUSTERS] {self.story_clusters.summary()}")
+                            print(f"   [TOPIC CACHE] {self.research_cache.summary()}")
+                            print(f"   [TOKENS] {self.token_budget.summary()}")
+                            print(f"   [SPECULATE] {self.speculator.summary()}")
+                            print(f"   [MODELS] {self.model_router.summary()}")
+                            print(f"   [BUDGET] {self.budget_governor.summary()}")
+                
+                except Exception as e:
+                    print(f"[ERROR] Listener connection error: {e}")
+                    if conn is not None:
+                        try:
+                            conn.close()
+                        except Exception:
+                            pass
+                    conn = None
+                    connected = False
+                    print("[WAIT] Reconnecting in 5 seconds...")
+                    await asyncio.sleep(5)
+        finally:
+            await pipeline.stop()
 
     def show_processing_stats(self):
         """Show statistics about processed vs unprocessed articles"""
         try:
-            conn = psycopg2.connect(self.db_url)
-            cursor = conn.cursor()
-            
-            # Get counts for all statuses
-            cursor.execute("SELECT COUNT(*) FROM news_items WHERE isProcessed = 0")
-            unprocessed_count = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM news_items WHERE isProcessed = 1")
-            processed_relevant_count = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM news_items WHERE isProcessed = 2")
-            processed_non_relevant_count = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM news_items")
-            total_count = cursor.fetchone()[0]
-            
-            conn.close()
+            stats = self.storage.get_processing_stats()
+            total_count = stats['total']
+            processed_relevant_count = stats['processed_relevant']
+            processed_non_relevant_count = stats['processed_non_relevant']
             
             print(f"\n[STATS] Processing Statistics:")
+            print(f"   Database: {self.storage.describe()}")
             print(f"   Total articles: {total_count}")
             print(f"   [SEARCH] Relevant & processed: {processed_relevant_count}")
             print(f"   [BLOCKED] Non-relevant & marked: {processed_non_relevant_count}")
-            print(f"   [WAIT] Unprocessed: {unprocessed_count}")
+            print(f"   [WAIT] Unprocessed: {stats['unprocessed']}")
+            if stats['failed']:
+                print(f"   [ERROR] Failed (stage out of attempts): {stats['failed']} - "
+                      f"retry with: python reset_database.py --status 3")
             
             total_processed = processed_relevant_count + processed_non_relevant_count
             if total_count > 0:
                 progress = (total_processed/total_count*100)
                 print(f"   [PROGRESS] Progress: {progress:.1f}% ({total_processed}/{total_count})")
             
+            # Unfinished articles with saved stages resume there on the next run
+            for row in self.storage.stage_checkpoint_report():
+                print(f"   [RESUME] {row['stage']}: {row['completed']} saved outputs, "
+                      f"{row['failed']} failed attempts waiting for a retry, "
+                      f"{row['partial']} partial outputs")
+            
         except Exception as e:
             print(f"[ERROR] Error getting processing stats: {e}")
 
 def main():
     """Main function - runs silently and processes all articles automatically"""
+    parser = argparse.ArgumentParser(description="Article Processor for News Balance Analyzer")
+    parser.add_argument('--listen', action='store_true',
+                        help="stay running and process new articles as soon as the scraper saves them")
+    parser.add_argument('--batch-size', type=int, default=20,
+                        help="articles per batch in listen mode (default: 20)")
+    parser.add_argument('--debounce', type=float, default=5,
+                        help="seconds of quiet to wait for more notifications before processing (default: 5)")
+    parser.add_argument('--poll-interval', type=float, default=60,
+                        help="seconds without notifications before polling anyway (default: 60)")
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help="articles processed concurrently with the async client "
+                             "(default: PROCESSOR_CONCURRENCY or 1 = sequential)")
+    parser.add_argument('--pipeline', action='store_true', default=None,
+                        help="staged pipeline: a bounded queue and worker pool per stage "
+                             "(default: PROCESSOR_PIPELINE=1)")
+    parser.add_argument('--stage-workers', default=None,
+                        help="pipeline workers per stage, e.g. relevance=8,research=4,analysis=4,journalistic=4")
+    parser.add_argument('--batch-api', action='store_true',
+                        help="process the whole backlog through the Message Batches API (cheaper, slower)")
+    parser.add_argument('--batch-poll-interval', type=float, default=30,
+                        help="seconds between Message Batch status checks (default: 30)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="ignore the LLM response cache and ask Anthropic again for every stage")
+    parser.add_argument('--check-prompt-cache', action='store_true',
+                        help="verify that stage prompts hit the provider prompt cache, then exit")
+    parser.add_argument('--rebuild-feed', action='store_true',
+                        help="rebuild the precomputed web feed table from news_items and exit")
+    args = parser.parse_args()
+    
+    if args.rebuild_feed:
+        storage = get_storage()
+        storage.init_schema()
+        print(f"[START] Rebuilding feed snapshot in {storage.describe()}...")
+        print(f"[OK] Feed snapshot rebuilt with {storage.rebuild_feed()} articles")
+        storage.close()
+        return
+    
     print("Article Processor for News Balance Analyzer (4-Stage Pipeline)")
-    print("Running in SILENT MODE - Processing ALL articles automatically")
+    if args.batch_api:
+        print("Running in BATCH MODE - Processing the backlog through the Message Batches API")
+    elif args.listen:
+        print("Running in LISTEN MODE - Processing articles as soon as they are scraped")
+    else:
+        print("Running in SILENT MODE - Processing ALL articles automatically")
     print("=" * 70)
     
     # Initialize processor
-    processor = ArticleProcessor()
+    processor = ArticleProcessor(concurrency=args.concurrency, pipeline=args.pipeline,
+                                 stage_workers=parse_worker_spec(args.stage_workers))
+    if args.no_cache:
+        processor.response_cache.enabled = False
     
     if not processor.anthropic_client:
         print("[ERROR] Cannot proceed without Anthropic client")
         return
     
+    if args.check_prompt_cache:
+        processor.check_prompt_cache()
+        return
+    
     # Test internet access first
     if not processor.test_internet_access():
         print("[WARNING] Warning: Limited internet access detected")
@@ -499,6 +1841,38 @@ def main():
     # Show current stats before processing
     processor.show_processing_stats()
     
+    if args.batch_api:
+        try:
+            processor.process_articles_batch(poll_interval=args.batch_poll_interval)
+        except KeyboardInterrupt:
+            print("\n\n[STOP] Stopped waiting - submitted batches keep running, their articles stay unprocessed")
+            return
+        except Exception as e:
+            print(f"[ERROR] Error during batch processing: {e}")
+            return
+        processor.show_processing_stats()
+        return
+    
+    if args.listen and processor.pipeline_mode:
+        try:
+            asyncio.run(processor.with_async_client(
+                processor.listen_pipelined(batch_size=args.batch_size, poll_interval=args.poll_interval)
+            ))
+        except KeyboardInterrupt:
+            print("\n\n[STOP] Listener stopped by user")
+        return
+    
+    if args.listen:
+        try:
+            processor.listen_for_articles(
+                batch_size=args.batch_size,
+                debounce_seconds=args.debounce,
+                poll_interval=args.poll_interval
+            )
+        except KeyboardInterrupt:
+            print("\n\n[STOP] Listener stopped by user")
+        return
+    
     # Start automatic processing of ALL remaining articles
     print("\n[START] Starting automatic processing of ALL remaining articles...")
     print("[WAIT] This will run silently without user interaction")
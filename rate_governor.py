@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+"""
+Rate Limit Governor for Anthropic calls
+Paces requests so the processor stays just under the account's rate limits
+instead of sleeping a fixed amount between stages and articles.
+
+Tracks requests, input tokens and output tokens per minute in a sliding window,
+learns the real limits from the anthropic-ratelimit-* response headers, and
+retries 429 (rate limited) and 529 (overloaded) answers after the delay the
+server suggests in retry-after. A call given a fallback model switches to it
+on the first 529 instead of waiting for the overloaded model.
+"""
+
+import os
+import time
+import random
+import inspect
+import asyncio
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+import anthropic
+from token_budget import raw_token_count, request_text
+
+WINDOW_SECONDS = 60
+PENDING_RECHECK_SECONDS = 0.5
+DIMENSIONS = ['requests', 'input_tokens', 'output_tokens']
+
+# Header prefix per dimension, e.g. anthropic-ratelimit-input-tokens-remaining
+HEADER_NAMES = {
+    'requests': 'anthropic-ratelimit-requests',
+    'input_tokens': 'anthropic-ratelimit-input-tokens',
+    'output_tokens': 'anthropic-ratelimit-output-tokens',
+}
+
+# Status codes worth waiting for: rate limited, overloaded, and transient server errors
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504, 529}
+
+def estimate_input_tokens(params: Dict) -> int:
+    """Input size of a messages.create call from the per-script local estimate"""
+    return int(raw_token_count(request_text(params))) + 10
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """RFC 3339 reset header -> unix time"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).astimezone(timezone.utc).timestamp()
+    except ValueError:
+        return None
+
+class RateLimitGovernor:
+    """Shared pacing state for every Anthropic call of one processor"""
+
+    def __init__(self, target_utilization: float = 0.9, max_retries: int = 5,
+                 limits: Optional[Dict[str, int]] = None):
+        self.target_utilization = target_utilization
+        self.max_retries = max_retries
+        # Limits per minute; None until configured or learned from headers
+        self.limits = {dimension: None for dimension in DIMENSIONS}
+        self.limits.update({key: value for key, value in (limits or {}).items() if value})
+        # Last header snapshot: dimension -> (remaining, reset unix time)
+        self.remaining = {}
+        # Reserved by calls that are in flight and not yet reflected in the headers
+        self.pending = {dimension: 0 for dimension in DIMENSIONS}
+        self.events: List[Tuple[float, int, int, int]] = []
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+        self.stats = {'calls': 0, 'rate_limited': 0, 'overloaded': 0, 'server_errors': 0,
+                      'retries': 0, 'throttled_seconds': 0.0, 'oversized': 0}
+
+    @classmethod
+    def from_env(cls) -> 'RateLimitGovernor':
+        """Governor configured from RATE_LIMIT_* environment variables"""
+        def env_int(name):
+            value = os.getenv(name)
+            return int(value) if value else None
+        return cls(
+            target_utilization=float(os.getenv('RATE_LIMIT_TARGET', '0.9')),
+            max_retries=int(os.getenv('RATE_LIMIT_MAX_RETRIES', '5')),
+            limits={
+                'requests': env_int('RATE_LIMIT_RPM'),
+                'input_tokens': env_int('RATE_LIMIT_INPUT_TPM'),
+                'output_tokens': env_int('RATE_LIMIT_OUTPUT_TPM'),
+            }
+        )
+
+    def window_usage(self, now: float) -> Dict[str, int]:
+        """Requests and tokens used in the last minute"""
+        self.events = [event for event in self.events if event[0] > now - WINDOW_SECONDS]
+        usage = {dimension: 0 for dimension in DIMENSIONS}
+        for _, requests, input_tokens, output_tokens in self.events:
+            usage['requests'] += requests
+            usage['input_tokens'] += input_tokens
+            usage['output_tokens'] += output_tokens
+        return usage
+
+    def wait_needed(self, need: Dict[str, int], now: float) -> float:
+        """Seconds to wait before a call needing `need` fits under every limit"""
+        wait = max(0.0, self.blocked_until - now)
+        usage = self.window_usage(now)
+
+        for dimension in DIMENSIONS:
+            limit = self.limits[dimension]
+            if not limit:
+                continue
+            budget = limit * self.target_utilization
+            # A call bigger than the whole budget could never fit: it goes once the window is empty
+            required = min(need.get(dimension, 0), budget)
+
+            # What the server last told us is left, minus calls started since then
+            if dimension in self.remaining:
+                remaining, reset_at = self.remaining[dimension]
+                headroom = remaining - self.pending[dimension] - limit * (1 - self.target_utilization)
+                if headroom < required and reset_at and reset_at > now:
+                    wait = max(wait, reset_at - now)
+
+            # Our own sliding window, in case headers are missing or stale
+            used = usage[dimension] + self.pending[dimension]
+            if used + required > budget:
+                freed = 0
+                for event in self.events:
+                    freed += event[DIMENSIONS.index(dimension) + 1]
+                    if used - freed + required <= budget:
+                        wait = max(wait, event[0] + WINDOW_SECONDS - now)
+                        break
+                else:
+                    # Blocked by calls still in flight - look again once some finish
+                    wait = max(wait, PENDING_RECHECK_SECONDS)
+
+        return wait
+
+    def reserve(self, params: Dict) -> Tuple[float, Dict[str, int]]:
+        """Reserve capacity for one call; returns (seconds to wait first, reservation)"""
+        need = {'requests': 1, 'input_tokens': estimate_input_tokens(params)}
+        with self.lock:
+            wait = self.wait_needed(need, time.time())
+            if wait <= 0:
+                for dimension, amount in need.items():
+                    self.pending[dimension] += amount
+                    limit = self.limits[dimension]
+                    if limit and amount > limit * self.target_utilization:
+                        self.stats['oversized'] += 1
+                        print(f"[RATE] One request needs ~{amount} {dimension.replace('_', ' ')}, more than the "
+                              f"{limit * self.target_utilization:.0f} per minute budget - sent alone in the window")
+            return wait, need
+
+    def release(self, need: Dict[str, int]):
+        """Drop a reservation once its call finished (or failed)"""
+        with self.lock:
+            for dimension, amount in need.items():
+                self.pending[dimension] = max(0, self.pending[dimension] - amount)
+
+    def update_from_headers(self, headers):
+        """Learn limits and remaining capacity from anthropic-ratelimit-* headers"""
+        for dimension, prefix in HEADER_NAMES.items():
+            try:
+                limit = headers.get(f'{prefix}-limit')
+                remaining = headers.get(f'{prefix}-remaining')
+                if limit:
+                    self.limits[dimension] = int(limit)
+                if remaining is None:
+                    continue
+                snapshot = (int(remaining), parse_reset(headers.get(f'{prefix}-reset')))
+                # Concurrent responses arrive out of order - never let an older, fuller one win
+                previous = self.remaining.get(dimension)
+                if previous is None or snapshot[0] <= previous[0] or (snapshot[1] or 0) > (previous[1] or 0) + 1:
+                    self.remaining[dimension] = snapshot
+            except (TypeError, ValueError):
+                continue
+
+    def record(self, headers, usage):
+        """Account one finished call"""
+        with self.lock:
+            input_tokens = getattr(usage, 'input_tokens', 0) or 0
+            input_tokens += getattr(usage, 'cache_creation_input_tokens', 0) or 0
+            input_tokens += getattr(usage, 'cache_read_input_tokens', 0) or 0
+            self.events.append((time.time(), 1, input_tokens, getattr(usage, 'output_tokens', 0) or 0))
+            self.stats['calls'] += 1
+            if headers is not None:
+                self.update_from_headers(headers)
+
+    def backoff_delay(self, error: anthropic.APIStatusError, attempt: int) -> float:
+        """How long to wait after a 429/529 - retry-after when the server sends one"""
+        status = error.status_code
+        headers = error.response.headers if error.response is not None else {}
+        with self.lock:
+            if status == 429:
+                self.stats['rate_limited'] += 1
+            elif status == 529:
+                self.stats['overloaded'] += 1
+            else:
+                self.stats['server_errors'] += 1
+            self.stats['retries'] += 1
+            if headers is not None:
+                self.update_from_headers(headers)
+
+        try:
+            delay = float(headers.get('retry-after'))
+        except (TypeError, ValueError):
+            delay = min(60.0, 2 ** attempt) + random.uniform(0, 1)
+
+        # A rate limit applies to everyone sharing the account - hold all calls back
+        if status == 429:
+            with self.lock:
+                self.blocked_until = max(self.blocked_until, time.time() + delay)
+        return delay
+
+    def fall_back(self, error: Exception, params: Dict, fallback_model: Optional[str], stage: str) -> Optional[Dict]:
+        """The request on the fallback model after a 529, or None to keep the model"""
+        if not fallback_model or params.get('model') == fallback_model:
+            return None
+        if not (isinstance(error, anthropic.APIStatusError) and error.status_code == 529):
+            return None
+        with self.lock:
+            self.stats['overloaded'] += 1
+        print(f"[WARNING] {stage}: {params.get('model')} overloaded - switching to {fallback_model}")
+        return dict(params, model=fallback_model)
+
+    def should_retry(self, error: Exception, attempt: int) -> bool:
+        """Retry rate limits, overloads and connection problems a few times"""
+        if attempt >= self.max_retries:
+            return False
+        if isinstance(error, anthropic.APIStatusError):
+            return error.status_code in RETRY_STATUS_CODES
+        return isinstance(error, anthropic.APIConnectionError)
+
+    def throttle_message(self, wait: float, stage: str) -> Optional[str]:
+        """Log line for a noticeable pacing pause"""
+        with self.lock:
+            self.stats['throttled_seconds'] += wait
+        if wait >= 1:
+            return f"[WAIT] Rate limit pacing for {stage}: {wait:.1f}s (utilization {self.utilization() * 100:.0f}%)"
+        return None
+
+    def call(self, send, params: Dict, stage: str = 'call', fallback_model: Optional[str] = None):
+        """Run send(params) -> raw response under the governor; returns the parsed message
+        
+        With a fallback_model an overloaded (529) model is replaced by it for the remaining attempts.
+        """
+        attempt = 0
+        while True:
+            wait, need = self.reserve(params)
+            if wait > 0:
+                message = self.throttle_message(wait, stage)
+                if message:
+                    print(message)
+                time.sleep(wait)
+                continue
+
+            try:
+                raw = send(params)
+                message = raw.parse()
+                self.record(raw.headers, message.usage)
+                return message
+            except Exception as e:
+                fallback = self.fall_back(e, params, fallback_model, stage)
+                if fallback is not None:
+                    params = fallback
+                    continue
+                if not self.should_retry(e, attempt):
+                    raise
+                delay = self.backoff_delay(e, attempt) if isinstance(e, anthropic.APIStatusError) \
+                    else min(60.0, 2 ** attempt)
+                print(f"[WARNING] {stage}: {e.__class__.__name__} - retrying in {delay:.1f}s "
+                      f"(attempt {attempt + 1}/{self.max_retries})")
+                attempt += 1
+                time.sleep(delay)
+            finally:
+                self.release(need)
+
+    async def call_async(self, send, params: Dict, stage: str = 'call', fallback_model: Optional[str] = None):
+        """Async version of call(); send(params) must return an awaitable raw response"""
+        attempt = 0
+        while True:
+            wait, need = self.reserve(params)
+            if wait > 0:
+                message = self.throttle_message(wait, stage)
+                if message:
+                    print(message)
+                await asyncio.sleep(wait)
+                continue
+
+            try:
+                raw = await send(params)
+                message = raw.parse()
+                if inspect.isawaitable(message):
+                    message = await message
+                self.record(raw.headers, message.usage)
+                return message
+            except Exception as e:
+                fallback = self.fall_back(e, params, fallback_model, stage)
+                if fallback is not None:
+                    params = fallback
+                    continue
+                if not self.should_retry(e, attempt):
+                    raise
+                delay = self.backoff_delay(e, attempt) if isinstance(e, anthropic.APIStatusError) \
+                    else min(60.0, 2 ** attempt)
+                print(f"[WARNING] {stage}: {e.__class__.__name__} - retrying in {delay:.1f}s "
+                      f"(attempt {attempt + 1}/{self.max_retries})")
+                attempt += 1
+                await asyncio.sleep(delay)
+            finally:
+                self.release(need)
+
+    def utilization(self) -> float:
+        """Highest share of any known per-minute limit used in the last minute"""
+        with self.lock:
+            usage = self.window_usage(time.time())
+        shares = [usage[dimension] / self.limits[dimension]
+                  for dimension in DIMENSIONS if self.limits[dimension]]
+        return max(shares) if shares else 0.0
+
+    def metrics(self) -> Dict:
+        """Current pacing metrics: per-minute usage, limits, utilization and retry counts"""
+        with self.lock:
+            usage = self.window_usage(time.time())
+            metrics = {f'{dimension}_per_minute': usage[dimension] for dimension in DIMENSIONS}
+            metrics.update({f'{dimension}_limit': self.limits[dimension] for dimension in DIMENSIONS})
+            metrics.update(self.stats)
+        metrics['utilization'] = self.utilization()
+        return metrics
+
+    def summary(self) -> str:
+        """One-line metrics summary for the processing report"""
+        m = self.metrics()
+        return (f"utilization {m['utilization'] * 100:.0f}% - "
+                f"{m['requests_per_minute']} req/min, {m['input_tokens_per_minute']} in-tok/min, "
+                f"{m['output_tokens_per_minute']} out-tok/min - "
+                f"{m['rate_limited']}x 429, {m['overloaded']}x 529, "
+                f"{m['throttled_seconds']:.1f}s paced")
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+"""
+Batched Relevance Screening for the Article Processor
+Stage 1 used to send one article per request: every call repeated the whole
+static instruction and paid its own round trip for a few dozen output tokens.
+With RELEVANCE_BATCH_SIZE above 1 the pending articles are screened K at a
+time - titles and lead paragraphs in one prompt, and a JSON array with one
+verdict per article id back (a structured verdict, see relevance_verdict.py,
+recorded through a forced tool call unless STRUCTURED_RELEVANCE=0).
+
+Every id must come back with a valid verdict. Articles missing from the
+answer, or a whole group whose answer does not parse, fall back to the
+single-article relevance call. Verdicts are saved as the articles' relevance
+checkpoints, so the later stages pick them up unchanged.
+
+Configuration:
+    RELEVANCE_BATCH_SIZE=8    # articles per relevance call (1 = one call per article)
+"""
+
+import os
+import re
+import json
+from typing import Dict, List
+from common import load_env
+from relevance_verdict import validate_verdict, encode_verdict
+
+# Same environment handling as the scraper and processor
+load_env()
+
+# Output tokens allowed per article of a group
+TOKENS_PER_VERDICT = 80
+
+JSON_ARRAY = re.compile(r'\[.*\]', re.DOTALL)
+
+def parse_verdicts(text: str, ids: List[int], structured: bool = True) -> Dict[int, str]:
+    """{article id: relevance stage output} for the ids of the group that came back with a valid verdict
+    
+    Structured verdicts are stored encoded; free-text verdicts come as {"id", "answer"}.
+    """
+    match = JSON_ARRAY.search(text or '')
+    if not match:
+        return {}
+    try:
+        items = json.loads(match.group(0))
+    except ValueError:
+        return {}
+
+    wanted = set(ids)
+    verdicts = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        try:
+            article_id = int(item.get('id'))
+        except (TypeError, ValueError):
+            continue
+        if article_id not in wanted or article_id in verdicts:
+            continue
+        if structured:
+            verdict = validate_verdict(item)
+            if verdict is not None:
+                verdicts[article_id] = encode_verdict(verdict)
+        elif isinstance(item.get('answer'), str) and item['answer'].strip():
+            verdicts[article_id] = item['answer'].strip()
+    return verdicts
+
+class RelevanceBatcher:
+    """Group size for batched relevance calls and their per-run statistics"""
+
+    def __init__(self, size: int = 1):
+        self.size = max(1, size)
+        self.enabled = self.size > 1
+        self.reset_stats()
+
+    @classmethod
+    def from_env(cls) -> 'RelevanceBatcher':
+        """Batcher configured from RELEVANCE_BATCH_SIZE"""
+        return cls(size=int(os.getenv('RELEVANCE_BATCH_SIZE', '1')))
+
+    def reset_stats(self):
+        """Start counting a new run"""
+        self.stats = {'calls': 0, 'articles': 0, 'answered': 0, 'tokens': 0, 'seconds': 0.0}
+
+    def groups(self, articles: List[Dict]) -> List[List[Dict]]:
+        """Articles split into groups of at most size"""
+        return [articles[i:i + self.size] for i in range(0, len(articles), self.size)]
+
+    def record(self, articles: int, answered: int, tokens: int, seconds: float):
+        """Account one batched call"""
+        self.stats['calls'] += 1
+        self.stats['articles'] += articles
+        self.stats['answered'] += answered
+        self.stats['tokens'] += tokens
+        self.stats['seconds'] += seconds
+
+    def summary(self) -> str:
+        """One-line statistics for the processing report"""
+        if not self.enabled:
+            return "disabled"
+        per_article = self.stats['tokens'] / self.stats['answered'] if self.stats['answered'] else 0.0
+        per_minute = self.stats['calls'] / self.stats['seconds'] * 60 if self.stats['seconds'] else 0.0
+        return (f"{self.stats['answered']} of {self.stats['articles']} articles screened in "
+                f"{self.stats['calls']} calls (K={self.size}) - "
+                f"{self.stats['articles'] - self.stats['answered']} fell back to single calls - "
+                f"{per_article:.0f} tokens per article - {per_minute:.1f} calls/min")
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+"""
+Structured Relevance Verdicts for the Article Processor
+Stage 1 used to answer in free text, and relevance was decided by searching
+that text for words like "עסקים" or "כלכלי" - a political article whose
+explanation mentioned the economy was dropped. The model now records its
+verdict through a forced tool call, so the answer is a JSON object checked
+against a schema:
+
+    relevant          true / false
+    category          short category of the article ("פוליטיקה", "ספורט", ...)
+    controversy_type  one of CONTROVERSY_TYPES ("none" for non-relevant articles)
+    confidence        0-1
+
+The verdict is stored as the relevance stage output and its fields go into
+process_data and the news_items columns. An answer that does not match the
+schema is not cached and fails the stage, which is retried; free-text answers
+(older checkpoints, STRUCTURED_RELEVANCE=0) are still read with the keywords.
+
+Configuration:
+    STRUCTURED_RELEVANCE=0    # free-text relevance answers and keyword parsing
+"""
+
+import json
+from typing import Dict, Optional
+
+CONTROVERSY_TYPES = ['political', 'social', 'security', 'legal', 'religious', 'economic', 'other', 'none']
+
+VERDICT_PROPERTIES = {
+    'relevant': {'type': 'boolean', 'description': "נושא פוליטי או חברתי שנוי במחלוקת בישראל"},
+    'category': {'type': 'string', 'description': "קטגוריית הכתבה, מילה או שתיים"},
+    'controversy_type': {'type': 'string', 'enum': CONTROVERSY_TYPES,
+                         'description': "סוג המחלוקת; none לכתבה שאינה רלוונטית"},
+    'confidence': {'type': 'number', 'minimum': 0, 'maximum': 1, 'description': "ביטחון בהחלטה, 0 עד 1"},
+}
+VERDICT_FIELDS = list(VERDICT_PROPERTIES)
+
+# Forced tool call of a single-article relevance request
+RELEVANCE_TOOL = {
+    'name': 'record_relevance',
+    'description': "רישום החלטת הרלוונטיות של הכתבה",
+    'input_schema': {'type': 'object', 'properties': VERDICT_PROPERTIES, 'required': VERDICT_FIELDS},
+}
+
+# Forced tool call of a batched relevance request: one verdict per article id
+RELEVANCE_BATCH_TOOL = {
+    'name': 'record_relevance_verdicts',
+    'description': "רישום החלטת הרלוונטיות של כל כתבה לפי המזהה שלה",
+    'input_schema': {
+        'type': 'object',
+        'properties': {
+            'verdicts': {
+                'type': 'array',
+                'items': {
+                    'type': 'object',
+                    'properties': dict({'id': {'type': 'integer'}}, **VERDICT_PROPERTIES),
+                    'required': ['id'] + VERDICT_FIELDS,
+                },
+            },
+        },
+        'required': ['verdicts'],
+    },
+}
+
+def tool_params(tool: Dict) -> Dict:
+    """Request parameters forcing the model to answer through one tool"""
+    return {'tools': [tool], 'tool_choice': {'type': 'tool', 'name': tool['name']}}
+
+def validate_verdict(data) -> Optional[Dict]:
+    """The verdict fields of data, normalized, or None if they do not match the schema"""
+    if not isinstance(data, dict) or not isinstance(data.get('relevant'), bool):
+        return None
+    category = data.get('category')
+    controversy_type = data.get('controversy_type')
+    confidence = data.get('confidence')
+    if not isinstance(category, str) or not category.strip() or controversy_type not in CONTROVERSY_TYPES:
+        return None
+    if isinstance(confidence, bool) or not isinstance(confidence, (int, float)):
+        return None
+    return {
+        'relevant': data['relevant'],
+        'category': category.strip()[:60],
+        'controversy_type': controversy_type,
+        'confidence': round(min(1.0, max(0.0, float(confidence))), 3),
+    }
+
+def parse_verdict(text: str) -> Optional[Dict]:
+    """Validated verdict of a stored relevance answer, or None for free text"""
+    try:
+        return validate_verdict(json.loads(text))
+    except (TypeError, ValueError):
+        return None
+
+def encode_verdict(verdict: Dict) -> str:
+    """Verdict as the stored relevance stage output"""
+    return json.dumps(verdict, ensure_ascii=False)
+
+def verdict_reason(verdict: Dict) -> str:
+    """Short readable form of a verdict, used as the relevance reason"""
+    if verdict['relevant']:
+        return f"{verdict['category']} - {verdict['controversy_type']} controversy (confidence {verdict['confidence']:.2f})"
+    return f"{verdict['category']} - not controversial (confidence {verdict['confidence']:.2f})"
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+"""
+Topic Research Cache for News Balance Analyzer
+The same topics come back many times a day - a minister, an ongoing military
+operation, a court ruling - and each thread used to pay for its own Stage 2
+research even when it was not part of the same story cluster. Research
+findings are cached under a normalized topic signature of the article title
+(Hebrew prefixes stripped, function words dropped, word order ignored), so
+"הממשלה אישרה את התקציב" and "התקציב: הממשלה אישרה" share one entry.
+
+News goes stale fast, so entries expire after RESEARCH_CACHE_TTL_HOURS; above
+RESEARCH_CACHE_MAX_ENTRIES the least recently used topics are evicted. Only
+research that passed the quality check is stored, so a hit goes straight to
+the technical analysis without the quality retry.
+
+Configuration:
+    RESEARCH_CACHE=0                   # disable the topic cache
+    RESEARCH_CACHE_TTL_HOURS=6         # entry lifetime
+    RESEARCH_CACHE_MAX_ENTRIES=2000    # topics kept before LRU eviction
+
+Commands:
+    python research_cache.py stats                  # entries and most reused topics
+    python research_cache.py key "כותרת"            # the signature a title maps to
+    python research_cache.py invalidate "כותרת"     # drop one topic (e.g. the story changed)
+    python research_cache.py clear                  # drop every topic
+    python research_cache.py evict                  # apply TTL and size limit now
+"""
+
+import os
+import argparse
+from typing import Optional
+from common import load_env
+from storage import get_storage
+from prefilter import tokenize
+from story_clusters import STOPWORDS, stem
+
+# Same environment handling as the scraper and processor
+load_env()
+
+# Run eviction after this many new entries
+EVICT_EVERY = 50
+
+def topic_key(topic: str) -> str:
+    """Normalized topic signature: sorted unique stems of the title's content words"""
+    terms = set()
+    for word in tokenize(topic):
+        if len(word) < 2 or word in STOPWORDS or not word.strip('0'):
+            continue
+        terms.add(stem(word))
+    return ' '.join(sorted(terms))
+
+class ResearchCache:
+    """Topic-level Stage 2 cache with per-run hit statistics"""
+
+    def __init__(self, storage, ttl_hours: int = 6, max_entries: int = 2000, enabled: bool = True):
+        self.storage = storage
+        self.ttl_hours = ttl_hours
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.new_entries = 0
+        self.reset_stats()
+
+    @classmethod
+    def from_env(cls, storage) -> 'ResearchCache':
+        """Cache configured from RESEARCH_CACHE* environment variables"""
+        return cls(
+            storage,
+            ttl_hours=int(os.getenv('RESEARCH_CACHE_TTL_HOURS', '6')),
+            max_entries=int(os.getenv('RESEARCH_CACHE_MAX_ENTRIES', '2000')),
+            enabled=os.getenv('RESEARCH_CACHE', '1') != '0'
+        )
+
+    def reset_stats(self):
+        """Start counting hits for a new run"""
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def get(self, topic: str) -> Optional[str]:
+        """Cached research for the topic, or None on a miss"""
+        key = topic_key(topic)
+        if not self.enabled or not key:
+            return None
+        try:
+            research = self.storage.get_topic_research(key, self.ttl_hours)
+        except Exception as e:
+            print(f"[WARNING] Research cache lookup failed: {e}")
+            return None
+
+        if research is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        print(f"[CACHE] Reusing research on '{topic[:40]}' (topic: {key[:50]})")
+        return research
+
+    def put(self, topic: str, research: str):
+        """Store research that passed the quality check"""
+        key = topic_key(topic)
+        if not self.enabled or not key:
+            return
+        try:
+            self.storage.put_topic_research(key, topic, research)
+            self.new_entries += 1
+            if self.new_entries % EVICT_EVERY == 0:
+                self.evict()
+        except Exception as e:
+            print(f"[WARNING] Research cache write failed: {e}")
+
+    def invalidate(self, topic: Optional[str] = None) -> int:
+        """Forget one topic, or every topic without an argument"""
+        return self.storage.invalidate_topic_research(topic_key(topic) if topic else None)
+
+    def evict(self) -> int:
+        """Apply TTL and size limit"""
+        deleted = self.storage.evict_topic_research(self.ttl_hours, self.max_entries)
+        if deleted:
+            print(f"[CACHE] Evicted {deleted} cached research topics")
+        return deleted
+
+    def summary(self) -> str:
+        """One-line statistics for the processing report"""
+        if not self.enabled:
+            return "disabled"
+        lookups = self.stats['hits'] + self.stats['misses']
+        rate = self.stats['hits'] / lookups * 100 if lookups else 0.0
+        return (f"hit rate {rate:.1f}% ({self.stats['hits']} hits / {self.stats['misses']} misses) - "
+                f"{self.stats['hits']} research calls saved")
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and maintain the topic research cache")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('stats', help="entries and most reused topics")
+    key_parser = subparsers.add_parser('key', help="the topic signature of a title")
+    key_parser.add_argument('topic')
+    invalidate_parser = subparsers.add_parser('invalidate', help="drop the research of one topic")
+    invalidate_parser.add_argument('topic')
+    subparsers.add_parser('clear', help="drop the research of every topic")
+    subparsers.add_parser('evict', help="apply TTL and size limit now")
+    args = parser.parse_args()
+
+    if args.command == 'key':
+        print(topic_key(args.topic) or "(empty - titles without content words are never cached)")
+        return
+
+    storage = get_storage()
+    storage.init_schema()
+    cache = ResearchCache.from_env(storage)
+
+    try:
+        if args.command == 'stats':
+            rows = storage.topic_research_report()
+            print(f"[STATS] Topic research cache (TTL {cache.ttl_hours}h, max {cache.max_entries} topics) - "
+                  f"{storage.describe()}")
+            for row in rows:
+                print(f"   {row['hits']:>5} hits  created {str(row['created_at'])[:16]}  {(row['topic'] or '')[:60]}")
+            if not rows:
+                print("   (empty)")
+        elif args.command == 'invalidate':
+            deleted = cache.invalidate(args.topic)
+            print(f"[OK] Deleted {deleted} cached research topics ({topic_key(args.topic)})")
+        elif args.command == 'clear':
+            deleted = cache.invalidate()
+            print(f"[OK] Deleted {deleted} cached research topics")
+        elif args.command == 'evict':
+            if not cache.evict():
+                print("[OK] Nothing to evict")
+    except Exception as e:
+        print(f"[ERROR] {e}")
+    finally:
+        storage.close()
+
+if __name__ == "__main__":
+    main()
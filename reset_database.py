@@ -1,68 +1,175 @@
 #!/usr/bin/env python3
-import sqlite3
+# -*- coding: utf-8
+"""
+Database Reset / Reprocess Tool
+Marks processed articles as unprocessed again so process_articles.py picks them up.
 
-def reset_database():
-    """Reset all processed articles back to unprocessed state"""
+Instead of one giant UPDATE, rows are reset in bounded batches walking the id
+range, each batch in its own short transaction. Progress is saved to a
+checkpoint file after every batch, so an interrupted run continues where it
+stopped when started again with the same filters.
+
+Examples:
+    python reset_database.py                                  # reset everything
+    python reset_database.py --since 2025-08-01 --until 2025-09-01
+    python reset_database.py --model claude-3-haiku-20240307 --category political
+    python reset_database.py --batch-size 500 --vacuum
+    python reset_database.py --status 3                       # retry articles whose stage ran out of attempts
+"""
+
+import os
+import json
+import time
+import hashlib
+import argparse
+from common import load_env
+from storage import get_storage
+
+# Same environment handling as the scraper and processor
+load_env()
+
+DEFAULT_CHECKPOINT_FILE = '.reset_checkpoint.json'
+
+def filters_signature(filters):
+    """Stable id for a filter set, so a checkpoint is only reused for the same run"""
+    encoded = json.dumps(filters, sort_keys=True).encode('utf-8')
+    return hashlib.md5(encoded).hexdigest()
+
+def load_checkpoint(path, signature):
+    """Return (last reset id, rows reset so far) for this filter set"""
     try:
-        print("🧹 Resetting database to clean state...")
-        
-        # Connect to database
-        conn = sqlite3.connect('rotter_news.db')
-        cursor = conn.cursor()
-        
-        # Get current counts
-        cursor.execute("SELECT COUNT(*) FROM news_items WHERE isProcessed = 1")
-        processed_relevant_count = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM news_items WHERE isProcessed = 2")
-        processed_non_relevant_count = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM news_items WHERE isProcessed = 0")
-        unprocessed_count = cursor.fetchone()[0]
-        
-        print(f"📊 Current state:")
-        print(f"   🔍 Relevant & processed: {processed_relevant_count}")
-        print(f"   🚫 Non-relevant & marked: {processed_non_relevant_count}")
-        print(f"   ⏳ Unprocessed: {unprocessed_count}")
-        
-        # Reset all processed articles back to unprocessed
-        cursor.execute("""
-            UPDATE news_items 
-            SET isProcessed = 0, 
-                process_data = NULL 
-            WHERE isProcessed IN (1, 2)
-        """)
-        
-        # Commit changes
-        conn.commit()
-        
-        # Get new counts
-        cursor.execute("SELECT COUNT(*) FROM news_items WHERE isProcessed = 0")
-        new_unprocessed_count = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM news_items WHERE isProcessed = 1")
-        new_processed_relevant_count = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM news_items WHERE isProcessed = 2")
-        new_processed_non_relevant_count = cursor.fetchone()[0]
-        
-        print(f"\n✅ Reset completed!")
-        print(f"📊 New state:")
-        print(f"   🔍 Relevant & processed: {new_processed_relevant_count}")
-        print(f"   🚫 Non-relevant & marked: {new_processed_non_relevant_count}")
-        print(f"   ⏳ Unprocessed: {new_unprocessed_count}")
-        
+        with open(path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('signature') == signature:
+            return checkpoint.get('last_id', 0), checkpoint.get('reset_count', 0)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"⚠️ Could not read checkpoint {path}: {e}")
+    return 0, 0
+
+def save_checkpoint(path, signature, filters, last_id, reset_count):
+    """Write the checkpoint atomically"""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'signature': signature,
+            'filters': filters,
+            'last_id': last_id,
+            'reset_count': reset_count
+        }, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+
+def print_state(storage, title):
+    """Print current processing counts"""
+    stats = storage.get_processing_stats()
+    print(f"📊 {title}:")
+    print(f"   🔍 Relevant & processed: {stats['processed_relevant']}")
+    print(f"   🚫 Non-relevant & marked: {stats['processed_non_relevant']}")
+    print(f"   ⏳ Unprocessed: {stats['unprocessed']}")
+    print(f"   ❌ Failed: {stats['failed']}")
+
+def reset_database(filters=None, batch_size=1000, checkpoint_path=DEFAULT_CHECKPOINT_FILE,
+                   pause=0.0, vacuum=False, dry_run=False):
+    """Reset matching processed articles back to unprocessed, in batches"""
+    filters = {key: value for key, value in (filters or {}).items() if value}
+    last_id = 0
+
+    try:
+        print("🧹 Resetting processed articles...")
+
+        # Connect to the database selected by DATABASE_URL
+        storage = get_storage()
+        print(f"🗄️ Database: {storage.describe()}")
+        print(f"🎯 Filters: {filters or 'all processed articles'}")
+        print_state(storage, "Current state")
+
+        signature = filters_signature(filters)
+        last_id, reset_count = load_checkpoint(checkpoint_path, signature)
+        if last_id:
+            print(f"\n⏩ Resuming from checkpoint: id > {last_id} ({reset_count} already reset)")
+
+        remaining = storage.count_processed(filters, last_id)
+        print(f"\n📝 {remaining} articles to reset in batches of {batch_size}")
+
+        if dry_run:
+            print("🔎 Dry run - nothing changed")
+            storage.close()
+            return
+
+        done = 0
+        start_time = time.time()
+        while True:
+            count, batch_last_id = storage.reset_processed_batch(filters, last_id, batch_size)
+            if batch_last_id is None:
+                break
+
+            last_id = batch_last_id
+            done += count
+            reset_count += count
+            save_checkpoint(checkpoint_path, signature, filters, last_id, reset_count)
+
+            elapsed = time.time() - start_time
+            rate = done / elapsed if elapsed > 0 else 0
+            percent = (done / remaining * 100) if remaining else 100
+            print(f"   📈 {done}/{remaining} ({percent:.1f}%) - up to id {last_id} - {rate:.0f} rows/s")
+
+            if pause:
+                time.sleep(pause)
+
+        # Finished - the checkpoint is no longer needed
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        print(f"\n✅ Reset completed! {reset_count} articles marked as unprocessed")
+        print_state(storage, "New state")
+
+        if vacuum:
+            print("\n🧽 Running VACUUM (ANALYZE)...")
+            storage.vacuum_analyze()
+            print("✅ VACUUM (ANALYZE) done")
+
         # Close connection
-        conn.close()
-        
-        print(f"\n🎉 Database has been reset to clean state!")
-        print(f"   All articles are now marked as unprocessed (isProcessed = 0)")
-        print(f"   All analysis data has been cleared")
-        
+        storage.close()
+
+        print(f"\n🎉 Matching articles will be processed again on the next processor run")
+
+    except KeyboardInterrupt:
+        print(f"\n⏹️ Interrupted - run again with the same filters to resume from id {last_id}")
     except Exception as e:
         print(f"❌ Error resetting database: {e}")
 
-if __name__ == "__main__":
+def main():
+    parser = argparse.ArgumentParser(description="Reset processed articles so they get reprocessed")
+    parser.add_argument('--since', help="only articles created at or after this date (YYYY-MM-DD)")
+    parser.add_argument('--until', help="only articles created before this date (YYYY-MM-DD)")
+    parser.add_argument('--model', dest='model_used', help="only articles processed by this model")
+    parser.add_argument('--category', help="only articles in this category")
+    parser.add_argument('--status', dest='statuses', type=int, action='append', choices=[1, 2, 3],
+                        help="only this isProcessed value (1 relevant, 2 non-relevant, 3 failed); repeatable")
+    parser.add_argument('--batch-size', type=int, default=1000, help="rows per transaction (default: 1000)")
+    parser.add_argument('--pause', type=float, default=0.0, help="seconds to sleep between batches")
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT_FILE, help="checkpoint file for resuming")
+    parser.add_argument('--vacuum', action='store_true', help="run VACUUM (ANALYZE) when done")
+    parser.add_argument('--dry-run', action='store_true', help="only count matching articles")
+    args = parser.parse_args()
+
     print("🧹 Database Reset Tool")
     print("=" * 50)
-    reset_database()
+    reset_database(
+        filters={
+            'since': args.since,
+            'until': args.until,
+            'model_used': args.model_used,
+            'category': args.category,
+            'statuses': sorted(set(args.statuses)) if args.statuses else None
+        },
+        batch_size=args.batch_size,
+        checkpoint_path=args.checkpoint,
+        pause=args.pause,
+        vacuum=args.vacuum,
+        dry_run=args.dry_run
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+"""
+Speculative Research for the Article Processor
+Stage 2 research only starts once the Stage 1 relevance answer is back, which
+adds a full round-trip to every relevant article. For articles that look
+political anyway - political terms in the title, or a low non-political
+probability from the local pre-filter - research is started next to the
+relevance call. A relevant verdict picks up the research already in flight;
+a non-relevant verdict cancels it, or throws it away if it already finished.
+Speculative research is the research call only: story clusters and the
+topic cache are written once the verdict says the article is relevant.
+
+Tokens spent on discarded research are counted per run, so the threshold can
+be tuned: a higher threshold wastes fewer tokens and hides less latency.
+
+Configuration:
+    SPECULATIVE_RESEARCH=1         # start research during the relevance check
+    SPECULATION_THRESHOLD=0.8      # minimum score (0-1) to speculate
+
+Commands:
+    python speculation.py score "כותרת" ["תוכן"]   # speculation score of an article
+"""
+
+import os
+import asyncio
+import argparse
+import contextvars
+from typing import Dict, Optional
+from common import load_env
+from storage import get_storage
+from prefilter import tokenize, load_prefilter
+from story_clusters import stem
+
+# Same environment handling as the scraper and processor
+load_env()
+
+# Title terms (after prefix stripping) that make an article very likely relevant
+POLITICAL_TERMS = {
+    'ממשלה', 'כנסת', 'נתניהו', 'קואליציה', 'אופוזיציה', 'בחירות', 'השר', 'שר', 'השרה', 'חוק',
+    'בג', 'ליכוד', 'מפלגה', 'מפלגת', 'יועמ', 'רפורמה', 'משפטית', 'הצבעה', 'תקציב', 'גיוס',
+    'חרדים', 'מחאה', 'הפגנה', 'הפגנות', 'עתירה', 'ממשלת', 'קבינט', 'מתנחלים', 'התנחלות',
+    'שמאל', 'ימין', 'חקיקה', 'פוליטי', 'פוליטית',
+}
+
+# Title terms needed for a keyword score of 1
+TERMS_FOR_FULL_SCORE = 2
+
+# Tokens used by the speculative task the current coroutine runs in (None outside one)
+speculative_usage: contextvars.ContextVar = contextvars.ContextVar('speculative_usage', default=None)
+
+def count_speculative_usage(usage):
+    """Add one response's tokens to the speculative task it belongs to, if any"""
+    tokens = speculative_usage.get()
+    if tokens is not None:
+        tokens['tokens'] += sum(getattr(usage, key, 0) or 0 for key in
+                                ['input_tokens', 'cache_creation_input_tokens', 'cache_read_input_tokens', 'output_tokens'])
+
+def keyword_score(title: str) -> float:
+    """Share of TERMS_FOR_FULL_SCORE political terms found in the title"""
+    hits = {stem(word) for word in tokenize(title)} & POLITICAL_TERMS
+    return min(1.0, len(hits) / TERMS_FOR_FULL_SCORE)
+
+class Speculation:
+    """Research running next to the relevance check, with the tokens it has used so far"""
+
+    def __init__(self, coroutine):
+        self.usage = {'tokens': 0}
+        self.task = asyncio.ensure_future(self.tracked(coroutine))
+
+    async def tracked(self, coroutine):
+        speculative_usage.set(self.usage)
+        return await coroutine
+
+class Speculator:
+    """Decides which articles get speculative research and counts what it wastes"""
+
+    def __init__(self, enabled: bool = False, threshold: float = 0.8, prefilter=None):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.prefilter = prefilter
+        self.reset_stats()
+
+    @classmethod
+    def from_env(cls, prefilter=None) -> 'Speculator':
+        """Speculator configured from SPECULATIVE_RESEARCH / SPECULATION_THRESHOLD"""
+        return cls(
+            enabled=os.getenv('SPECULATIVE_RESEARCH', '0') == '1',
+            threshold=float(os.getenv('SPECULATION_THRESHOLD', '0.8')),
+            prefilter=prefilter
+        )
+
+    def reset_stats(self):
+        """Start counting a new run"""
+        self.stats = {'considered': 0, 'launched': 0, 'kept': 0, 'discarded': 0, 'cancelled': 0,
+                      'kept_tokens': 0, 'wasted_tokens': 0}
+
+    def score(self, title: str, content: str = '') -> float:
+        """Cheap local likelihood that the article is relevant: title terms, or the pre-filter"""
+        score = keyword_score(title)
+        if self.prefilter is not None:
+            score = max(score, 1.0 - self.prefilter.score(title, content))
+        return score
+
+    def should_speculate(self, checkpoints: Dict[str, Dict], title: str, content: str = '') -> bool:
+        """True when the article looks relevant and neither stage 1 nor 2 is saved yet"""
+        if not self.enabled or 'relevance' in checkpoints or 'research' in checkpoints:
+            return False
+        self.stats['considered'] += 1
+        return self.score(title, content) >= self.threshold
+
+    def launch(self, research) -> Speculation:
+        """Start the research coroutine as a task on the running event loop"""
+        self.stats['launched'] += 1
+        return Speculation(research)
+
+    async def keep(self, speculation: Speculation) -> str:
+        """The research of a relevant article"""
+        try:
+            return await speculation.task
+        finally:
+            self.stats['kept'] += 1
+            self.stats['kept_tokens'] += speculation.usage['tokens']
+
+    async def discard(self, speculation: Optional[Speculation]):
+        """Cancel or drop the research of an article that turned out not relevant"""
+        if speculation is None:
+            return
+        if not speculation.task.done():
+            self.stats['cancelled'] += 1
+            speculation.task.cancel()
+        try:
+            await speculation.task
+        except (asyncio.CancelledError, Exception):
+            pass
+        self.stats['discarded'] += 1
+        self.stats['wasted_tokens'] += speculation.usage['tokens']
+
+    def summary(self) -> str:
+        """One-line statistics for the processing report"""
+        if not self.enabled:
+            return "disabled"
+        spent = self.stats['kept_tokens'] + self.stats['wasted_tokens']
+        wasted = self.stats['wasted_tokens'] / spent * 100 if spent else 0.0
+        return (f"{self.stats['launched']} of {self.stats['considered']} articles researched during "
+                f"relevance (threshold {self.threshold:.2f}) - {self.stats['kept']} kept, "
+                f"{self.stats['discarded']} discarded ({self.stats['cancelled']} cancelled in flight) - "
+                f"{self.stats['wasted_tokens']} wasted tokens, {wasted:.1f}% of speculative research tokens")
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the speculative research score")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    score_parser = subparsers.add_parser('score', help="speculation score of an article")
+    score_parser.add_argument('title')
+    score_parser.add_argument('content', nargs='?', default='')
+    args = parser.parse_args()
+
+    storage = get_storage()
+    storage.init_schema()
+    try:
+        speculator = Speculator.from_env(load_prefilter(storage))
+        if args.command == 'score':
+            score = speculator.score(args.title, args.content)
+            decision = "speculate" if score >= speculator.threshold else "wait for relevance"
+            print(f"keywords {keyword_score(args.title):.2f} - score {score:.2f} "
+                  f"(threshold {speculator.threshold:.2f}): {decision}")
+    except Exception as e:
+        print(f"[ERROR] {e}")
+    finally:
+        storage.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+"""
+Staged Pipeline for the Article Processor
+Each processing stage gets its own bounded asyncio queue and its own pool of
+workers, so a cheap stage (relevance screening) keeps moving while the slow
+ones (research, analysis) are busy. A full queue makes the stage before it
+wait (backpressure), which keeps the number of half-processed articles bounded.
+
+A stage handler receives an item (a dict) and returns the name of the next
+stage, or None when the item is finished. Finished and failed items are handed
+to on_done(item, error).
+
+Per-stage metrics: items, throughput, p50/p95 handler latency, average queue
+wait and the deepest the queue got.
+"""
+
+import time
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional
+from common import percentile
+
+# Latency samples kept per stage for the percentiles
+LATENCY_SAMPLES = 2000
+
+def parse_worker_spec(spec: Optional[str]) -> Dict[str, int]:
+    """'relevance=8,research=4' -> {'relevance': 8, 'research': 4}"""
+    workers = {}
+    for part in (spec or '').split(','):
+        if '=' not in part:
+            continue
+        name, count = part.split('=', 1)
+        workers[name.strip()] = int(count)
+    return workers
+
+class PipelineStage:
+    """One stage: its handler, worker count and queue bound"""
+
+    def __init__(self, name: str, handler: Callable[[Dict], Awaitable[Optional[str]]],
+                 workers: int = 1, queue_size: Optional[int] = None):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        # Default bound: two items waiting per worker
+        self.queue_size = queue_size or 2 * self.workers
+
+class StageMetrics:
+    """Throughput and latency of one stage"""
+
+    def __init__(self):
+        self.completed = 0
+        self.errors = 0
+        # Recent samples only, so a long-running listener does not grow without bound
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.queue_waits = deque(maxlen=LATENCY_SAMPLES)
+        self.max_depth = 0
+        self.first_start = None
+        self.last_end = None
+
+    def record(self, started: float, ended: float, queue_wait: float, failed: bool):
+        """Account one handled item"""
+        self.first_start = started if self.first_start is None else min(self.first_start, started)
+        self.last_end = ended if self.last_end is None else max(self.last_end, ended)
+        self.latencies.append(ended - started)
+        self.queue_waits.append(queue_wait)
+        if failed:
+            self.errors += 1
+        else:
+            self.completed += 1
+
+    def throughput(self) -> float:
+        """Items per minute while the stage was active"""
+        if self.first_start is None or self.last_end <= self.first_start:
+            return 0.0
+        return (self.completed + self.errors) / (self.last_end - self.first_start) * 60
+
+    def summary(self) -> Dict:
+        """Metrics as a dict"""
+        return {
+            'items': self.completed + self.errors,
+            'errors': self.errors,
+            'per_minute': round(self.throughput(), 1),
+            'p50_seconds': round(percentile(self.latencies, 0.5), 2),
+            'p95_seconds': round(percentile(self.latencies, 0.95), 2),
+            'avg_queue_wait_seconds': round(sum(self.queue_waits) / len(self.queue_waits), 2) if self.queue_waits else 0.0,
+            'max_queue_depth': self.max_depth
+        }
+
+class StagePipeline:
+    """Bounded queue and worker pool per stage, items flowing from the first stage on"""
+
+    def __init__(self, stages: List[PipelineStage], on_done: Callable[[Dict, Optional[Exception]], None]):
+        self.stages = {stage.name: stage for stage in stages}
+        self.order = [stage.name for stage in stages]
+        self.on_done = on_done
+        self.queues: Dict[str, asyncio.Queue] = {}
+        self.metrics = {name: StageMetrics() for name in self.order}
+        self.tasks: List[asyncio.Task] = []
+        # Submitted items not finished yet
+        self.active = 0
+
+    async def start(self):
+        """Create the queues and start every stage's workers (inside the running loop)"""
+        for name in self.order:
+            self.queues[name] = asyncio.Queue(maxsize=self.stages[name].queue_size)
+        for name in self.order:
+            for _ in range(self.stages[name].workers):
+                self.tasks.append(asyncio.create_task(self.worker(name)))
+
+    async def put(self, stage: str, item: Dict):
+        """Queue an item for a stage, waiting while that queue is full"""
+        item['_enqueued_at'] = time.time()
+        queue = self.queues[stage]
+        await queue.put(item)
+        metrics = self.metrics[stage]
+        metrics.max_depth = max(metrics.max_depth, queue.qsize())
+
+    async def submit(self, item: Dict):
+        """Feed a new item into the first stage"""
+        self.active += 1
+        await self.put(self.order[0], item)
+
+    async def worker(self, name: str):
+        """Take items from one stage's queue until cancelled"""
+        queue = self.queues[name]
+        handler = self.stages[name].handler
+        while True:
+            item = await queue.get()
+            started = time.time()
+            queue_wait = started - item.pop('_enqueued_at', started)
+            try:
+                next_stage = await handler(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.metrics[name].record(started, time.time(), queue_wait, failed=True)
+                self.finish(item, e)
+            else:
+                self.metrics[name].record(started, time.time(), queue_wait, failed=False)
+                if next_stage is None:
+                    self.finish(item, None)
+                else:
+                    # Blocks while the next stage is full - this worker stops pulling new items
+                    await self.put(next_stage, item)
+            finally:
+                queue.task_done()
+
+    def finish(self, item: Dict, error: Optional[Exception]):
+        """Hand a finished item to on_done without letting its errors stop the worker"""
+        self.active -= 1
+        try:
+            self.on_done(item, error)
+        except Exception as e:
+            print(f"[ERROR] Pipeline completion handler failed: {e}")
+
+    async def drain(self):
+        """Wait until every submitted item is finished
+
+        Items only move forward, so joining the queues in stage order is enough.
+        """
+        for name in self.order:
+            await self.queues[name].join()
+
+    async def stop(self):
+        """Cancel all workers"""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def run(self, items: List[Dict]):
+        """Push a fixed list of items through the pipeline and wait for all of them"""
+        await self.start()
+        try:
+            for item in items:
+                await self.submit(item)
+            await self.drain()
+        finally:
+            await self.stop()
+
+    def summary_lines(self) -> List[str]:
+        """One line of metrics per stage for the processing report"""
+        lines = []
+        for name in self.order:
+            m = self.metrics[name].summary()
+            lines.append(f"{name:<13} {self.stages[name].workers:>2} workers - {m['items']} items "
+                         f"({m['errors']} errors), {m['per_minute']}/min, p50 {m['p50_seconds']}s, "
+                         f"p95 {m['p95_seconds']}s, queue wait {m['avg_queue_wait_seconds']}s, "
+                         f"max depth {m['max_queue_depth']}")
+        return lines
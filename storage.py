@@ -0,0 +1,1270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+"""
+Article Storage for News Balance Analyzer
+One interface for every news_items query used by the scraper, the processor
+and the maintenance scripts, with two implementations:
+1. PostgresStorage - the production database (Railway)
+2. SQLiteStorage - a local file tuned for throughput (WAL mode, batched
+   transactions, reused prepared statements), so the whole pipeline can run
+   and be benchmarked without a Postgres server
+
+Pick the backend with get_storage(): DATABASE_URL values starting with
+sqlite:/// or file: select SQLite, anything else is treated as Postgres.
+With COMPRESS_COLD_FIELDS=1 the raw content and row_text of new articles are
+compressed into the news_item_archive side table instead of news_items.
+"""
+
+import os
+import json
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Tuple
+
+try:
+    import psycopg2
+    import psycopg2.extensions
+    import psycopg2.extras
+except ImportError:  # SQLite-only environments
+    psycopg2 = None
+
+from db_schema import ensure_schema, SQLITE_TABLES, SQLITE_ADDED_COLUMNS, NEW_ARTICLE_CHANNEL
+from compression import FieldCompressor
+
+DEFAULT_SQLITE_PATH = 'rotter_news.db'
+
+# process_data keys the web feed displays - everything else stays in news_items
+FEED_DISPLAY_FIELDS = ['journalistic_article', 'technical_analysis', 'research_notes', 'analysis', 'is_relevant']
+
+class ArticleStorage:
+    """Base class - all queries are written once with %s placeholders"""
+
+    name = "base"
+
+    # LIMIT value meaning "no limit", and the literal for boolean true
+    no_limit = None
+    true = "TRUE"
+
+    def __init__(self, compress_cold_fields: bool = False):
+        self.conn = None
+        self.compress_cold_fields = compress_cold_fields
+        self._compressor = None
+
+    # --- connection handling (implemented by the backends) ---
+
+    def connect(self):
+        """Return an open connection, reconnecting if needed"""
+        raise NotImplementedError
+
+    def init_schema(self) -> bool:
+        """Create tables and indexes"""
+        raise NotImplementedError
+
+    def sql(self, query: str) -> str:
+        """Adapt a %s-style query to the backend's placeholder style"""
+        return query
+
+    def encode_json(self, data: Dict):
+        """Adapt a dict for the process_data column"""
+        raise NotImplementedError
+
+    def insert_returning_id(self, cursor, query: str, params: Tuple) -> int:
+        """Run a %s-style INSERT and return the id of the row it created"""
+        cursor.execute(self.sql(query + " RETURNING id"), params)
+        return cursor.fetchone()[0]
+
+    def decode_json(self, value) -> Optional[Dict]:
+        """Read the process_data column back into a dict"""
+        if value is None or value == '':
+            return None
+        if isinstance(value, dict):
+            return value
+        return json.loads(value)
+
+    def notify_new_articles(self, cursor, article_ids: List[int]):
+        """Announce new articles to listening processors (no-op by default)"""
+
+    def open_listener(self):
+        """Return a connection LISTENing for new articles, or None if unsupported"""
+        return None
+
+    def describe(self) -> str:
+        """Short human readable description for log output"""
+        return self.name
+
+    def clone(self) -> 'ArticleStorage':
+        """Storage on the same database with a connection of its own (for background threads)"""
+        raise NotImplementedError
+
+    def close(self):
+        """Close the connection if open"""
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+
+    @contextmanager
+    def transaction(self):
+        """Yield a cursor; commit on success, roll back on error"""
+        conn = self.connect()
+        cursor = conn.cursor()
+        try:
+            yield cursor
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    # --- scraper queries ---
+
+    def article_exists(self, hash_id: str) -> bool:
+        """Check if an article with this hash is already stored"""
+        with self.transaction() as cursor:
+            cursor.execute(self.sql("SELECT 1 FROM news_items WHERE hash_id = %s LIMIT 1"), (hash_id,))
+            return cursor.fetchone() is not None
+
+    def article_exists_by_url_or_title(self, title: str, url: str) -> bool:
+        """Check by URL first (most reliable), then by exact title"""
+        with self.transaction() as cursor:
+            cursor.execute(self.sql("SELECT 1 FROM news_items WHERE url = %s LIMIT 1"), (url,))
+            if cursor.fetchone() is not None:
+                return True
+            cursor.execute(self.sql("SELECT 1 FROM news_items WHERE title = %s LIMIT 1"), (title,))
+            return cursor.fetchone() is not None
+
+    def insert_article(self, cursor, article_data: Dict) -> Optional[int]:
+        """Insert one article on an open cursor and return its id"""
+        raise NotImplementedError
+
+    def save_articles(self, articles: List[Dict]) -> List[int]:
+        """Insert new articles in one transaction, skipping known hashes
+
+        Each article dict needs a 'hash_id'. Returns the ids of inserted rows.
+        """
+        inserted_ids = []
+        with self.transaction() as cursor:
+            for article_data in articles:
+                cursor.execute(self.sql("SELECT 1 FROM news_items WHERE hash_id = %s LIMIT 1"),
+                               (article_data['hash_id'],))
+                if cursor.fetchone() is not None:
+                    continue
+
+                if self.compress_cold_fields:
+                    # Cold fields go to the compressed side table only
+                    cold_fields = (article_data.get('content', ''), article_data.get('row_text', ''))
+                    article_data = dict(article_data, content=None, row_text=None)
+
+                article_id = self.insert_article(cursor, article_data)
+                if article_id is not None:
+                    inserted_ids.append(article_id)
+                    if self.compress_cold_fields:
+                        self.insert_cold_fields(cursor, article_id, *cold_fields)
+
+            if inserted_ids:
+                self.notify_new_articles(cursor, inserted_ids)
+
+        return inserted_ids
+
+    def save_article(self, article_data: Dict) -> Optional[int]:
+        """Insert a single article; returns its id or None if it already exists"""
+        inserted_ids = self.save_articles([article_data])
+        return inserted_ids[0] if inserted_ids else None
+
+    def export_recent_articles(self, hours: int = 5, limit: int = 100) -> List[Dict]:
+        """Articles published in the last N hours, newest first"""
+        since = (datetime.now() - timedelta(hours=hours)).isoformat()
+        with self.transaction() as cursor:
+            cursor.execute(self.sql("""
+                SELECT id, title, url, actual_datetime, clean_content, content_length, date_time, created_at
+                FROM news_items
+                WHERE actual_datetime >= %s
+                ORDER BY actual_datetime DESC
+                LIMIT %s
+            """), (since, limit))
+            rows = cursor.fetchall()
+
+        keys = ['id', 'title', 'url', 'actual_datetime', 'clean_content',
+                'content_length', 'date_time', 'created_at']
+        return [dict(zip(keys, row)) for row in rows]
+
+    def get_latest_created_at(self):
+        """Timestamp of the most recently stored article, or None"""
+        with self.transaction() as cursor:
+            cursor.execute("SELECT created_at FROM news_items ORDER BY created_at DESC LIMIT 1")
+            row = cursor.fetchone()
+            return row[0] if row else None
+
+    # --- compressed cold fields ---
+
+    @property
+    def compressor(self) -> FieldCompressor:
+        """FieldCompressor loaded with every stored dictionary"""
+        if self._compressor is None:
+            with self.transaction() as cursor:
+                cursor.execute("SELECT id, dictionary FROM compression_dicts")
+                dictionaries = {dict_id: bytes(dictionary) for dict_id, dictionary in cursor.fetchall()}
+            self._compressor = FieldCompressor(dictionaries)
+        return self._compressor
+
+    def compressor_for(self, dict_id: Optional[int]) -> FieldCompressor:
+        """FieldCompressor that knows dict_id, reloading the dictionaries if it was stored after they were loaded"""
+        if dict_id is not None and dict_id not in self.compressor.dictionaries:
+            self._compressor = None
+        return self.compressor
+
+    def insert_cold_fields(self, cursor, article_id: int, content: Optional[str], row_text: Optional[str]):
+        """Compress content and row_text into news_item_archive on an open cursor"""
+        compressed_content, codec, dict_id = self.compressor.compress(content)
+        compressed_row_text, _, _ = self.compressor.compress(row_text)
+        cursor.execute(self.sql("""
+            INSERT INTO news_item_archive (news_item_id, codec, dict_id, content, row_text)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (news_item_id) DO UPDATE
+            SET codec = excluded.codec,
+                dict_id = excluded.dict_id,
+                content = excluded.content,
+                row_text = excluded.row_text
+        """), (article_id, codec, dict_id, compressed_content, compressed_row_text))
+
+    def get_cold_fields(self, article_id: int) -> Dict:
+        """content and row_text of one article, wherever they are stored"""
+        with self.transaction() as cursor:
+            cursor.execute(self.sql("""
+                SELECT n.content, n.row_text, a.codec, a.dict_id, a.content, a.row_text
+                FROM news_items n
+                LEFT JOIN news_item_archive a ON a.news_item_id = n.id
+                WHERE n.id = %s
+            """), (article_id,))
+            row = cursor.fetchone()
+
+        if row is None:
+            return {}
+        content, row_text, codec, dict_id, archived_content, archived_row_text = row
+        if codec is not None:
+            compressor = self.compressor_for(dict_id)
+            content = compressor.decompress(archived_content, codec, dict_id)
+            row_text = compressor.decompress(archived_row_text, codec, dict_id)
+        return {'content': content, 'row_text': row_text}
+
+    def sample_cold_fields(self, limit: int = 2000) -> List[str]:
+        """Recent uncompressed content/row_text values for dictionary training"""
+        with self.transaction() as cursor:
+            cursor.execute(self.sql("""
+                SELECT content, row_text FROM news_items
+                WHERE content IS NOT NULL OR row_text IS NOT NULL
+                ORDER BY id DESC
+                LIMIT %s
+            """), (limit,))
+            return [value for row in cursor.fetchall() for value in row if value]
+
+    def save_compression_dict(self, codec: str, dictionary: bytes, sample_count: int) -> int:
+        """Store a trained dictionary; new values use the newest one"""
+        with self.transaction() as cursor:
+            dict_id = self.insert_returning_id(cursor, """
+                INSERT INTO compression_dicts (codec, dictionary, sample_count)
+                VALUES (%s, %s, %s)
+            """, (codec, dictionary, sample_count))
+        self._compressor = None  # Reload with the new dictionary
+        return dict_id
+
+    def archive_cold_fields_batch(self, after_id: int, batch_size: int) -> Tuple[int, Optional[int]]:
+        """Move the next batch of uncompressed cold fields to news_item_archive
+
+        Returns (rows archived, last id) - last id is None when nothing is left.
+        """
+        with self.transaction() as cursor:
+            cursor.execute(self.sql("""
+                SELECT id, content, row_text FROM news_items
+                WHERE id > %s AND (content IS NOT NULL OR row_text IS NOT NULL)
+                ORDER BY id
+                LIMIT %s
+            """), (after_id, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                return 0, None
+
+            for article_id, content, row_text in rows:
+                self.insert_cold_fields(cursor, article_id, content, row_text)
+
+            cursor.execute(self.sql("""
+                UPDATE news_items
+                SET content = NULL,
+                    row_text = NULL
+                WHERE id > %s AND id <= %s
+                  AND id IN (SELECT news_item_id FROM news_item_archive)
+            """), (after_id, rows[-1][0]))
+            return len(rows), rows[-1][0]
+
+    # --- local classifiers ---
+
+    def get_labeled_articles(self, limit: int = 20000, exclude_model: Optional[str] = None) -> List[Dict]:
+        """Processed articles with their verdict (isProcessed 1 = relevant, 2 = not), newest first
+
+        Rows decided by exclude_model are skipped, so a classifier never learns from itself.
+        """
+        with self.transaction() as cursor:
+            cursor.execute(self.sql("""
+                SELECT id, title, clean_content, isProcessed
+                FROM news_items
+                WHERE isProcessed IN (1, 2)
+                  AND (model_used IS NULL OR model_used != %s)
+                ORDER BY id DESC
+                LIMIT %s
+            """), (exclude_model or '', limit))
+            rows = cursor.fetchall()
+        keys = ['id', 'title', 'clean_content', 'isProcessed']
+        return [dict(zip(keys, row)) for row in rows]
+
+    def save_classifier_model(self, name: str, model: bytes, sample_count: int, metrics: Dict) -> int:
+        """Store a trained classifier; load_classifier_model returns the newest one"""
+        with self.transaction() as cursor:
+            return self.insert_returning_id(cursor, """
+                INSERT INTO classifier_models (name, model, sample_count, metrics)
+                VALUES (%s, %s, %s, %s)
+            """, (name, model, sample_count, self.encode_json(metrics)))
+
+    def load_classifier_model(self, name: str) -> Optional[Tuple[bytes, Dict]]:
+        """(model bytes, metrics) of the newest classifier with this name"""
+        with self.transaction() as cursor:
+            cursor.execute(self.sql("""
+                SELECT model, metrics FROM classifier_models
+                WHERE name = %s
+                ORDER BY id DESC
+                LIMIT 1
+            """), (name,))
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        return bytes(row[0]), self.decode_json(row[1]) or {}
+
+    # --- web feed ---
+
+    def feed_display_data(self, process_data) -> Optional[Dict]:
+        """The subset of process_data the feed shows"""
+        data = self.decode_json(process_data)
+        if data is None:
+            return None
+        return {key: data[key] for key in FEED_DISPLAY_FIELDS if key in data}
+
+    def refresh_feed_rows(self, cursor, article_ids: List[int]) -> int:
+        """Bring news_feed in line with news_items for these ids, on an open cursor"""
+        if not article_ids:
+            return 0
+        placeholders = ', '.join(['%s'] * len(article_ids))
+
+        cursor.execute(self.sql(f"DELETE FROM news_feed WHERE news_item_id IN ({placeholders})"),
+                       list(article_ids))
+        cursor.execute(self.sql(f"""
+            SELECT id, title, url, clean_content, actual_datetime, process_data, created_at
+            FROM news_items
+            WHERE id IN ({placeholders})
+              AND isProcessed = 1 AND is_relevant = {self.true}
+        """), list(article_ids))
+        rows = cursor.fetchall()
+
+        cursor.executemany(self.sql("""
+            INSERT INTO news_feed (
+                news_item_id, title, url, clean_content, actual_datetime, process_data, created_at
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """), [
+            (article_id, title, url, clean_content, actual_datetime,
+             self.encode_json(self.feed_display_data(process_data)), created_at)
+            for article_id, title, url, clean_content, actual_datetime, process_data, created_at in rows
+        ])
+        return len(rows)
+
+    def refresh_feed(self, article_ids: List[int]) -> int:
+        """Update the feed snapshot for recently processed or reset articles"""
+        with self.transaction() as cursor:
+            return self.refresh_feed_rows(cursor, article_ids)
+
+    def rebuild_feed(self, batch_size: int = 500) -> int:
+        """Rebuild the whole feed snapshot from news_items, batch by batch"""
+        total = 0
+        last_id = 0
+        while True:
+            with self.transaction() as cursor:
+                cursor.execute(self.sql("SELECT id FROM news_items WHERE id > %s ORDER BY id LIMIT %s"),
+                               (last_id, batch_size))
+                ids = [row[0] for row in cursor.fetchall()]
+                if not ids:
+                    break
+                total += self.refresh_feed_rows(cursor, ids)
+                last_id = ids[-1]
+
+        # Drop rows whose article no longer exists past the last id
+        with self.transaction() as cursor:
+            cursor.execute(self.sql("DELETE FROM news_feed WHERE news_item_id > %s"), (last_id,))
+        return total
+
+    def init_feed(self):
+        """Populate an empty feed snapshot once (first start after the table was added)"""
+        with self.transaction() as cursor:
+            cursor.execute("SELECT 1 FROM news_feed LIMIT 1")
+            if cursor.fetchone() is not None:
+                return
+            cursor.execute(f"SELECT 1 FROM news_items WHERE isProcessed = 1 AND is_relevant = {self.true} LIMIT 1")
+            if cursor.fetchone() is None:
+                return
+
+        print(f"[DATABASE] Building the feed snapshot for the first time...")
+        print(f"[OK] Feed snapshot built with {self.rebuild_feed()} articles")
+
+    def get_feed_page(self, page: int = 1, limit: int = 20) -> List[Dict]:
+        """Same query as the news-feed API route: one page of the feed snapshot, newest first"""
+        with self.transaction() as cursor:
+            cursor.execute(self.sql("""
+                SELECT news_item_id, title, url, clean_content, actual_datetime, process_data, created_at
+                FROM news_feed
+                ORDER BY actual_datetime DESC, news_item_id DESC
+                LIMIT %s OFFSET %s
+            """), (limit, (page - 1) * limit))
+            rows = cursor.fetchall()
+
+        keys = ['id', 'title', 'url', 'clean_content', 'actual_datetime', 'process_data', 'created_at']
+        return [dict(zip(keys, row)) for row in rows]
+
+    def table_report(self) -> Dict:
+        """Size and cache statistics for the measurement tool"""
+        raise NotImplementedError
+
+    # --- processor queries ---
+
+    def get_unprocessed_articles(self, limit: Optional[int] = None) -> List[Dict]:
+        """Articles where isProcessed = 0, oldest first"""
+        with self.transaction() as cursor:
+            cursor.execute(self.sql(f"""
+                SELECT id, title, url, clean_content, created_at, {self.hours_since('created_at')}
+                FROM news_items
+                WHERE isProcessed = 0
+                ORDER BY created_at ASC
+                LIMIT %s
+            """), (limit or self.no_limit,))
+            rows = cursor.fetchall()
+
+        keys = ['id', 'title', 'url', 'clean_content', 'created_at', 'waiting_hours']
+        return [dict(zip(keys, row)) for row in rows]
+
+    def get_unprocessed_backlog(self) -> Tuple[int, float]:
+        """(articles where isProcessed = 0, hours the oldest of them has been waiting)"""
+        with self.transaction() as cursor:
+            cursor.execute(f"""
+                SELECT COUNT(*), COALESCE(MAX({self.hours_since('created_at')}), 0)
+                FROM news_items
+                WHERE isProcessed = 0
+            """)
+            row = cursor.fetchone()
+        return int(row[0]), float(row[1])
+
+    def processed_row(self, article_id: int, analysis_data: Dict) -> Tuple:
+        """Build the UPDATE parameters for one processed article"""
+        is_relevant = analysis_data.get('is_relevant', True)
+        is_processed_value = 1 if is_relevant else 2
+        category = analysis_data.get('category') or analysis_data.get('analysis', {}).get('category')
+        # Structured relevance verdict (relevance_verdict.py), when the article has one
+        verdict = analysis_data.get('relevance') or {}
+        return (
+            is_processed_value,
+            self.encode_json(analysis_data),
+            is_relevant,
+            category,
+            analysis_data.get('model_used'),
+            analysis_data.get('processed_at'),
+            verdict.get('controversy_type'),
+            verdict.get('confidence'),
+            article_id
+        )
+
+    def update_articles_as_processed(self, results: List[Tuple[int, Dict]]):
+        """Write (article_id, analysis_data) pairs in one transaction"""
+        with self.transaction() as cursor:
+            cursor.executemany(self.sql("""
+                UPDATE news_items
+                SET isProcessed = %s,
+                    process_data = %s,
+                    is_relevant = %s,
+                    category = %s,
+                    model_used = %s,
+                    processed_at = %s,
+                    controversy_type = %s,
+                    relevance_confidence = %s
+                WHERE id = %s
+            """), [self.processed_row(article_id, data) for article_id, data in results])
+            # Finished articles no longer need their stage checkpoints
+            cursor.executemany(self.sql("DELETE FROM article_stages WHERE news_item_id = %s"),
+                               [(article_id,) for article_id, _ in results])
+
+    def update_article_as_processed(self, article_id: int, analysis_data: Dict):
+        """Mark one article as processed and store its analysis"""
+        self.update_articles_as_processed([(article_id, analysis_data)])
+
+    def mark_articles_failed(self, article_ids: List[int]):
+        """Set unprocessed articles aside as failed (isProcessed = 3), keeping their stage checkpoints"""
+        with self.transaction() as cursor:
+            cursor.executemany(self.sql("UPDATE news_items SET isProcessed = 3 WHERE id = %s AND isProcessed = 0"),
+                               [(article_id,) for article_id in article_ids])
+
+    # --- statistics and maintenance ---
+
+    def hours_ago(self, hours: int) -> str:
+        """SQL expression for 'now minus N hours', comparable with created_at"""
+        return f"NOW() - INTERVAL '{int(hours)} hours'"
+
+    def hours_since(self, column: str) -> str:
+        """SQL expression for the hours between a timestamp column and now"""
+        return f"EXTRACT(EPOCH FROM NOW() - {column}) / 3600.0"
+
+    def get_processing_stats(self) -> Dict:
+        """Counts per processing status plus recent activity"""
+        with self.transaction() as cursor:
+            cursor.execute("SELECT isProcessed, COUNT(*) FROM news_items GROUP BY isProcessed")
+            by_status = {status: count for status, count in cursor.fetchall()}
+
+            cursor.execute(f"""
+                SELECT
+                    SUM(CASE WHEN created_at >= {self.hours_ago(1)} THEN 1 ELSE 0 END),
+                    SUM(CASE WHEN created_at >= {self.hours_ago(24)} THEN 1 ELSE 0 END)
+                FROM news_items
+            """)
+            last_hour, last_24h = cursor.fetchone()
+
+        return {
+            'total': sum(by_status.values()),
+            'unprocessed': by_status.get(0, 0),
+            'processed_relevant': by_status.get(1, 0),
+            'processed_non_relevant': by_status.get(2, 0),
+            'failed': by_status.get(3, 0),
+            'last_hour': last_hour or 0,
+            'last_24h': last_24h or 0
+        }
+
+    def processed_filter(self, filters: Dict) -> Tuple[str, List]:
+        """WHERE clause selecting processed articles by the reset tool's filters
+
+        filters keys (all optional): since / until (created_at range),
+        model_used, category, statuses (isProcessed values, default 1 and 2; 3 = failed)
+        """
+        statuses = filters.get('statuses') or [1, 2]
+        conditions = [f"isProcessed IN ({', '.join(str(int(status)) for status in statuses)})"]
+        params = []
+
+        if filters.get('since'):
+            conditions.append("created_at >= %s")
+            params.append(filters['since'])
+        if filters.get('until'):
+            conditions.append("created_at < %s")
+            params.append(filters['until'])
+        if filters.get('model_used'):
+            conditions.append("model_used = %s")
+            params.append(filters['model_used'])
+        if filters.get('category'):
+            conditions.append("category = %s")
+            params.append(filters['category'])
+
+        return ' AND '.join(conditions), params
+
+    def count_processed(self, filters: Dict, after_id: int = 0) -> int:
+        """Number of processed articles matching filters with id > after_id"""
+        where, params = self.processed_filter(filters)
+        with self.transaction() as cursor:
+            cursor.execute(self.sql(f"SELECT COUNT(*) FROM news_items WHERE id > %s AND {where}"),
+                           [after_id] + params)
+            return cursor.fetchone()[0]
+
+    def reset_processed_batch(self, filters: Dict, after_id: int, batch_size: int) -> Tuple[int, Optional[int]]:
+        """Reset the next batch of matching articles back to unprocessed
+
+        Works on the id range (after_id, last id of the batch] in its own short
+        transaction. Returns (rows reset, last id) - last id is None when done.
+        """
+        where, params = self.processed_filter(filters)
+        with self.transaction() as cursor:
+            cursor.execute(self.sql(f"""
+                SELECT id FROM news_items
+                WHERE id > %s AND {where}
+                ORDER BY id
+                LIMIT %s
+            """), [after_id] + params + [batch_size])
+            ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                return 0, None
+
+            cursor.execute(self.sql(f"""
+                UPDATE news_items
+                SET isProcessed = 0,
+                    process_data = NULL,
+                    is_relevant = NULL,
+                    category = NULL,
+                    model_used = NULL,
+                    processed_at = NULL,
+                    story_cluster_id = NULL,
+                    controversy_type = NULL,
+                    relevance_confidence = NULL
+                WHERE id > %s AND id <= %s AND {where}
+            """), [after_id, ids[-1]] + params)
+            reset_count = cursor.rowcount
+
+            # Failed articles keep their finished stages but get a fresh count of attempts
+            placeholders = ', '.join(['%s'] * len(ids))
+            cursor.execute(self.sql(f"""
+                UPDATE article_stages SET attempts = 0, last_error = NULL
+                WHERE news_item_id IN ({placeholders})
+            """), ids)
+
+            # Reset articles leave the feed snapshot
+            self.refresh_feed_rows(cursor, ids)
+            return reset_count, ids[-1]
+
+    # --- stage checkpoints ---
+
+    def get_stage_checkpoints(self, article_ids: List[int]) -> Dict[int, Dict[str, Dict]]:
+        """Saved stage state per article: {article_id: {stage: {'output', 'attempts'}}}
+
+        output is None for a stage that only failed or is still streaming so far.
+        """
+        checkpoints: Dict[int, Dict[str, Dict]] = {}
+        with self.transaction() as cursor:
+            for offset in range(0, len(article_ids), 500):
+                chunk = article_ids[offset:offset + 500]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(self.sql(f"""
+                    SELECT news_item_id, stage, output, attempts
+                    FROM article_stages
+                    WHERE news_item_id IN ({placeholders})
+                """), chunk)
+                for article_id, stage, output, attempts in cursor.fetchall():
+                    checkpoints.setdefault(article_id, {})[stage] = {'output': output, 'attempts': attempts or 0}
+        return checkpoints
+
+    def save_stage_outputs(self, outputs: List[Tuple[int, str, str]]):
+        """Persist finished stages as (article_id, stage, output) in one transaction"""
+        if not outputs:
+            return
+        with self.transaction() as cursor:
+            cursor.executemany(self.sql("""
+                INSERT INTO article_stages (news_item_id, stage, output)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (news_item_id, stage) DO UPDATE SET
+                    output = excluded.output,
+                    last_error = NULL,
+                    partial_output = NULL,
+                    updated_at = CURRENT_TIMESTAMP
+            """), outputs)
+
+    def save_partial_output(self, article_id: int, stage: str, text: str):
+        """Text a stage has streamed so far; replaced by the output once the stage finishes"""
+        with self.transaction() as cursor:
+            cursor.execute(self.sql("""
+                INSERT INTO article_stages (news_item_id, stage, partial_output)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (news_item_id, stage) DO UPDATE SET
+                    partial_output = excluded.partial_output,
+                    updated_at = CURRENT_TIMESTAMP
+            """), (article_id, stage, text))
+
+    def record_stage_failure(self, article_id: int, stage: str, error: str) -> int:
+        """Count one failed attempt of a stage; returns the attempts so far"""
+        with self.transaction() as cursor:
+            cursor.execute(self.sql("""
+                INSERT INTO article_stages (news_item_id, stage, attempts, last_error)
+                VALUES (%s, %s, 1, %s)
+                ON CONFLICT (news_item_id, stage) DO UPDATE SET
+                    attempts = article_stages.attempts + 1,
+                    last_error = excluded.last_error,
+                    updated_at = CURRENT_TIMESTAMP
+            """), (article_id, stage, error))
+            cursor.execute(self.sql("""
+                SELECT attempts FROM article_stages WHERE news_item_id = %s AND stage = %s
+            """), (article_id, stage))
+            return cursor.fetchone()[0]
+
+    def stage_checkpoint_report(self) -> List[Dict]:
+        """Unfinished articles per stage: completed outputs waiting, failed attempts and partial streams"""
+        with self.transaction() as cursor:
+            cursor.execute("""
+                SELECT stage,
+                       SUM(CASE WHEN output IS NOT NULL THEN 1 ELSE 0 END),
+                       SUM(CASE WHEN output IS NULL AND attempts > 0 THEN 1 ELSE 0 END),
+                       SUM(CASE WHEN output IS NULL AND partial_output IS NOT NULL THEN 1 ELSE 0 END)
+                FROM article_stages
+                GROUP BY stage
+                ORDER BY stage
+            """)
+            rows = cursor.fetchall()
+        keys = ['stage', 'completed', 'failed', 'partial']
+        return [dict(zip(keys, row)) for row in rows]
+
+    # --- story clusters ---
+
+    def recent_story_clusters(self, window_hours: int) -> List[Dict]:
+        """Clusters opened in the last window_hours with their term signatures"""
+        with self.transaction() as cursor:
+            cursor.execute(self.sql(f"""
+                SELECT id, title, signature, research IS NOT NULL, article_count
+                FROM story_clusters
+                WHERE created_at >= {self.hours_ago(window_hours)}
+                ORDER BY id
+            """))
+            rows = cursor.fetchall()
+        return [{'id': row[0], 'title': row[1], 'signature': json.loads(row[2]),
+                 'has_research': bool(row[3]), 'article_count': row[4]} for row in rows]
+
+    def get_article_story_cluster(self, article_id: int) -> Optional[int]:
+        """Cluster an article was assigned to earlier, if any"""
+        with self.transaction() as cursor:
+            cursor.execute(self.sql("SELECT story_cluster_id FROM news_items WHERE id = %s"), (article_id,))
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def create_story_cluster(self, article_id: int, title: str, signature: Dict[str, float]) -> int:
+        """Open a new cluster with one article in it"""
+        with self.transaction() as cursor:
+            cluster_id = self.insert_returning_id(cursor, """
+                INSERT INTO story_clusters (title, signature) VALUES (%s, %s)
+            """, (title, json.dumps(signature, ensure_ascii=False)))
+            cursor.execute(self.sql("UPDATE news_items SET story_cluster_id = %s WHERE id = %s"),
+                           (cluster_id, article_id))
+        return cluster_id
+
+    def join_story_cluster(self, article_id: int, cluster_id: int):
+        """Add an article to an existing cluster"""
+        with self.transaction() as cursor:
+            cursor.execute(self.sql("""
+                UPDATE story_clusters
+                SET article_count = article_count + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+            """), (cluster_id,))
+            cursor.execute(self.sql("UPDATE news_items SET story_cluster_id = %s WHERE id = %s"),
+                           (cluster_id, article_id))
+
+    def get_story_cluster_size(self, article_id: int) -> Optional[int]:
+        """Articles in the story cluster of an article, or None before it was clustered"""
+        with self.transaction() as cursor:
+            cursor.execute(self.sql("""
+                SELECT c.article_count
+                FROM news_items n JOIN story_clusters c ON c.id = n.story_cluster_id
+                WHERE n.id = %s
+            """), (article_id,))
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def get_story_research(self, cluster_id: int) -> Optional[str]:
+        """Research findings shared by a cluster's articles"""
+        with self.transaction() as cursor:
+            cursor.execute(self.sql("SELECT research FROM story_clusters WHERE id = %s"), (cluster_id,))
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def save_story_research(self, cluster_id: int, research: str):
+        """Store the research done for a cluster"""
+        with self.transaction() as cursor:
+            cursor.execute(self.sql("""
+                UPDATE story_clusters SET research = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s
+            """), (research, cluster_id))
+
+    # --- topic research cache ---
+
+    def get_topic_research(self, topic_key: str, ttl_hours: int) -> Optional[str]:
+        """Research for a topic younger than ttl_hours, marking it as recently used"""
+        with self.transaction() as cursor:
+            cursor.execute(self.sql(f"""
+                SELECT research FROM research_cache
+                WHERE topic_key = %s AND created_at >= {self.hours_ago(ttl_hours)}
+            """), (topic_key,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            cursor.execute(self.sql("""
+                UPDATE research_cache
+                SET last_used_at = CURRENT_TIMESTAMP, hit_count = hit_count + 1
+                WHERE topic_key = %s
+            """), (topic_key,))
+        return row[0]
+
+    def put_topic_research(self, topic_key: str, topic: str, research: str):
+        """Insert or refresh the research of one topic"""
+        with self.transaction() as cursor:
+            cursor.execute(self.sql("""
+                INSERT INTO research_cache (topic_key, topic, research)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (topic_key) DO UPDATE SET
+                    topic = excluded.topic,
+                    research = excluded.research,
+                    created_at = CURRENT_TIMESTAMP,
+                    last_used_at = CURRENT_TIMESTAMP
+            """), (topic_key, topic, research))
+
+    def evict_topic_research(self, ttl_hours: int, max_entries: int) -> int:
+        """Drop expired topics, then least recently used ones beyond max_entries"""
+        with self.transaction() as cursor:
+            cursor.execute(f"DELETE FROM research_cache WHERE created_at < {self.hours_ago(ttl_hours)}")
+            deleted = cursor.rowcount
+
+            cursor.execute("SELECT topic_key FROM research_cache ORDER BY last_used_at DESC")
+            evict = [row[0] for row in cursor.fetchall()[max_entries:]]
+            for offset in range(0, len(evict), 500):
+                chunk = evict[offset:offset + 500]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(self.sql(f"DELETE FROM research_cache WHERE topic_key IN ({placeholders})"), chunk)
+                deleted += cursor.rowcount
+        return deleted
+
+    def invalidate_topic_research(self, topic_key: Optional[str] = None) -> int:
+        """Delete the research of one topic, or of all topics"""
+        with self.transaction() as cursor:
+            if topic_key:
+                cursor.execute(self.sql("DELETE FROM research_cache WHERE topic_key = %s"), (topic_key,))
+            else:
+                cursor.execute("DELETE FROM research_cache")
+            return cursor.rowcount
+
+    def topic_research_report(self, limit: int = 20) -> List[Dict]:
+        """Most reused topics with their age"""
+        with self.transaction() as cursor:
+            cursor.execute(self.sql("""
+                SELECT topic_key, topic, hit_count, created_at, last_used_at
+                FROM research_cache
+                ORDER BY hit_count DESC, last_used_at DESC
+                LIMIT %s
+            """), (limit,))
+            rows = cursor.fetchall()
+        keys = ['topic_key', 'topic', 'hits', 'created_at', 'last_used_at']
+        return [dict(zip(keys, row)) for row in rows]
+
+    # --- processor state ---
+
+    def get_processor_state(self, name: str) -> Optional[Dict]:
+        """JSON state saved under a name, or None"""
+        with self.transaction() as cursor:
+            cursor.execute(self.sql("SELECT data FROM processor_state WHERE name = %s"), (name,))
+            row = cursor.fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_processor_state(self, name: str, data: Dict):
+        """Insert or replace the JSON state saved under a name"""
+        with self.transaction() as cursor:
+            cursor.execute(self.sql("""
+                INSERT INTO processor_state (name, data) VALUES (%s, %s)
+                ON CONFLICT (name) DO UPDATE SET data = excluded.data, updated_at = CURRENT_TIMESTAMP
+            """), (name, json.dumps(data, ensure_ascii=False)))
+
+    # --- LLM call telemetry ---
+
+    def save_llm_calls(self, rows: List[Tuple]):
+        """Insert telemetry rows: (news_item_id, stage, model, input, output, cache write, cache read,
+        latency_ms, retries, outcome, batch, cost_usd)"""
+        if not rows:
+            return
+        with self.transaction() as cursor:
+            cursor.executemany(self.sql("""
+                INSERT INTO llm_calls (news_item_id, stage, model, input_tokens, output_tokens,
+                                       cache_creation_input_tokens, cache_read_input_tokens,
+                                       latency_ms, retries, outcome, batch, cost_usd)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """), rows)
+
+    def llm_tokens_spent(self, hours: int) -> Tuple[int, int]:
+        """(input + cache write + output tokens, cache read tokens) of the live calls of the last `hours` hours"""
+        with self.transaction() as cursor:
+            cursor.execute(f"""
+                SELECT COALESCE(SUM(input_tokens + cache_creation_input_tokens + output_tokens), 0),
+                       COALESCE(SUM(cache_read_input_tokens), 0)
+                FROM llm_calls
+                WHERE created_at >= {self.hours_ago(hours)} AND outcome <> 'cached'
+            """)
+            row = cursor.fetchone()
+        return int(row[0]), int(row[1])
+
+    def llm_tokens_per_article(self, days: int) -> Tuple[int, int, int]:
+        """(articles, input + cache write + output tokens, cache read tokens) of the last `days` days' calls"""
+        with self.transaction() as cursor:
+            cursor.execute(f"""
+                SELECT COUNT(DISTINCT news_item_id),
+                       COALESCE(SUM(input_tokens + cache_creation_input_tokens + output_tokens), 0),
+                       COALESCE(SUM(cache_read_input_tokens), 0)
+                FROM llm_calls
+                WHERE created_at >= {self.hours_ago(days * 24)} AND outcome <> 'cached'
+                  AND news_item_id IS NOT NULL
+            """)
+            row = cursor.fetchone()
+        return int(row[0]), int(row[1]), int(row[2])
+
+    def llm_call_report(self, days: int) -> Dict:
+        """Telemetry of the last `days` days: totals per stage and per model, call latencies, daily trend"""
+        since = self.hours_ago(days * 24)
+        report = {}
+        with self.transaction() as cursor:
+            cursor.execute(f"""
+                SELECT stage, COUNT(*),
+                       SUM(CASE WHEN outcome = 'cached' THEN 1 ELSE 0 END),
+                       SUM(CASE WHEN outcome LIKE 'error%' THEN 1 ELSE 0 END),
+                       COALESCE(SUM(retries), 0),
+                       COALESCE(SUM(input_tokens), 0), COALESCE(SUM(output_tokens), 0),
+                       COALESCE(SUM(cache_creation_input_tokens), 0), COALESCE(SUM(cache_read_input_tokens), 0),
+                       COALESCE(SUM(cost_usd), 0)
+                FROM llm_calls
+                WHERE created_at >= {since}
+                GROUP BY stage
+                ORDER BY stage
+            """)
+            keys = ['stage', 'calls', 'cached', 'errors', 'retries', 'input_tokens', 'output_tokens',
+                    'cache_creation_input_tokens', 'cache_read_input_tokens', 'cost_usd']
+            report['stages'] = [dict(zip(keys, row)) for row in cursor.fetchall()]
+
+            cursor.execute(f"""
+                SELECT stage, model, COUNT(*),
+                       COALESCE(SUM(input_tokens + cache_creation_input_tokens + cache_read_input_tokens), 0),
+                       COALESCE(SUM(output_tokens), 0), COALESCE(SUM(cost_usd), 0)
+                FROM llm_calls
+                WHERE created_at >= {since} AND outcome <> 'cached'
+                GROUP BY stage, model
+                ORDER BY stage, model
+            """)
+            report['models'] = [dict(zip(['stage', 'model', 'calls', 'input_tokens', 'output_tokens', 'cost_usd'], row))
+                                for row in cursor.fetchall()]
+
+            # Live calls only - cached answers and batch results say nothing about latency
+            cursor.execute(self.sql(f"""
+                SELECT stage, model, latency_ms FROM llm_calls
+                WHERE created_at >= {since} AND outcome <> 'cached' AND batch = %s AND latency_ms IS NOT NULL
+            """), (False,))
+            report['latencies'] = {}
+            report['model_latencies'] = {}
+            for stage, model, latency_ms in cursor.fetchall():
+                report['latencies'].setdefault(stage, []).append(latency_ms)
+                report['model_latencies'].setdefault((stage, model), []).append(latency_ms)
+
+            cursor.execute(f"""
+                SELECT DATE(created_at), COUNT(*),
+                       COALESCE(SUM(input_tokens + cache_creation_input_tokens + cache_read_input_tokens), 0),
+                       COALESCE(SUM(output_tokens), 0), COALESCE(SUM(cost_usd), 0)
+                FROM llm_calls
+                WHERE created_at >= {since}
+                GROUP BY DATE(created_at)
+                ORDER BY DATE(created_at)
+            """)
+            report['daily'] = [dict(zip(['day', 'calls', 'input_tokens', 'output_tokens', 'cost_usd'], row))
+                               for row in cursor.fetchall()]
+
+            cursor.execute(f"""
+                SELECT DATE(processed_at), COUNT(*)
+                FROM news_items
+                WHERE is_relevant = {self.true} AND processed_at >= {since}
+                GROUP BY DATE(processed_at)
+            """)
+            report['relevant_per_day'] = {str(day): count for day, count in cursor.fetchall()}
+        return report
+
+    # --- LLM response cache ---
+
+    def get_cached_response(self, cache_key: str, ttl_hours: int) -> Optional[Dict]:
+        """Cached response younger than ttl_hours, marking it as recently used"""
+        with self.transaction() as cursor:
+            cursor.execute(self.sql(f"""
+                SELECT response, input_tokens, output_tokens
+                FROM llm_cache
+                WHERE cache_key = %s AND created_at >= {self.hours_ago(ttl_hours)}
+            """), (cache_key,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            cursor.execute(self.sql("""
+                UPDATE llm_cache
+                SET last_used_at = CURRENT_TIMESTAMP, hit_count = hit_count + 1
+                WHERE cache_key = %s
+            """), (cache_key,))
+        return {'response': row[0], 'input_tokens': row[1] or 0, 'output_tokens': row[2] or 0}
+
+    def put_cached_response(self, cache_key: str, stage: str, model: str, response: str,
+                            input_tokens: int, output_tokens: int):
+        """Insert or replace one cached response"""
+        size_bytes = len(cache_key) + len(response.encode('utf-8'))
+        with self.transaction() as cursor:
+            cursor.execute(self.sql("""
+                INSERT INTO llm_cache (cache_key, stage, model, response, input_tokens, output_tokens, size_bytes)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (cache_key) DO UPDATE SET
+                    response = excluded.response,
+                    input_tokens = excluded.input_tokens,
+                    output_tokens = excluded.output_tokens,
+                    size_bytes = excluded.size_bytes,
+                    created_at = CURRENT_TIMESTAMP,
+                    last_used_at = CURRENT_TIMESTAMP
+            """), (cache_key, stage, model, response, input_tokens, output_tokens, size_bytes))
+
+    def evict_cached_responses(self, ttl_hours: int, max_bytes: int) -> int:
+        """Drop expired entries, then least recently used ones until under max_bytes"""
+        with self.transaction() as cursor:
+            cursor.execute(f"DELETE FROM llm_cache WHERE created_at < {self.hours_ago(ttl_hours)}")
+            deleted = cursor.rowcount
+
+            cursor.execute("SELECT cache_key, size_bytes FROM llm_cache ORDER BY last_used_at DESC")
+            total = 0
+            evict = []
+            for cache_key, size_bytes in cursor.fetchall():
+                total += size_bytes or 0
+                if total > max_bytes:
+                    evict.append(cache_key)
+
+            for offset in range(0, len(evict), 500):
+                chunk = evict[offset:offset + 500]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(self.sql(f"DELETE FROM llm_cache WHERE cache_key IN ({placeholders})"), chunk)
+                deleted += cursor.rowcount
+        return deleted
+
+    def clear_cached_responses(self, stage: Optional[str] = None) -> int:
+        """Delete all cached responses, or only those of one stage"""
+        with self.transaction() as cursor:
+            if stage:
+                cursor.execute(self.sql("DELETE FROM llm_cache WHERE stage = %s"), (stage,))
+            else:
+                cursor.execute("DELETE FROM llm_cache")
+            return cursor.rowcount
+
+    def cache_report(self) -> List[Dict]:
+        """Entries, size, hits and stored tokens per stage"""
+        with self.transaction() as cursor:
+            cursor.execute("""
+                SELECT stage, COUNT(*), COALESCE(SUM(size_bytes), 0), COALESCE(SUM(hit_count), 0),
+                       COALESCE(SUM(input_tokens + output_tokens), 0)
+                FROM llm_cache
+                GROUP BY stage
+                ORDER BY stage
+            """)
+            rows = cursor.fetchall()
+        keys = ['stage', 'entries', 'size_bytes', 'hits', 'tokens']
+        return [dict(zip(keys, row)) for row in rows]
+
+    def vacuum_analyze(self):
+        """Reclaim space and refresh planner statistics on news_items"""
+        raise NotImplementedError
+
+class PostgresStorage(ArticleStorage):
+    """Production storage on PostgreSQL"""
+
+    name = "postgres"
+
+    def __init__(self, db_url: str, compress_cold_fields: bool = False):
+        super().__init__(compress_cold_fields)
+        if psycopg2 is None:
+            raise RuntimeError("psycopg2 is required for PostgreSQL storage")
+        self.db_url = db_url
+
+    def connect(self):
+        if self.conn is None or self.conn.closed:
+            self.conn = psycopg2.connect(self.db_url)
+        return self.conn
+
+    def clone(self) -> 'PostgresStorage':
+        return PostgresStorage(self.db_url, self.compress_cold_fields)
+
+    def init_schema(self) -> bool:
+        if not ensure_schema(self.connect()):
+            return False
+        self.init_feed()
+        return True
+
+    def encode_json(self, data: Dict):
+        return psycopg2.extras.Json(data)
+
+    def insert_article(self, cursor, article_data: Dict) -> Optional[int]:
+        cursor.execute("""
+            INSERT INTO news_items (
+                title, url, scraped_at, row_text, actual_datetime,
+                content, clean_content, content_length, date_time, hash_id,
+                isProcessed, process_data
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 0, NULL)
+            ON CONFLICT DO NOTHING
+            RETURNING id
+        """, article_values(article_data))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def notify_new_articles(self, cursor, article_ids: List[int]):
+        # Delivered when the insert transaction commits
+        cursor.execute("SELECT pg_notify(%s, %s)",
+                       (NEW_ARTICLE_CHANNEL, ','.join(str(article_id) for article_id in article_ids)))
+
+    def open_listener(self):
+        conn = psycopg2.connect(self.db_url)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        conn.cursor().execute(f"LISTEN {NEW_ARTICLE_CHANNEL}")
+        return conn
+
+    def table_report(self) -> Dict:
+        with self.transaction() as cursor:
+            cursor.execute("""
+                SELECT pg_total_relation_size('news_items'),
+                       pg_relation_size('news_items'),
+                       COALESCE(pg_total_relation_size(reltoastrelid), 0),
+                       pg_indexes_size('news_items'),
+                       pg_total_relation_size('news_item_archive')
+                FROM pg_class WHERE oid = 'news_items'::regclass
+            """)
+            total, heap, toast, indexes, archive = cursor.fetchone()
+
+            cursor.execute("""
+                SELECT COALESCE(heap_blks_hit, 0), COALESCE(heap_blks_read, 0),
+                       COALESCE(toast_blks_hit, 0), COALESCE(toast_blks_read, 0)
+                FROM pg_statio_user_tables WHERE relname = 'news_items'
+            """)
+            heap_hit, heap_read, toast_hit, toast_read = cursor.fetchone() or (0, 0, 0, 0)
+
+        hits = heap_hit + toast_hit
+        reads = heap_read + toast_read
+        return {
+            'total_bytes': total,
+            'heap_bytes': heap,
+            'toast_bytes': toast,
+            'index_bytes': indexes,
+            'archive_bytes': archive,
+            'cache_hit_rate': hits / (hits + reads) if hits + reads else None
+        }
+
+    def vacuum_analyze(self):
+        # VACUUM cannot run inside a transaction block
+        conn = self.connect()
+        conn.autocommit = True
+        try:
+            conn.cursor().execute("VACUUM (ANALYZE) news_items")
+        finally:
+            conn.autocommit = False
+
+    def describe(self) -> str:
+        return "PostgreSQL (DATABASE_URL)"
+
+class SQLiteStorage(ArticleStorage):
+    """Local storage on a single SQLite file, tuned for throughput
+
+    - WAL journal so the scraper can write while the processor reads
+    - synchronous=NORMAL, which is durable across application crashes in WAL mode
+    - one long-lived connection, so sqlite3's statement cache reuses the
+      prepared form of every query in this class
+    - batched writes through save_articles / update_articles_as_processed
+    """
+
+    name = "sqlite"
+    no_limit = -1
+    true = "1"
+
+    def __init__(self, path: str = DEFAULT_SQLITE_PATH, compress_cold_fields: bool = False):
+        super().__init__(compress_cold_fields)
+        self.path = path
+        self._sql_cache = {}
+
+    def connect(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path, timeout=30, cached_statements=256)
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.execute("PRAGMA synchronous = NORMAL")
+            self.conn.execute("PRAGMA temp_store = MEMORY")
+            self.conn.execute("PRAGMA cache_size = -65536")  # 64 MB page cache
+            self.conn.execute("PRAGMA busy_timeout = 30000")
+        return self.conn
+
+    def clone(self) -> 'SQLiteStorage':
+        return SQLiteStorage(self.path, self.compress_cold_fields)
+
+    def init_schema(self) -> bool:
+        try:
+            with self.transaction() as cursor:
+                for table, column, column_type in SQLITE_ADDED_COLUMNS:
+                    cursor.execute(f"PRAGMA table_info({table})")
+                    columns = [row[1] for row in cursor.fetchall()]
+                    if columns and column not in columns:
+                        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+                for statement in SQLITE_TABLES:
+                    cursor.execute(statement)
+            self.init_feed()
+            return True
+        except Exception as e:
+            print(f"[ERROR] Error initializing SQLite schema: {e}")
+            return False
+
+    def sql(self, query: str) -> str:
+        if query not in self._sql_cache:
+            self._sql_cache[query] = query.replace('%s', '?')
+        return self._sql_cache[query]
+
+    def encode_json(self, data: Dict):
+        return json.dumps(data, ensure_ascii=False)
+
+    def insert_returning_id(self, cursor, query: str, params: Tuple) -> int:
+        cursor.execute(self.sql(query), params)
+        return cursor.lastrowid
+
+    def hours_ago(self, hours: int) -> str:
+        # created_at defaults to CURRENT_TIMESTAMP, which SQLite stores as UTC text
+        return f"datetime('now', '-{int(hours)} hours')"
+
+    def hours_since(self, column: str) -> str:
+        return f"(julianday('now') - julianday({column})) * 24"
+
+    def insert_article(self, cursor, article_data: Dict) -> Optional[int]:
+        cursor.execute(self.sql("""
+            INSERT OR IGNORE INTO news_items (
+                title, url, scraped_at, row_text, actual_datetime,
+                content, clean_content, content_length, date_time, hash_id,
+                isProcessed, process_data
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 0, NULL)
+        """), article_values(article_data))
+        return cursor.lastrowid if cursor.rowcount > 0 else None
+
+    def table_report(self) -> Dict:
+        with self.transaction() as cursor:
+            cursor.execute("PRAGMA page_size")
+            page_size = cursor.fetchone()[0]
+            cursor.execute("PRAGMA page_count")
+            page_count = cursor.fetchone()[0]
+        file_bytes = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        return {
+            'total_bytes': page_size * page_count,
+            'file_bytes': file_bytes,
+            'cache_hit_rate': None  # SQLite keeps no cache statistics
+        }
+
+    def vacuum_analyze(self):
+        conn = self.connect()
+        conn.execute("VACUUM")
+        conn.execute("ANALYZE news_items")
+
+    def describe(self) -> str:
+        return f"SQLite ({self.path}, WAL)"
+
+def article_values(article_data: Dict) -> Tuple:
+    """Insert parameters for one scraped article, in column order"""
+    return (
+        article_data['title'],
+        article_data['url'],
+        article_data['scraped_at'],
+        article_data.get('row_text', ''),
+        article_data.get('actual_datetime', ''),
+        article_data.get('content', ''),
+        article_data.get('clean_content', ''),
+        article_data.get('content_length', 0),
+        article_data.get('date_time', ''),
+        article_data['hash_id']
+    )
+
+def get_storage(db_url: Optional[str] = None) -> ArticleStorage:
+    """Choose the storage backend from DATABASE_URL
+
+    sqlite:///path/to/file.db or file:path/to/file.db -> SQLiteStorage
+    anything else (postgres://...)                      -> PostgresStorage
+    A local database is only used when asked for, so a missing DATABASE_URL
+    never writes to a stray SQLite file instead of production.
+    """
+    db_url = db_url or os.getenv('DATABASE_URL')
+    compress_cold_fields = os.getenv('COMPRESS_COLD_FIELDS', '0') == '1'
+
+    if not db_url:
+        raise RuntimeError("DATABASE_URL not set - use postgres://..., sqlite:///path/to/file.db or file:path/to/file.db")
+    if db_url.startswith('sqlite:///'):
+        return SQLiteStorage(db_url[len('sqlite:///'):] or DEFAULT_SQLITE_PATH, compress_cold_fields)
+    if db_url.startswith('file:'):
+        return SQLiteStorage(db_url[len('file:'):] or DEFAULT_SQLITE_PATH, compress_cold_fields)
+    return PostgresStorage(db_url, compress_cold_fields)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+"""
+Story Clustering for News Balance Analyzer
+When a big story breaks, dozens of Rotter threads cover the same event and
+each one used to get its own Stage 2 research call with a near-identical
+prompt. Relevant articles are grouped online into story clusters by the
+similarity of their title and lead; the first article of a cluster pays for
+the research and every later member reuses it as its research findings.
+
+A cluster accepts new members for STORY_CLUSTER_WINDOW_HOURS after it was
+opened, so old research is never attached to a developing story for long.
+The cluster id is stored on every news_items row (story_cluster_id).
+
+Configuration:
+    STORY_CLUSTERS=0                 # disable clustering
+    STORY_CLUSTER_THRESHOLD=0.35     # minimum cosine similarity to join a cluster
+    STORY_CLUSTER_WINDOW_HOURS=12    # how long a cluster accepts new articles
+
+Commands:
+    python story_clusters.py list [--hours 24]   # recent clusters and their sizes
+    python story_clusters.py similarity "כותרת 1" "כותרת 2"
+"""
+
+import os
+import math
+import argparse
+from typing import Dict, Optional
+from common import load_env
+from storage import get_storage
+from prefilter import tokenize
+
+# Same environment handling as the scraper and processor
+load_env()
+
+# Terms kept per signature, and how much the title counts against the lead
+SIGNATURE_TERMS = 40
+TITLE_WEIGHT = 2
+LEAD_CHARS = 600
+
+# Function words that say nothing about the story
+STOPWORDS = {
+    'של', 'את', 'על', 'עם', 'לא', 'זה', 'זו', 'הוא', 'היא', 'הם', 'כי', 'גם', 'אם', 'או',
+    'אבל', 'כל', 'יש', 'אין', 'מה', 'אחרי', 'לפני', 'בין', 'כך', 'רק', 'עוד', 'היום',
+    'אמר', 'אמרה', 'אך', 'כדי', 'אשר', 'לאחר', 'נגד', 'תוך', 'עד', 'בו', 'בה', 'לו', 'לה',
+}
+
+# One-letter prefixes (ו, ה, ב, ל, מ, ש, כ) stripped from longer words
+PREFIXES = 'הבלמשכ'
+
+def stem(word: str) -> str:
+    """Strip a leading ו and one Hebrew prefix letter from words long enough to carry one"""
+    if len(word) > 3 and word[0] == 'ו':
+        word = word[1:]
+    if len(word) > 3 and word[0] in PREFIXES:
+        word = word[1:]
+    return word
+
+def story_signature(title: str, content: str = '') -> Dict[str, float]:
+    """L2-normalized term weights of the title and lead"""
+    weights: Dict[str, float] = {}
+    for text, weight in ((title, TITLE_WEIGHT), ((content or '')[:LEAD_CHARS], 1)):
+        for word in tokenize(text):
+            if len(word) < 2 or word in STOPWORDS or not word.strip('0'):
+                continue
+            term = stem(word)
+            weights[term] = weights.get(term, 0) + weight
+
+    top = sorted(weights.items(), key=lambda item: item[1], reverse=True)[:SIGNATURE_TERMS]
+    norm = math.sqrt(sum(weight * weight for _, weight in top)) or 1.0
+    return {term: round(weight / norm, 4) for term, weight in top}
+
+def similarity(first: Dict[str, float], second: Dict[str, float]) -> float:
+    """Cosine similarity of two signatures"""
+    if len(first) > len(second):
+        first, second = second, first
+    return sum(weight * second.get(term, 0.0) for term, weight in first.items())
+
+class StoryClusterer:
+    """Online assignment of relevant articles to story clusters, with per-run statistics"""
+
+    def __init__(self, storage, threshold: float = 0.35, window_hours: int = 12, enabled: bool = True):
+        self.storage = storage
+        self.threshold = threshold
+        self.window_hours = window_hours
+        self.enabled = enabled
+        self.reset_stats()
+
+    @classmethod
+    def from_env(cls, storage) -> 'StoryClusterer':
+        """Clusterer configured from STORY_CLUSTER* environment variables"""
+        return cls(
+            storage,
+            threshold=float(os.getenv('STORY_CLUSTER_THRESHOLD', '0.35')),
+            window_hours=int(os.getenv('STORY_CLUSTER_WINDOW_HOURS', '12')),
+            enabled=os.getenv('STORY_CLUSTERS', '1') != '0'
+        )
+
+    def reset_stats(self):
+        """Start counting a new run"""
+        self.stats = {'opened': 0, 'joined': 0, 'research_reused': 0}
+
+    def assign(self, article_id: Optional[int], title: str, content: str) -> Optional[int]:
+        """Cluster id for a relevant article - the closest recent story, or a new one"""
+        if not self.enabled or article_id is None:
+            return None
+        try:
+            existing = self.storage.get_article_story_cluster(article_id)
+            if existing:
+                return existing
+
+            signature = story_signature(title, content)
+            best_id, best_score, best_title = None, 0.0, ''
+            for cluster in self.storage.recent_story_clusters(self.window_hours):
+                score = similarity(signature, cluster['signature'])
+                if score > best_score:
+                    best_id, best_score, best_title = cluster['id'], score, cluster['title']
+
+            if best_id is not None and best_score >= self.threshold:
+                self.storage.join_story_cluster(article_id, best_id)
+                self.stats['joined'] += 1
+                print(f"[CLUSTER] [{article_id}] Same story as #{best_id} '{best_title[:40]}' "
+                      f"(similarity {best_score:.2f})")
+                return best_id
+
+            cluster_id = self.storage.create_story_cluster(article_id, title, signature)
+            self.stats['opened'] += 1
+            return cluster_id
+        except Exception as e:
+            print(f"[WARNING] Story clustering failed for article {article_id}: {e}")
+            return None
+
+    def shared_research(self, cluster_id: Optional[int]) -> Optional[str]:
+        """Research already done for this story, counted as a saved call"""
+        if cluster_id is None:
+            return None
+        try:
+            research = self.storage.get_story_research(cluster_id)
+        except Exception as e:
+            print(f"[WARNING] Could not read the research of story #{cluster_id}: {e}")
+            return None
+        if research is not None:
+            self.stats['research_reused'] += 1
+        return research
+
+    def save_research(self, cluster_id: Optional[int], research: str):
+        """Share a fresh research result with the rest of the story"""
+        if cluster_id is None:
+            return
+        try:
+            self.storage.save_story_research(cluster_id, research)
+        except Exception as e:
+            print(f"[WARNING] Could not save the research of story #{cluster_id}: {e}")
+
+    def offer_research(self, cluster_id: Optional[int], research: str):
+        """Share research done before the article was clustered, unless the story already has some"""
+        if cluster_id is None:
+            return
+        try:
+            if self.storage.get_story_research(cluster_id) is None:
+                self.storage.save_story_research(cluster_id, research)
+        except Exception as e:
+            print(f"[WARNING] Could not save the research of story #{cluster_id}: {e}")
+
+    def summary(self) -> str:
+        """One-line statistics for the processing report"""
+        if not self.enabled:
+            return "disabled"
+        return (f"{self.stats['opened']} new stories, {self.stats['joined']} articles joined an existing one - "
+                f"{self.stats['research_reused']} research calls saved")
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect story clusters")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    list_parser = subparsers.add_parser('list', help="recent clusters and their sizes")
+    list_parser.add_argument('--hours', type=int, default=24, help="clusters opened in the last N hours (default: 24)")
+    similarity_parser = subparsers.add_parser('similarity', help="similarity of two titles")
+    similarity_parser.add_argument('first')
+    similarity_parser.add_argument('second')
+    args = parser.parse_args()
+
+    if args.command == 'similarity':
+        score = similarity(story_signature(args.first), story_signature(args.second))
+        threshold = float(os.getenv('STORY_CLUSTER_THRESHOLD', '0.35'))
+        print(f"Similarity {score:.3f} -> {'same story' if score >= threshold else 'different stories'}")
+        return
+
+    storage = get_storage()
+    storage.init_schema()
+    try:
+        clusters = storage.recent_story_clusters(args.hours)
+        print(f"[STATS] {len(clusters)} story clusters in the last {args.hours}h - {storage.describe()}")
+        for cluster in sorted(clusters, key=lambda c: c['article_count'], reverse=True):
+            research = "research done" if cluster['has_research'] else "no research yet"
+            print(f"   #{cluster['id']:<6} {cluster['article_count']:>3} articles  {research:<15}  {cluster['title'][:60]}")
+    except Exception as e:
+        print(f"[ERROR] {e}")
+    finally:
+        storage.close()
+
+if __name__ == "__main__":
+    main()
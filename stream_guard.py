@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+"""
+Streaming Guard for the Article Processor
+Stages 2-4 ask for up to 1500-2000 output tokens. With a plain messages.create
+call nothing is known until the whole answer is back, so a hung or degenerate
+generation burns its full budget before anyone notices. These stages are
+streamed instead and watched chunk by chunk:
+
+- partial text is written to the article's stage checkpoint as it arrives
+- a stream stops early on a stage's stop marker (research that says
+  "לא מצאתי מידע נוסף" fails the quality check whatever follows) or on a
+  length cap - the text so far is the answer
+- a stream that runs past its time cap, or stays silent for too long, fails
+  the stage, which is retried on the next run
+- time to first token and output tokens per second are recorded per stage
+
+Configuration:
+    STREAMING=0                          # plain messages.create calls
+    STREAM_MAX_SECONDS=180               # wall-clock cap per streamed call
+    STREAM_IDLE_SECONDS=60               # longest silence between two chunks
+    STREAM_MAX_CHARS=research=4000       # per-stage length caps (none by default)
+    STREAM_CHECKPOINT_CHARS=500          # partial output is saved every N new characters
+"""
+
+import os
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+from common import percentile
+from stage_pipeline import parse_worker_spec, LATENCY_SAMPLES
+
+# Stages worth streaming; relevance answers are a few dozen tokens
+STREAMED_STAGES = {'research', 'analysis', 'journalistic'}
+
+# Text that ends a stage's answer early
+STOP_MARKERS = {
+    'research': ["לא מצאתי מידע נוסף"],
+}
+
+# Ways a stream can stop before the model ends it
+STOP_REASONS = ['marker', 'length', 'time']
+
+class StreamAborted(Exception):
+    """A stream ran past its time cap; the stage fails and keeps its partial checkpoint"""
+
+    def __init__(self, stage: str, seconds: float, characters: int):
+        super().__init__(f"{stage} stream stopped after {seconds:.0f}s ({characters} characters so far)")
+        self.stage = stage
+
+class StreamedResponse:
+    """Final message and headers of a stream, shaped like the raw response RateLimitGovernor.call expects"""
+
+    def __init__(self, message, headers):
+        self.message = message
+        self.headers = headers
+
+    def parse(self):
+        return self.message
+
+class StreamWatch:
+    """One streamed call: its text so far, timings and stop conditions"""
+
+    def __init__(self, stage: str, max_chars: Optional[int], max_seconds: float,
+                 on_partial: Optional[Callable[[str], None]], checkpoint_chars: int):
+        self.stage = stage
+        self.max_chars = max_chars
+        self.max_seconds = max_seconds
+        self.on_partial = on_partial
+        self.checkpoint_chars = checkpoint_chars
+        self.markers = STOP_MARKERS.get(stage, [])
+        self.started = time.time()
+        self.first_token_at = None
+        self.text = ""
+        self.saved_chars = 0
+        self.stop_reason = None
+
+    def feed(self, chunk: str) -> bool:
+        """Add a text delta; True when the stream should stop here"""
+        now = time.time()
+        if self.first_token_at is None:
+            self.first_token_at = now
+        self.text += chunk
+
+        if self.on_partial and len(self.text) - self.saved_chars >= self.checkpoint_chars:
+            self.save_partial()
+
+        # Only the tail can contain a marker that was not there before this chunk
+        tail = self.text[-(len(chunk) + max((len(marker) for marker in self.markers), default=0)):]
+        if any(marker in tail for marker in self.markers):
+            self.stop_reason = 'marker'
+        elif self.max_chars and len(self.text) >= self.max_chars:
+            self.stop_reason = 'length'
+        elif self.max_seconds and now - self.started > self.max_seconds:
+            self.stop_reason = 'time'
+        return self.stop_reason is not None
+
+    def save_partial(self):
+        """Hand the text so far to the checkpoint writer, never failing the stream"""
+        self.saved_chars = len(self.text)
+        try:
+            self.on_partial(self.text)
+        except Exception as e:
+            print(f"[WARNING] Could not save the partial {self.stage} output: {e}")
+
+class StreamGuard:
+    """Stop conditions for streamed stages and their per-run TTFT / throughput statistics"""
+
+    def __init__(self, enabled: bool = True, max_seconds: float = 180, idle_seconds: float = 60,
+                 max_chars: Optional[Dict[str, int]] = None, checkpoint_chars: int = 500):
+        self.enabled = enabled
+        self.max_seconds = max_seconds
+        self.idle_seconds = idle_seconds
+        self.max_chars = max_chars or {}
+        self.checkpoint_chars = max(1, checkpoint_chars)
+        self.reset_stats()
+
+    @classmethod
+    def from_env(cls) -> 'StreamGuard':
+        """Guard configured from STREAMING / STREAM_* environment variables"""
+        return cls(
+            enabled=os.getenv('STREAMING', '1') != '0',
+            max_seconds=float(os.getenv('STREAM_MAX_SECONDS', '180')),
+            idle_seconds=float(os.getenv('STREAM_IDLE_SECONDS', '60')),
+            max_chars=parse_worker_spec(os.getenv('STREAM_MAX_CHARS')),
+            checkpoint_chars=int(os.getenv('STREAM_CHECKPOINT_CHARS', '500'))
+        )
+
+    def reset_stats(self):
+        """Start counting a new run"""
+        self.stats: Dict[str, Dict] = {}
+
+    def streams(self, stage: str) -> bool:
+        """True when calls of this stage are streamed"""
+        return self.enabled and stage in STREAMED_STAGES
+
+    def watch(self, stage: str, on_partial: Optional[Callable[[str], None]] = None) -> StreamWatch:
+        """Watch for one new stream"""
+        return StreamWatch(stage, self.max_chars.get(stage), self.max_seconds, on_partial, self.checkpoint_chars)
+
+    def finish(self, watch: StreamWatch, message):
+        """Account a finished or stopped stream; raises StreamAborted past the time cap"""
+        ended = time.time()
+        if watch.stop_reason:
+            # The API reports output tokens only at the end - estimate them for a stopped stream
+            estimate = len(watch.text) // 2
+            if message.usage.output_tokens < estimate:
+                message.usage.output_tokens = estimate
+
+        stats = self.stats.setdefault(watch.stage, {
+            'streams': 0, 'ttft': deque(maxlen=LATENCY_SAMPLES), 'tokens': 0, 'seconds': 0.0,
+            'stopped': {reason: 0 for reason in STOP_REASONS}
+        })
+        stats['streams'] += 1
+        if watch.first_token_at is not None:
+            stats['ttft'].append(watch.first_token_at - watch.started)
+            stats['tokens'] += message.usage.output_tokens
+            stats['seconds'] += ended - watch.first_token_at
+        if watch.stop_reason:
+            stats['stopped'][watch.stop_reason] += 1
+            print(f"[STREAM] {watch.stage} stopped early ({watch.stop_reason}) after "
+                  f"{len(watch.text)} characters, {ended - watch.started:.1f}s")
+
+        if watch.stop_reason == 'time':
+            if watch.on_partial and len(watch.text) > watch.saved_chars:
+                watch.save_partial()
+            raise StreamAborted(watch.stage, ended - watch.started, len(watch.text))
+
+    def summary_lines(self):
+        """One line per streamed stage for the processing report"""
+        lines = []
+        for stage in sorted(self.stats):
+            stats = self.stats[stage]
+            rate = stats['tokens'] / stats['seconds'] if stats['seconds'] else 0.0
+            stopped = ", ".join(f"{stats['stopped'][reason]} {reason}" for reason in STOP_REASONS)
+            lines.append(f"{stage:<13} {stats['streams']} streams - time to first token "
+                         f"p50 {percentile(stats['ttft'], 0.5):.2f}s, p95 {percentile(stats['ttft'], 0.95):.2f}s - "
+                         f"{rate:.1f} tokens/s - stopped early: {stopped}")
+        return lines
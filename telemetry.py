@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+"""
+LLM Call Telemetry for News Balance Analyzer
+One row per Anthropic call in the llm_calls table: article, stage, model,
+input / output / prompt-cache tokens, latency, retries, outcome and cost. Rows
+are queued in memory and written by a background thread in batches, so the
+processor never waits for a telemetry insert.
+
+Outcomes: ok, cached (answered by llm_cache.py), stopped-marker / -length (cut
+short by stream_guard.py), error: <exception class>, and the result type of
+Message Batches requests (errored, expired, ...).
+
+Cost uses the list prices below (USD per million tokens); batch requests are
+billed at half price.
+
+Configuration:
+    TELEMETRY=0                   # do not record calls
+    TELEMETRY_BATCH_SIZE=50       # rows per insert
+    TELEMETRY_FLUSH_SECONDS=5     # longest a row waits in memory
+
+Commands:
+    python telemetry.py report [--days 7]   # latency, tokens and cost per stage and model, daily trend
+"""
+
+import os
+import time
+import queue
+import argparse
+import threading
+from typing import Dict, Optional, Tuple
+from common import load_env, percentile
+from storage import get_storage
+
+# Same environment handling as the scraper and processor
+load_env()
+
+# USD per million tokens: (input, output) by model name prefix
+MODEL_PRICES = {
+    'claude-3-haiku': (0.25, 1.25),
+    'claude-3-5-haiku': (0.80, 4.00),
+    'claude-haiku-4': (1.00, 5.00),
+    'claude-3-5-sonnet': (3.00, 15.00),
+    'claude-3-7-sonnet': (3.00, 15.00),
+    'claude-sonnet-4': (3.00, 15.00),
+    'claude-opus-4': (15.00, 75.00),
+}
+
+# Prompt-cache writes and reads relative to the input price, and the batch discount
+CACHE_WRITE_FACTOR = 1.25
+CACHE_READ_FACTOR = 0.1
+BATCH_DISCOUNT = 0.5
+
+def model_prices(model: Optional[str]) -> Optional[Tuple[float, float]]:
+    """(input, output) USD per million tokens, or None for an unknown model"""
+    for prefix, prices in MODEL_PRICES.items():
+        if (model or '').startswith(prefix):
+            return prices
+    return None
+
+def call_cost(model: Optional[str], tokens: Dict[str, int], batch: bool = False) -> float:
+    """USD cost of one call"""
+    prices = model_prices(model)
+    if prices is None:
+        return 0.0
+    input_price, output_price = prices
+    cost = (tokens['input_tokens'] * input_price
+            + tokens['cache_creation_input_tokens'] * input_price * CACHE_WRITE_FACTOR
+            + tokens['cache_read_input_tokens'] * input_price * CACHE_READ_FACTOR
+            + tokens['output_tokens'] * output_price) / 1_000_000
+    return cost * BATCH_DISCOUNT if batch else cost
+
+class CallTelemetry:
+    """Queue of call records written to llm_calls by a background thread"""
+
+    def __init__(self, storage, enabled: bool = True, batch_size: int = 50, flush_seconds: float = 5.0):
+        self.storage = storage
+        self.enabled = enabled
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_seconds
+        self.queue: queue.Queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, storage) -> 'CallTelemetry':
+        """Telemetry configured from TELEMETRY* environment variables"""
+        return cls(
+            storage,
+            enabled=os.getenv('TELEMETRY', '1') != '0',
+            batch_size=int(os.getenv('TELEMETRY_BATCH_SIZE', '50')),
+            flush_seconds=float(os.getenv('TELEMETRY_FLUSH_SECONDS', '5'))
+        )
+
+    def record(self, stage: str, model: Optional[str], usage=None, latency: Optional[float] = None,
+               retries: int = 0, outcome: str = 'ok', article_id: Optional[int] = None, batch: bool = False):
+        """Queue one call; never raises"""
+        if not self.enabled:
+            return
+        tokens = {key: getattr(usage, key, 0) or 0 for key in
+                  ['input_tokens', 'output_tokens', 'cache_creation_input_tokens', 'cache_read_input_tokens']}
+        row = (article_id, stage, model, tokens['input_tokens'], tokens['output_tokens'],
+               tokens['cache_creation_input_tokens'], tokens['cache_read_input_tokens'],
+               int(latency * 1000) if latency is not None else None, retries, outcome, batch,
+               round(call_cost(model, tokens, batch), 8))
+        self.start()
+        self.queue.put(row)
+
+    def start(self):
+        """Start the writer thread on first use"""
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.writer, name='telemetry-writer', daemon=True)
+                self.thread.start()
+
+    def writer(self):
+        """Collect rows and insert them in batches, on its own database connection"""
+        storage = self.storage.clone()
+        rows = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.time())
+            try:
+                rows.append(self.queue.get(timeout=timeout))
+                if deadline is None:
+                    deadline = time.time() + self.flush_seconds
+            except queue.Empty:
+                pass
+            if rows and (len(rows) >= self.batch_size or time.time() >= deadline):
+                try:
+                    storage.save_llm_calls(rows)
+                except Exception as e:
+                    print(f"[WARNING] Could not write {len(rows)} telemetry rows: {e}")
+                for _ in rows:
+                    self.queue.task_done()
+                rows = []
+                deadline = None
+
+    def flush(self):
+        """Block until every queued row is written"""
+        if self.thread is None:
+            return
+        deadline = time.time() + self.flush_seconds + 30
+        while self.queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.05)
+
+def print_report(storage, days: int):
+    """Latency, tokens and cost per stage and model, cost per relevant article and the daily trend"""
+    report = storage.llm_call_report(days)
+    print(f"[STATS] LLM calls in the last {days} days - {storage.describe()}")
+    if not report['stages']:
+        print("   (no calls recorded)")
+        return
+
+    print(f"   {'stage':<14} {'calls':>6} {'cached':>6} {'errors':>6} {'retries':>7} {'p50':>7} {'p95':>7} "
+          f"{'input':>10} {'output':>9} {'cache r/w':>15} {'cost $':>9}")
+    total_cost = 0.0
+    for row in report['stages']:
+        latencies = report['latencies'].get(row['stage'], [])
+        total_cost += row['cost_usd']
+        print(f"   {row['stage']:<14} {row['calls']:>6} {row['cached']:>6} {row['errors']:>6} {row['retries']:>7} "
+              f"{percentile(latencies, 0.5) / 1000:>6.2f}s {percentile(latencies, 0.95) / 1000:>6.2f}s "
+              f"{row['input_tokens']:>10} {row['output_tokens']:>9} "
+              f"{row['cache_read_input_tokens']:>7}/{row['cache_creation_input_tokens']:<7} {row['cost_usd']:>9.4f}")
+
+    print("   Per model (live calls):")
+    for row in report['models']:
+        latencies = report['model_latencies'].get((row['stage'], row['model']), [])
+        per_call = row['cost_usd'] / row['calls'] if row['calls'] else 0.0
+        print(f"   {row['stage']:<14} {row['model'] or 'unknown':<28} {row['calls']:>6} calls  "
+              f"p50 {percentile(latencies, 0.5) / 1000:>6.2f}s  {row['input_tokens']:>10} in  {row['output_tokens']:>9} out  "
+              f"${row['cost_usd']:>8.4f}  ${per_call:.5f}/call")
+
+    relevant = sum(report['relevant_per_day'].values())
+    per_article = f"${total_cost / relevant:.4f}" if relevant else "n/a"
+    print(f"   [COST] ${total_cost:.4f} total - {relevant} relevant articles - {per_article} per relevant article")
+
+    print("   Daily trend:")
+    for row in report['daily']:
+        day = str(row['day'])
+        relevant = report['relevant_per_day'].get(day, 0)
+        per_article = f"${row['cost_usd'] / relevant:.4f}/relevant" if relevant else ""
+        print(f"   {day}  {row['calls']:>6} calls  {row['input_tokens']:>10} in  {row['output_tokens']:>9} out  "
+              f"${row['cost_usd']:>8.4f}  {relevant:>5} relevant  {per_article}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Report on recorded LLM calls")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    report_parser = subparsers.add_parser('report', help="latency, tokens and cost per stage, daily trend")
+    report_parser.add_argument('--days', type=int, default=7, help="how far back to look (default: 7)")
+    args = parser.parse_args()
+
+    storage = get_storage()
+    storage.init_schema()
+    try:
+        if args.command == 'report':
+            print_report(storage, args.days)
+    except Exception as e:
+        print(f"[ERROR] {e}")
+    finally:
+        storage.close()
+
+if __name__ == "__main__":
+    main()
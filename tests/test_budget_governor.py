@@ -0,0 +1,54 @@
+# -*- coding: utf-8
+from types import SimpleNamespace
+from budget_governor import BudgetGovernor
+
+def article(article_id, title="כותרת", waiting_hours=0.0):
+    return {'id': article_id, 'title': title, 'clean_content': '', 'waiting_hours': waiting_hours}
+
+def governor(daily_tokens=100_000, tokens_per_article=10_000):
+    # No telemetry: spend comes only from the responses counted in this process
+    return BudgetGovernor(None, daily_tokens=daily_tokens, tokens_per_article=tokens_per_article)
+
+def spend(budget, tokens):
+    budget.spend(SimpleNamespace(input_tokens=tokens, output_tokens=0))
+
+def test_capacity_follows_the_remaining_budget():
+    budget = governor()
+    assert budget.capacity() == 10
+    spend(budget, 45_000)
+    assert budget.capacity() == 5
+
+def test_capacity_is_zero_when_exhausted():
+    budget = governor()
+    spend(budget, 100_000)
+    assert budget.level == 'exhausted'
+    assert budget.capacity() == 0
+    assert not budget.admits_more()
+
+def test_admit_without_a_budget_takes_everything_up_to_the_limit():
+    budget = BudgetGovernor(None)
+    articles = [article(index) for index in range(5)]
+    assert budget.admit(articles) == articles
+    assert budget.admit(articles, limit=2) == articles[:2]
+
+def test_admit_defers_what_the_budget_does_not_pay_for():
+    budget = governor(daily_tokens=30_000)
+    admitted = budget.admit([article(index) for index in range(5)])
+    assert len(admitted) == 3
+    assert budget.stats['admitted'] == 3
+    assert budget.stats['deferred'] == 2
+
+def test_admit_takes_the_highest_priority_first():
+    budget = governor(daily_tokens=20_000)
+    stale = article(1, waiting_hours=48)
+    political = article(2, title="הממשלה והכנסת: ויכוח על חוק הגיוס", waiting_hours=48)
+    fresh = article(3, waiting_hours=0)
+    admitted = budget.admit([stale, political, fresh])
+    assert [item['id'] for item in admitted] == [3, 2]
+
+def test_levels_degrade_as_the_budget_runs_out():
+    budget = governor()
+    spend(budget, 60_000)
+    assert budget.level == 'economy' and not budget.allows_speculation()
+    spend(budget, 25_000)
+    assert budget.level == 'minimal' and budget.skip_research()
@@ -0,0 +1,18 @@
+# -*- coding: utf-8
+from common import percentile
+
+def test_percentile_of_empty_list_is_zero():
+    assert percentile([], 0.5) == 0.0
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 0.5) == 51
+    assert percentile(values, 0.95) == 96
+    assert percentile(values, 0.99) == 100
+
+def test_percentile_does_not_need_sorted_input():
+    assert percentile([5, 1, 4, 2, 3], 0.0) == 1
+    assert percentile([5, 1, 4, 2, 3], 1.0) == 5
+
+def test_percentile_of_single_value():
+    assert percentile([7.5], 0.95) == 7.5
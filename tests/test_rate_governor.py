@@ -0,0 +1,46 @@
+# -*- coding: utf-8
+from rate_governor import RateLimitGovernor, WINDOW_SECONDS, PENDING_RECHECK_SECONDS
+
+NOW = 1_000_000.0
+
+def governor(**limits):
+    limits = dict({'requests': 0, 'input_tokens': 0, 'output_tokens': 0}, **limits)
+    return RateLimitGovernor(target_utilization=0.9, limits=limits)
+
+def test_no_wait_under_the_budget():
+    rate = governor(requests=10)
+    rate.events = [(NOW - 30, 1, 0, 0)] * 5
+    assert rate.wait_needed({'requests': 1}, NOW) == 0.0
+
+def test_waits_until_enough_of_the_window_expires():
+    rate = governor(input_tokens=1000)
+    rate.events = [(NOW - 50, 1, 600, 0), (NOW - 20, 1, 300, 0)]
+    # 900 used of a 900 budget: the call fits once the oldest event leaves the window
+    assert rate.wait_needed({'input_tokens': 100}, NOW) == WINDOW_SECONDS - 50
+
+def test_window_drops_old_events():
+    rate = governor(input_tokens=1000)
+    rate.events = [(NOW - WINDOW_SECONDS - 1, 1, 900, 0)]
+    assert rate.wait_needed({'input_tokens': 500}, NOW) == 0.0
+    assert rate.events == []
+
+def test_pending_calls_wait_for_a_recheck():
+    rate = governor(requests=10)
+    rate.pending['requests'] = 9
+    assert rate.wait_needed({'requests': 1}, NOW) == PENDING_RECHECK_SECONDS
+
+def test_oversized_request_goes_once_the_window_is_empty():
+    rate = governor(input_tokens=1000)
+    assert rate.wait_needed({'input_tokens': 5000}, NOW) == 0.0
+    rate.events = [(NOW - 10, 1, 300, 0)]
+    assert rate.wait_needed({'input_tokens': 5000}, NOW) == WINDOW_SECONDS - 10
+
+def test_exhausted_headers_wait_for_the_reset():
+    rate = governor(requests=100)
+    rate.remaining['requests'] = (5, NOW + 12)
+    assert rate.wait_needed({'requests': 1}, NOW) == 12
+
+def test_blocked_after_a_429():
+    rate = governor()
+    rate.blocked_until = NOW + 7
+    assert rate.wait_needed({'requests': 1}, NOW) == 7
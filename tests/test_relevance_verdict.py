@@ -0,0 +1,46 @@
+# -*- coding: utf-8
+import json
+from relevance_verdict import validate_verdict
+from relevance_batch import parse_verdicts
+
+VERDICT = {'relevant': True, 'category': 'פוליטיקה', 'controversy_type': 'political', 'confidence': 0.9}
+
+def test_validate_verdict_keeps_valid_fields():
+    assert validate_verdict(dict(VERDICT, extra='ignored')) == VERDICT
+
+def test_validate_verdict_clamps_confidence_and_trims_category():
+    verdict = validate_verdict(dict(VERDICT, category='  ' + 'x' * 80 + '  ', confidence=1.7))
+    assert verdict['category'] == 'x' * 60
+    assert verdict['confidence'] == 1.0
+    assert validate_verdict(dict(VERDICT, confidence=-2))['confidence'] == 0.0
+
+def test_validate_verdict_rejects_schema_violations():
+    assert validate_verdict(None) is None
+    assert validate_verdict("relevant") is None
+    assert validate_verdict(dict(VERDICT, relevant='yes')) is None
+    assert validate_verdict(dict(VERDICT, category='  ')) is None
+    assert validate_verdict(dict(VERDICT, controversy_type='sports')) is None
+    assert validate_verdict(dict(VERDICT, confidence=True)) is None
+    assert validate_verdict(dict(VERDICT, confidence='0.9')) is None
+
+def test_parse_verdicts_takes_the_json_array_out_of_the_text():
+    text = "Here are the verdicts:\n" + json.dumps([dict(VERDICT, id=1), dict(VERDICT, id=2, relevant=False)])
+    verdicts = parse_verdicts(text, [1, 2])
+    assert set(verdicts) == {1, 2}
+    assert json.loads(verdicts[2])['relevant'] is False
+
+def test_parse_verdicts_skips_unknown_duplicate_and_invalid_items():
+    items = [dict(VERDICT, id=1), dict(VERDICT, id=1, relevant=False), dict(VERDICT, id=9),
+             dict(VERDICT, id='x'), dict(VERDICT, id=2, confidence=None), "3"]
+    verdicts = parse_verdicts(json.dumps(items), [1, 2, 3])
+    assert list(verdicts) == [1]
+    assert json.loads(verdicts[1])['relevant'] is True
+
+def test_parse_verdicts_of_free_text_answers():
+    items = [{'id': 1, 'answer': ' כן - פוליטי '}, {'id': 2, 'answer': ''}]
+    assert parse_verdicts(json.dumps(items), [1, 2], structured=False) == {1: 'כן - פוליטי'}
+
+def test_parse_verdicts_without_an_array():
+    assert parse_verdicts("", [1]) == {}
+    assert parse_verdicts("no json here", [1]) == {}
+    assert parse_verdicts("[not json]", [1]) == {}
@@ -0,0 +1,157 @@
+# -*- coding: utf-8
+import pytest
+from llm_cache import ResponseCache, cache_key
+from process_articles import ArticleProcessor, STAGE_MAX_ATTEMPTS, batch_article_id
+
+# Every optional model, cache and background writer off: only the four stage calls run
+OFFLINE_ENV = {
+    'ANTHROPIC_API_KEY': 'test', 'STRUCTURED_RELEVANCE': '0', 'LLM_CACHE': '0', 'PREFILTER': '0',
+    'STORY_CLUSTERS': '0', 'RESEARCH_CACHE': '0', 'SPECULATIVE_RESEARCH': '0', 'RELEVANCE_BATCH_SIZE': '1',
+    'TELEMETRY': '0', 'PROCESSOR_CONCURRENCY': '1', 'PROCESSOR_PIPELINE': '0',
+}
+
+ANSWERS = {
+    'relevance': "כן - מחלוקת פוליטית על התקציב",
+    'research': "לפי דיווח בעיתון הארץ ועל פי הצהרה של שר האוצר, " * 5,
+    'analysis': "ניתוח מאוזן של המחלוקת",
+    'journalistic': "כתבה עיתונאית על המחלוקת",
+}
+
+STAGES = ['relevance', 'research', 'analysis', 'journalistic']
+
+@pytest.fixture
+def processor(tmp_path, monkeypatch):
+    """ArticleProcessor on a fresh SQLite file with the model calls stubbed"""
+    for name, value in OFFLINE_ENV.items():
+        monkeypatch.setenv(name, value)
+    processor = ArticleProcessor(f"sqlite:///{tmp_path / 'news.db'}")
+    processor.calls = []
+    processor.failing = set()
+
+    async def create_message_async(stage, params, article_id=None):
+        processor.calls.append(stage)
+        if stage in processor.failing:
+            raise RuntimeError(f"{stage} is down")
+        return ANSWERS[stage]
+
+    processor.create_message_async = create_message_async
+    yield processor
+    processor.storage.close()
+
+@pytest.fixture
+def article_id(processor):
+    return processor.storage.save_articles([{
+        'title': "הממשלה דנה בתקציב", 'url': "https://example.com/1", 'scraped_at': "2026-01-01",
+        'clean_content': "הממשלה דנה בתקציב המדינה והאופוזיציה תוקפת.", 'hash_id': "article-1",
+    }])[0]
+
+def status(processor, article_id):
+    """isProcessed of one article"""
+    with processor.storage.transaction() as cursor:
+        cursor.execute(processor.storage.sql("SELECT isProcessed FROM news_items WHERE id = %s"), (article_id,))
+        return cursor.fetchone()[0]
+
+def test_finished_article_is_published_and_its_checkpoints_dropped(processor, article_id):
+    assert processor.process_articles() == 1
+    assert processor.calls == STAGES
+    assert status(processor, article_id) == 1
+    assert [item['id'] for item in processor.storage.get_feed_page()] == [article_id]
+    assert processor.storage.get_stage_checkpoints([article_id]) == {}
+
+def test_failed_stage_resumes_at_the_first_missing_stage(processor, article_id):
+    processor.failing = {'analysis'}
+    assert processor.process_articles() == 0
+    assert status(processor, article_id) == 0
+    checkpoints = processor.storage.get_stage_checkpoints([article_id])[article_id]
+    assert checkpoints['research']['output'] == ANSWERS['research']
+    assert checkpoints['analysis'] == {'output': None, 'attempts': 1}
+
+    processor.failing = set()
+    processor.calls = []
+    assert processor.process_articles() == 1
+    assert processor.calls == ['analysis', 'journalistic']
+    assert status(processor, article_id) == 1
+
+def test_stage_out_of_attempts_sets_the_article_aside(processor, article_id):
+    processor.failing = {'journalistic'}
+    for attempt in range(1, STAGE_MAX_ATTEMPTS + 1):
+        assert status(processor, article_id) == 0
+        assert processor.process_articles() == 0
+        checkpoints = processor.storage.get_stage_checkpoints([article_id])[article_id]
+        assert checkpoints['journalistic']['attempts'] == attempt
+
+    # Failed, not published: out of the queue and the feed, stage rows kept for a retry
+    assert status(processor, article_id) == 3
+    assert processor.storage.get_unprocessed_articles() == []
+    assert processor.storage.get_feed_page() == []
+    assert checkpoints['analysis']['output'] == ANSWERS['analysis']
+    assert processor.process_articles() == 0
+
+def test_unrecorded_failure_is_retried_instead_of_given_up(processor, article_id, monkeypatch):
+    def record_stage_failure(*args):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(processor.storage, 'record_stage_failure', record_stage_failure)
+    processor.failing = {'research'}
+    for _ in range(STAGE_MAX_ATTEMPTS + 1):
+        assert processor.process_articles() == 0
+    assert status(processor, article_id) == 0
+
+def test_reset_retries_a_failed_article_at_its_failed_stage(processor, article_id):
+    processor.failing = {'journalistic'}
+    for _ in range(STAGE_MAX_ATTEMPTS):
+        processor.process_articles()
+    assert processor.storage.reset_processed_batch({'statuses': [3]}, 0, 100) == (1, article_id)
+    checkpoints = processor.storage.get_stage_checkpoints([article_id])[article_id]
+    assert checkpoints['journalistic']['attempts'] == 0
+
+    processor.failing = set()
+    processor.calls = []
+    assert processor.process_articles() == 1
+    assert processor.calls == ['journalistic']
+    assert status(processor, article_id) == 1
+
+def test_reset_returns_a_published_article_to_the_queue(processor, article_id):
+    processor.process_articles()
+    assert processor.storage.count_processed({}) == 1
+    assert processor.storage.reset_processed_batch({}, 0, 100) == (1, article_id)
+    assert processor.storage.reset_processed_batch({}, article_id, 100) == (0, None)
+    assert status(processor, article_id) == 0
+    assert processor.storage.get_feed_page() == []
+
+def test_cache_key_ignores_max_tokens_but_not_the_prompt(processor):
+    params = processor.relevance_request("תוכן הכתבה", "כותרת")
+    assert cache_key(dict(params, max_tokens=1)) == cache_key(params)
+    assert cache_key(dict(params, temperature=0.7)) != cache_key(params)
+    assert cache_key(processor.relevance_request("תוכן אחר", "כותרת")) != cache_key(params)
+
+def test_response_cache_skips_answers_cut_off_at_max_tokens(processor):
+    cache = ResponseCache(processor.storage)
+    params = processor.analysis_request("טקסט", "מחקר")
+    cache.put('analysis', params, "חתוך", stop_reason='max_tokens')
+    assert cache.get('analysis', params) is None
+    cache.put('analysis', params, "שלם", stop_reason='end_turn')
+    assert cache.get('analysis', dict(params, max_tokens=5)) == "שלם"
+
+def test_batch_article_id_of_custom_ids():
+    assert batch_article_id('article-42') == 42
+    assert batch_article_id('relevance-article-7') == 7
+    assert batch_article_id('article') is None
+    assert batch_article_id('article-x') is None
+
+def test_batch_mode_counts_only_finished_articles(processor, article_id):
+    second_id = processor.storage.save_articles([{
+        'title': "ויכוח על חוק הגיוס", 'url': "https://example.com/2", 'scraped_at': "2026-01-01",
+        'clean_content': "ויכוח בכנסת על חוק הגיוס.", 'hash_id': "article-2",
+    }])[0]
+
+    def run_message_batch(stage, requests, poll_interval=30):
+        # The analysis request of the second article errors inside the batch
+        return {key: ANSWERS[stage] for key in requests
+                if not (stage == 'analysis' and batch_article_id(key) == second_id)}
+
+    processor.run_message_batch = run_message_batch
+    assert processor.process_articles_batch() == 1
+    assert status(processor, article_id) == 1
+    assert status(processor, second_id) == 0
+    assert set(processor.storage.get_stage_checkpoints([second_id])[second_id]) == {'relevance', 'research'}
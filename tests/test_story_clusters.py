@@ -0,0 +1,31 @@
+# -*- coding: utf-8
+import math
+from story_clusters import story_signature, similarity, SIGNATURE_TERMS
+
+def test_signature_is_normalized():
+    signature = story_signature("הממשלה אישרה את תקציב המדינה", "הדיון בממשלה על התקציב נמשך עד הלילה.")
+    assert math.isclose(sum(weight * weight for weight in signature.values()), 1.0, abs_tol=1e-3)
+
+def test_signature_drops_stopwords_prefixes_and_numbers():
+    signature = story_signature("והממשלה של 2024 את")
+    assert 'של' not in signature and 'את' not in signature
+    assert 'ממשלה' in signature
+    assert not any(term.strip('0') == '' for term in signature)
+
+def test_signature_keeps_the_top_terms():
+    content = " ".join(f"מילה{index}" for index in range(200))
+    assert len(story_signature("כותרת", content)) <= SIGNATURE_TERMS
+
+def test_similarity_of_the_same_story_is_high():
+    first = story_signature("הכנסת אישרה את חוק הגיוס בקריאה ראשונה")
+    second = story_signature("חוק הגיוס אושר בכנסת בקריאה ראשונה")
+    other = story_signature("מכבי ניצחה בגמר הגביע בכדורסל")
+    assert similarity(first, second) > similarity(first, other)
+    assert similarity(first, other) == 0.0
+
+def test_similarity_is_symmetric_and_one_for_itself():
+    first = story_signature("הממשלה אישרה את התקציב", "התקציב אושר אחרי דיון ארוך")
+    second = story_signature("התקציב אושר בממשלה")
+    assert math.isclose(similarity(first, second), similarity(second, first))
+    assert math.isclose(similarity(first, first), 1.0, abs_tol=1e-3)
+    assert similarity(first, {}) == 0.0
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+"""
+Title Triage for the Live Scraper
+The scraper used to download and clean the page of every fresh forum thread,
+and the processor then threw most of them away as non-political. With
+TITLE_TRIAGE set, the titles of a forum page are triaged first and threads
+that are clearly not political are not downloaded at all:
+
+    local   the pre-filter model (prefilter.py) scores the title alone, against
+            the title-only threshold calibrated when it was trained
+    llm     one structured relevance call (relevance_verdict.py) per forum
+            page, titles only, groups of TITLE_TRIAGE_BATCH_SIZE
+
+A title with political terms (speculation.py) is always downloaded, and so is
+every thread the triage is unsure about or could not answer. Skipped threads
+are not stored, so they are only deferred: a thread that is still on the
+forum page is triaged again on the next run (LLM verdicts per title come
+from the response cache, llm_cache.py) and downloaded if the answer changes.
+
+The LLM triage is a processor stage like the others: its model comes from
+MODEL_ROUTES (stage title_triage, model_router.py), its calls are paced by
+the rate governor and its tokens count against the BUDGET_* token budget
+(budget_governor.py). With the budget exhausted no triage call is made and
+every thread without a cached verdict is downloaded.
+
+The pre-filter is trained on title and lead, and a title alone gives it less
+evidence: its scores are less extreme and its article threshold (PREFILTER_*)
+does not carry over. `python prefilter.py train` therefore calibrates a
+separate threshold on the held-out titles alone, at the same precision, and
+local triage uses it unless TITLE_TRIAGE_THRESHOLD is set. A model stored
+before that calibration never skips a title.
+
+Configuration:
+    TITLE_TRIAGE=local              # off (default), local or llm
+    TITLE_TRIAGE_THRESHOLD=0.95     # minimum certainty (0-1) that a title is non-political to skip it
+                                    # (default: 0.95 for llm, the calibrated title threshold for local)
+    TITLE_TRIAGE_BATCH_SIZE=40      # titles per LLM call
+
+Commands:
+    python title_triage.py score "כותרת" ["כותרת" ...]   # triage decision for titles
+"""
+
+import os
+import time
+import json
+import argparse
+from typing import Dict, List, Optional, Tuple
+from common import load_env
+from storage import get_storage
+from prefilter import load_prefilter
+from speculation import keyword_score
+from llm_cache import ResponseCache
+from telemetry import CallTelemetry
+from relevance_batch import parse_verdicts, TOKENS_PER_VERDICT
+from relevance_verdict import RELEVANCE_BATCH_TOOL, tool_params, parse_verdict
+from model_router import ModelRouter, DEFAULT_MODEL
+from rate_governor import RateLimitGovernor
+from budget_governor import BudgetGovernor
+
+# Same environment handling as the scraper and processor
+load_env()
+
+TRIAGE_MODES = ['off', 'local', 'llm']
+# Default certainty for the LLM triage; local triage uses the pre-filter's calibrated title threshold
+LLM_THRESHOLD = 0.95
+
+TRIAGE_PROMPT = """
+אתה עיתונאי ישראלי מנוסה. יישלחו אליך כותרות של שרשורי חדשות מפורום, לכל אחת מזהה.
+לפי הכותרת בלבד, לכל שרשור החלט:
+
+1. האם זה נושא פוליטי או חברתי שנוי במחלוקת בישראל?
+2. אם כן - מה סוג המחלוקת?
+3. מה קטגוריית השרשור?
+
+אם הכותרת לא מספיקה כדי להחליט, סמן את השרשור כרלוונטי עם ביטחון נמוך.
+רשום את ההחלטה של כל שרשור בכלי record_relevance_verdicts, עם המזהה שלו.
+"""
+
+TRIAGE_ITEM = """מזהה: {id}
+כותרת: {title}"""
+
+class TitleTriage:
+    """Decides which fresh forum threads are worth downloading, from their titles"""
+
+    def __init__(self, storage, mode: str = 'off', threshold: Optional[float] = None, batch_size: int = 40):
+        if mode not in TRIAGE_MODES:
+            raise ValueError(f"TITLE_TRIAGE must be one of {', '.join(TRIAGE_MODES)}, not {mode!r}")
+        self.storage = storage
+        self.mode = mode
+        self.enabled = mode != 'off'
+        self.batch_size = max(1, batch_size)
+        self.prefilter = load_prefilter(storage) if mode == 'local' else None
+        self.response_cache = ResponseCache.from_env(storage) if mode == 'llm' else None
+        self.telemetry = CallTelemetry.from_env(storage) if mode == 'llm' else None
+        self.model_router = ModelRouter.from_env(storage) if mode == 'llm' else None
+        self.rate_governor = RateLimitGovernor.from_env() if mode == 'llm' else None
+        self.budget_governor = BudgetGovernor.from_env(storage, self.telemetry, self.model_router) \
+            if mode == 'llm' else None
+        self.client = None
+        if mode == 'local' and self.prefilter is None:
+            print("[WARNING] TITLE_TRIAGE=local needs a trained pre-filter (python prefilter.py train) - "
+                  "downloading every thread")
+        if threshold is None:
+            threshold = self.prefilter.title_threshold if self.prefilter is not None else LLM_THRESHOLD
+        self.threshold = threshold
+        self.reset_stats()
+
+    @classmethod
+    def from_env(cls, storage) -> 'TitleTriage':
+        """Triage configured from TITLE_TRIAGE* environment variables"""
+        return cls(
+            storage,
+            mode=os.getenv('TITLE_TRIAGE', 'off').strip().lower() or 'off',
+            threshold=float(os.getenv('TITLE_TRIAGE_THRESHOLD')) if os.getenv('TITLE_TRIAGE_THRESHOLD') else None,
+            batch_size=int(os.getenv('TITLE_TRIAGE_BATCH_SIZE', '40'))
+        )
+
+    def reset_stats(self):
+        """Start counting a new run"""
+        self.stats = {'threads': 0, 'skipped': 0, 'calls': 0, 'cached': 0, 'failed': 0, 'tokens': 0,
+                      'over_budget': 0}
+
+    # --- local scoring ---
+
+    def local_certainty(self, title: str) -> Optional[float]:
+        """P(non-political) of a title from the pre-filter, or None without a model"""
+        if self.prefilter is None:
+            return None
+        return self.prefilter.score(title)
+
+    # --- LLM scoring ---
+
+    def cache_params(self, title: str) -> Dict:
+        """Response cache key of one title's verdict, under the model the stage is routed to"""
+        model, _ = self.model_router.choose('title_triage')
+        return {'stage': 'title_triage', 'model': model, 'system': TRIAGE_PROMPT, 'title': title}
+
+    def ask(self, titles: List[str]) -> Tuple[Dict[int, Dict], bool]:
+        """({index in titles: verdict}, cacheable) from one forced tool call
+        
+        Missing indexes were not answered; answers of the overload fallback model are not cacheable.
+        """
+        if self.client is None:
+            import anthropic
+            self.client = anthropic.Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'), max_retries=0)
+
+        params = {
+            'model': DEFAULT_MODEL,
+            'max_tokens': min(4096, TOKENS_PER_VERDICT * len(titles)),
+            'temperature': 0.1,
+            'system': TRIAGE_PROMPT,
+            'messages': [{'role': 'user', 'content': "\n\n".join(
+                TRIAGE_ITEM.format(id=index, title=title) for index, title in enumerate(titles))}],
+        }
+        params.update(tool_params(RELEVANCE_BATCH_TOOL))
+        params = self.model_router.route('title_triage', params)
+
+        start = time.time()
+        try:
+            message = self.rate_governor.call(
+                lambda request: self.client.messages.with_raw_response.create(**request),
+                params, 'title_triage', self.model_router.fallback_for(params))
+        except Exception as e:
+            self.telemetry.record('title_triage', params['model'], latency=time.time() - start,
+                                  outcome=f"error: {type(e).__name__}")
+            raise
+        self.telemetry.record('title_triage', getattr(message, 'model', params['model']), message.usage,
+                              latency=time.time() - start)
+        self.budget_governor.spend(message.usage)
+        fell_back = self.model_router.served('title_triage', None, params, getattr(message, 'model', None))
+        self.stats['calls'] += 1
+        self.stats['tokens'] += (message.usage.input_tokens or 0) + (message.usage.output_tokens or 0)
+
+        text = next((json.dumps(block.input, ensure_ascii=False) for block in message.content or []
+                     if block.type == 'tool_use'), "")
+        encoded = parse_verdicts(text, list(range(len(titles))))
+        return {index: parse_verdict(verdict) for index, verdict in encoded.items()}, not fell_back
+
+    def llm_certainties(self, titles: List[str]) -> Dict[str, float]:
+        """{title: certainty that it is non-political} for the titles the model answered"""
+        verdicts: Dict[str, Dict] = {}
+        pending = []
+        for title in dict.fromkeys(titles):
+            cached = self.response_cache.get('title_triage', self.cache_params(title))
+            verdict = parse_verdict(cached) if cached else None
+            if verdict is not None:
+                verdicts[title] = verdict
+                self.stats['cached'] += 1
+            else:
+                pending.append(title)
+
+        if pending:
+            self.budget_governor.refresh()
+        for i in range(0, len(pending), self.batch_size):
+            group = pending[i:i + self.batch_size]
+            if not self.budget_governor.admits_more():
+                print(f"[BUDGET] Token budget exhausted - downloading {len(pending) - i} threads without title triage")
+                self.stats['over_budget'] += len(pending) - i
+                break
+            # Keyed before the call: its spend can switch the router to the budget model
+            keys = [self.cache_params(title) for title in group]
+            try:
+                answered, cacheable = self.ask(group)
+            except Exception as e:
+                print(f"[WARNING] Title triage call failed, downloading {len(group)} threads: {e}")
+                self.stats['failed'] += len(group)
+                continue
+            for index, verdict in answered.items():
+                verdicts[group[index]] = verdict
+                if cacheable:
+                    self.response_cache.put('title_triage', keys[index], json.dumps(verdict, ensure_ascii=False))
+
+        return {title: verdict['confidence'] if not verdict['relevant'] else 0.0
+                for title, verdict in verdicts.items()}
+
+    # --- triage ---
+
+    def decide(self, titles: List[str]) -> List[Tuple[bool, Optional[float]]]:
+        """(download, certainty that the title is non-political) per title"""
+        candidates = [title for title in titles if keyword_score(title) == 0]
+        if self.mode == 'llm' and candidates:
+            certainties = self.llm_certainties(candidates)
+        else:
+            certainties = {title: self.local_certainty(title) for title in candidates}
+
+        decisions = []
+        for title in titles:
+            certainty = certainties.get(title)
+            decisions.append((certainty is None or certainty < self.threshold, certainty))
+        return decisions
+
+    def triage(self, items: List[Dict]) -> List[Dict]:
+        """The forum items worth downloading; the others are reported and counted as skipped"""
+        if not self.enabled or not items:
+            return items
+
+        keep = []
+        for item, (download, certainty) in zip(items, self.decide([item['title'] for item in items])):
+            self.stats['threads'] += 1
+            if download:
+                keep.append(item)
+            else:
+                self.stats['skipped'] += 1
+                print(f"  ✗ Skipped (title triage, {certainty:.2f} non-political): {item['title'][:60]}...")
+        return keep
+
+    def flush(self):
+        """Write the queued telemetry rows"""
+        if self.telemetry is not None:
+            self.telemetry.flush()
+
+    def summary(self) -> str:
+        """One-line statistics for the scraping report"""
+        if not self.enabled:
+            return "disabled"
+        share = self.stats['skipped'] / self.stats['threads'] * 100 if self.stats['threads'] else 0.0
+        line = (f"{self.stats['skipped']} of {self.stats['threads']} new threads not downloaded "
+                f"({share:.1f}%, {self.mode}, threshold {self.threshold:.2f})")
+        if self.mode == 'llm':
+            line += (f" - {self.stats['calls']} calls, {self.stats['tokens']} tokens, "
+                     f"{self.stats['cached']} cached titles, {self.stats['failed']} unanswered")
+            if self.stats['over_budget']:
+                line += f", {self.stats['over_budget']} not triaged (budget exhausted)"
+        return line
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the title triage of the live scraper")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    score_parser = subparsers.add_parser('score', help="triage decision for titles")
+    score_parser.add_argument('titles', nargs='+')
+    args = parser.parse_args()
+
+    storage = get_storage()
+    storage.init_schema()
+    try:
+        triage = TitleTriage.from_env(storage)
+        if args.command == 'score':
+            if not triage.enabled:
+                print("[WARNING] TITLE_TRIAGE is off - set it to local or llm")
+                return
+            for title, (download, certainty) in zip(args.titles, triage.decide(args.titles)):
+                shown = "political terms" if certainty is None and keyword_score(title) > 0 else (
+                    "unknown" if certainty is None else f"{certainty:.2f} non-political")
+                print(f"{'download' if download else 'skip':<8} {shown:<20} {title}")
+            triage.flush()
+    except Exception as e:
+        print(f"[ERROR] {e}")
+    finally:
+        storage.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+"""
+Token Budgets for the Article Processor
+The stage prompts used to cut articles by characters (2000 for relevance and
+analysis, 500 for the research summary) and ask for a fixed max_tokens, no
+matter how the text tokenizes: Hebrew takes about twice as many tokens per
+character as English, so some prompts were longer than needed and others were
+cut in the middle of a sentence.
+
+- Input tokens are estimated locally: characters per token for each script
+  (Hebrew, Latin, digits, punctuation), times a scale calibrated against the
+  input tokens the API reports for every call
+- Article text is trimmed at a sentence boundary to a token budget per stage
+- max_tokens of a stage follows the output lengths observed for it: the 99th
+  percentile plus headroom, never above the old fixed value, and back to the
+  fixed value as soon as an answer hits the limit
+
+Calibration and output samples are kept in the processor_state table, so they
+carry over between runs.
+
+Configuration:
+    TOKEN_BUDGET=0                                       # character cuts and fixed max_tokens
+    TOKEN_BUDGETS=relevance=900,research=250,analysis=1000  # article tokens per stage
+    ADAPTIVE_MAX_TOKENS=0                                # keep the fixed max_tokens only
+
+Commands:
+    python token_budget.py stats          # calibration and observed output lengths
+    python token_budget.py estimate "טקסט"  # local token estimate of a text
+"""
+
+import os
+import re
+import json
+import argparse
+from collections import deque
+from typing import Dict, Optional
+from common import load_env, percentile
+from storage import get_storage
+from stage_pipeline import parse_worker_spec
+
+# Same environment handling as the scraper and processor
+load_env()
+
+STATE_NAME = 'token-budget'
+
+# Characters per token by script, before calibration; whitespace rides along with words
+CHARS_PER_TOKEN = {'hebrew': 1.8, 'latin': 3.8, 'digit': 2.5, 'other': 1.2}
+
+# Article tokens per stage - close to the old character cuts for Hebrew text;
+# relevance_batch is the lead of each article in a batched relevance call
+DEFAULT_INPUT_BUDGETS = {'relevance': 900, 'relevance_batch': 250, 'research': 250, 'analysis': 1000}
+
+# Output samples kept per stage, and how many are needed before max_tokens adapts
+OUTPUT_SAMPLES = 500
+MIN_OUTPUT_SAMPLES = 30
+OUTPUT_HEADROOM = 1.3
+
+# Weight of one new observation in the calibration scale
+CALIBRATION_RATE = 0.1
+
+SENTENCE_END = re.compile(r'(?<=[.!?:;\n])\s+')
+
+def script_of(char: str) -> Optional[str]:
+    """Script bucket of one character (None for whitespace)"""
+    if char.isspace():
+        return None
+    if '֐' <= char <= '׿':
+        return 'hebrew'
+    if char.isdigit():
+        return 'digit'
+    if char.isascii() and char.isalpha():
+        return 'latin'
+    return 'other'
+
+def raw_token_count(text: str) -> float:
+    """Uncalibrated token estimate from per-script character counts"""
+    counts = {script: 0 for script in CHARS_PER_TOKEN}
+    for char in text or '':
+        script = script_of(char)
+        if script:
+            counts[script] += 1
+    return sum(counts[script] / CHARS_PER_TOKEN[script] for script in counts)
+
+def request_text(params: Dict) -> str:
+    """All system, user and tool-definition text of a messages request"""
+    parts = [json.dumps(tool, ensure_ascii=False) for tool in params.get('tools') or []]
+    system = params.get('system')
+    for block in [system] if isinstance(system, str) else system or []:
+        parts.append(block if isinstance(block, str) else block.get('text', ''))
+    for message in params.get('messages', []):
+        content = message.get('content')
+        for block in [content] if isinstance(content, str) else content or []:
+            parts.append(block if isinstance(block, str) else block.get('text', ''))
+    return "\n".join(parts)
+
+class TokenBudget:
+    """Calibrated token estimates, sentence-boundary trimming and adaptive max_tokens"""
+
+    def __init__(self, storage, input_budgets: Optional[Dict[str, int]] = None,
+                 enabled: bool = True, adaptive_max_tokens: bool = True):
+        self.storage = storage
+        self.input_budgets = dict(DEFAULT_INPUT_BUDGETS)
+        self.input_budgets.update(input_budgets or {})
+        self.enabled = enabled
+        self.adaptive_max_tokens = adaptive_max_tokens
+        self.scale = 1.0
+        self.outputs: Dict[str, deque] = {}
+        self.hit_limit: Dict[str, deque] = {}
+        self.reset_stats()
+
+    @classmethod
+    def from_env(cls, storage) -> 'TokenBudget':
+        """Budget configured from TOKEN_BUDGET* / ADAPTIVE_MAX_TOKENS and the saved calibration"""
+        budget = cls(
+            storage,
+            input_budgets=parse_worker_spec(os.getenv('TOKEN_BUDGETS')),
+            enabled=os.getenv('TOKEN_BUDGET', '1') != '0',
+            adaptive_max_tokens=os.getenv('ADAPTIVE_MAX_TOKENS', '1') != '0'
+        )
+        budget.load()
+        return budget
+
+    def reset_stats(self):
+        """Start counting a new run"""
+        self.stats = {'trimmed': 0, 'input_tokens_saved': 0, 'max_tokens_lowered': 0,
+                      'calls': 0, 'error_sum': 0.0}
+
+    # --- persistence ---
+
+    def load(self):
+        """Restore calibration and output samples saved by earlier runs"""
+        try:
+            state = self.storage.get_processor_state(STATE_NAME)
+        except Exception as e:
+            print(f"[WARNING] Could not load token budget state: {e}")
+            return
+        if not state:
+            return
+        self.scale = state.get('scale', 1.0)
+        for stage, samples in state.get('outputs', {}).items():
+            self.outputs[stage] = deque(samples, maxlen=OUTPUT_SAMPLES)
+        for stage, hits in state.get('hit_limit', {}).items():
+            self.hit_limit[stage] = deque(hits, maxlen=MIN_OUTPUT_SAMPLES)
+
+    def save(self):
+        """Persist calibration and output samples for the next run"""
+        state = {
+            'scale': round(self.scale, 4),
+            'outputs': {stage: list(samples) for stage, samples in self.outputs.items()},
+            'hit_limit': {stage: list(hits) for stage, hits in self.hit_limit.items()}
+        }
+        try:
+            self.storage.save_processor_state(STATE_NAME, state)
+        except Exception as e:
+            print(f"[WARNING] Could not save token budget state: {e}")
+
+    # --- estimates and trimming ---
+
+    def estimate(self, text: str) -> int:
+        """Calibrated token estimate of a text"""
+        return int(round(raw_token_count(text) * self.scale))
+
+    def trim(self, stage: str, text: str, char_limit: int) -> str:
+        """Article text cut to the stage's token budget at a sentence boundary
+
+        char_limit is the old character cut, used when budgets are off and as the
+        baseline for the tokens-saved statistic.
+        """
+        text = text or ''
+        baseline = text[:char_limit]
+        budget = self.input_budgets.get(stage)
+        if not self.enabled or not budget:
+            return baseline
+        if self.estimate(text) <= budget:
+            trimmed = text
+        else:
+            trimmed = self.cut(text, budget)
+            self.stats['trimmed'] += 1
+        self.stats['input_tokens_saved'] += self.estimate(baseline) - self.estimate(trimmed)
+        return trimmed
+
+    def cut(self, text: str, budget: int) -> str:
+        """Longest run of whole sentences within budget (whole words if the first sentence is too long)"""
+        kept = []
+        used = 0.0
+        for sentence in SENTENCE_END.split(text):
+            tokens = raw_token_count(sentence) * self.scale
+            if used + tokens > budget:
+                break
+            kept.append(sentence)
+            used += tokens
+        if kept:
+            return " ".join(kept)
+
+        words = []
+        for word in text.split():
+            used += raw_token_count(word) * self.scale
+            if used > budget:
+                break
+            words.append(word)
+        return " ".join(words)
+
+    # --- output lengths ---
+
+    def max_tokens(self, stage: str, default: int) -> int:
+        """max_tokens for a stage: observed 99th percentile plus headroom, at most default"""
+        if not self.enabled or not self.adaptive_max_tokens:
+            return default
+        samples = self.outputs.get(stage)
+        if not samples or len(samples) < MIN_OUTPUT_SAMPLES or any(self.hit_limit.get(stage, [])):
+            return default
+        sized = max(default // 4, int(percentile(samples, 0.99) * OUTPUT_HEADROOM))
+        if sized < default:
+            self.stats['max_tokens_lowered'] += default - sized
+        return min(default, sized)
+
+    def observe(self, stage: str, params: Dict, usage, stop_reason: Optional[str] = None):
+        """Learn from one finished call: calibrate the estimator and record the output length"""
+        # Retries (research-retry in batch mode) count as their stage
+        stage = stage.split('-', 1)[0]
+        actual = (getattr(usage, 'input_tokens', 0) or 0) + \
+                 (getattr(usage, 'cache_creation_input_tokens', 0) or 0) + \
+                 (getattr(usage, 'cache_read_input_tokens', 0) or 0)
+        raw = raw_token_count(request_text(params))
+        if actual and raw:
+            self.stats['calls'] += 1
+            self.stats['error_sum'] += abs(raw * self.scale - actual) / actual
+            self.scale += CALIBRATION_RATE * (actual / raw - self.scale)
+
+        output_tokens = getattr(usage, 'output_tokens', 0) or 0
+        if output_tokens:
+            self.outputs.setdefault(stage, deque(maxlen=OUTPUT_SAMPLES)).append(output_tokens)
+            self.hit_limit.setdefault(stage, deque(maxlen=MIN_OUTPUT_SAMPLES)).append(stop_reason == 'max_tokens')
+
+    def summary(self) -> str:
+        """One-line statistics for the processing report"""
+        if not self.enabled:
+            return "disabled"
+        error = self.stats['error_sum'] / self.stats['calls'] * 100 if self.stats['calls'] else 0.0
+        return (f"{self.stats['input_tokens_saved']} input tokens saved vs character cuts "
+                f"({self.stats['trimmed']} articles trimmed at a sentence), "
+                f"max_tokens lowered by {self.stats['max_tokens_lowered']} - "
+                f"estimator error {error:.1f}% over {self.stats['calls']} calls")
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the processor's token budgets")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('stats', help="calibration and observed output lengths")
+    estimate_parser = subparsers.add_parser('estimate', help="local token estimate of a text")
+    estimate_parser.add_argument('text')
+    args = parser.parse_args()
+
+    storage = get_storage()
+    storage.init_schema()
+    budget = TokenBudget.from_env(storage)
+
+    try:
+        if args.command == 'estimate':
+            print(f"~{budget.estimate(args.text)} tokens ({len(args.text)} characters, scale {budget.scale:.3f})")
+        elif args.command == 'stats':
+            print(f"[STATS] Token budgets - calibration scale {budget.scale:.3f} - {storage.describe()}")
+            print(f"   input budgets: " + ", ".join(f"{stage} {tokens}" for stage, tokens in budget.input_budgets.items()))
+            for stage, samples in sorted(budget.outputs.items()):
+                print(f"   {stage:<13} {len(samples):>4} outputs - p50 {percentile(samples, 0.5)}, "
+                      f"p99 {percentile(samples, 0.99)} tokens, "
+                      f"{sum(budget.hit_limit.get(stage, []))} recent answers hit max_tokens")
+            if not budget.outputs:
+                print("   (no outputs observed yet)")
+    except Exception as e:
+        print(f"[ERROR] {e}")
+    finally:
+        storage.close()
+
+if __name__ == "__main__":
+    main()